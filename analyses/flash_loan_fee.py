@@ -1,8 +1,10 @@
+import numpy as np
 import pandas as pd
 from decimal import Decimal, getcontext
 from src.data.data_loader import load_all_transactions
 from src.utils.helpers import get_from_cache, save_to_cache
 from src.utils.decoder_input import decode_flash_loan_transaction
+from src.utils.tracing import traced, stage
 import logging
 import random
 
@@ -17,12 +19,24 @@ token_decimals = {
     '0x6b175474e89094c44da98b954eedeac495271d0f': 18,  # DAI
 }
 
+# Máscara dos 32 bits inferiores usada na soma exata em uint64
+UINT32_MASK = np.uint64(0xFFFFFFFF)
+
+# Colunas necessárias para o cálculo das taxas
+FEE_COLUMNS = ['network', 'gas_price', 'gas_used']
+
 # Preços das moedas em 31-10-2024
 eth_price_usd = Decimal('2515.87')  # Preço do ETH em dólares
 pol_price_usd = Decimal('0.32')  # Preço do MATIC em dólares
 
+network_prices_usd = {
+    'ethereum': eth_price_usd,
+    'polygon': pol_price_usd
+}
+
 # Função para analisar as taxas dos flash loans
-def analyze_flash_loan_fee(use_cache=True):
+@traced('flash_loan_fee')
+def analyze_flash_loan_fee(use_cache=True, dataset=None):
     cache_key_ethereum = 'flash_loan_fee_ethereum'
     cache_key_polygon = 'flash_loan_fee_polygon'
 
@@ -33,8 +47,11 @@ def analyze_flash_loan_fee(use_cache=True):
             logging.info("Dados carregados do cache Redis.")
             return ethereum_cached_data, polygon_cached_data
 
-    # Carrega todas as transações
-    flash_loans = load_all_transactions(function_name=['flashLoan', 'flashLoanSimple'])
+    # Carrega todas as transações (ou reaproveita o conjunto compartilhado)
+    if dataset is not None:
+        flash_loans = dataset.get(FEE_COLUMNS)
+    else:
+        flash_loans = load_all_transactions(function_name=['flashLoan', 'flashLoanSimple'], columns=FEE_COLUMNS)
 
     # Converter a lista de transações em um DataFrame do pandas
     df = pd.DataFrame(flash_loans)
@@ -44,18 +61,6 @@ def analyze_flash_loan_fee(use_cache=True):
         logging.warning("Nenhuma transação encontrada.")
         return {}, {}
 
-    # Ajustar o gas_price para o formato correto em Gwei usando Decimal
-    df['gas_price'] = df['gas_price'].apply(lambda x: Decimal(x).scaleb(-18))
-
-    # Log gas_price values in Gwei
-    logging.info(f"Gas_price values in Gwei: {df['gas_price'].head()}")
-
-    # Calcular a taxa paga (gas_used * gas_price) usando Decimal
-    df['fee_paid'] = df.apply(lambda row: Decimal(row['gas_used']) * row['gas_price'], axis=1)
-
-    # Log fee_paid values
-    logging.info(f"Fee_paid values: {df['fee_paid'].head()}")
-
     # Filtrar transações por rede
     networks = ['ethereum', 'polygon']
     metrics = {}
@@ -65,10 +70,7 @@ def analyze_flash_loan_fee(use_cache=True):
         if filtered_df.empty:
             logging.warning(f"Nenhuma transação encontrada para a rede {network}.")
             continue
-        if network == 'ethereum':
-            network_metrics = calculate_metrics(filtered_df, eth_price_usd)
-        elif network == 'polygon':
-            network_metrics = calculate_metrics(filtered_df, pol_price_usd)
+        network_metrics = calculate_metrics(filtered_df, network_prices_usd[network])
         metrics[network] = network_metrics
 
         # Salvar os resultados no cache Redis
@@ -77,17 +79,69 @@ def analyze_flash_loan_fee(use_cache=True):
 
     return metrics.get('ethereum', {}), metrics.get('polygon', {})
 
+# Converte uma coluna de valores em wei (inteiros ou strings, sem nulos) para uint64, ou None se algum
+# valor não couber (negativo, fracionário, acima de 2**64 - 1)
+def wei_to_uint64(values):
+    if isinstance(values.dtype, pd.UInt64Dtype):
+        return values.to_numpy(dtype=np.uint64)
+    values = values.to_numpy()
+    try:
+        if values.dtype.kind in 'iu':
+            if (values < 0).any():
+                return None
+            return values.astype(np.uint64)
+        return np.asarray(values, dtype=str).astype(np.uint64)
+    except (ValueError, OverflowError, TypeError):
+        return None
+
+
+# Soma exata de um array uint64: as metades alta e baixa de 32 bits são somadas separadamente,
+# o que não transborda para menos de 2**32 linhas
+def exact_uint64_sum(values):
+    high = (values >> np.uint64(32)).sum(dtype=np.uint64)
+    low = (values & UINT32_MASK).sum(dtype=np.uint64)
+    return (int(high) << 32) + int(low)
+
+
+# Soma exata das taxas (gas_used * gas_price), em ETH/MATIC
+def sum_fees(gas_used, gas_price):
+    return Decimal(sum_fees_wei(gas_used, gas_price)).scaleb(-18)
+
+
+# Soma exata das taxas em wei (int). Linhas sem gas_used ou gas_price não entram na soma.
+def sum_fees_wei(gas_used, gas_price):
+    known = gas_used.notna().to_numpy() & gas_price.notna().to_numpy()
+    if not known.all():
+        logging.warning(f"{int((~known).sum())} transações sem gas_used ou gas_price, ignoradas na soma das taxas.")
+        gas_used, gas_price = gas_used[known], gas_price[known]
+
+    gas_used_wei = wei_to_uint64(gas_used)
+    gas_price_wei = wei_to_uint64(gas_price)
+
+    if gas_used_wei is not None and gas_price_wei is not None and not (gas_used_wei >> np.uint64(32)).any():
+        # gas_price dividido em hi/lo de 32 bits: cada produto com gas_used (< 2**32) cabe em uint64
+        price_high = gas_price_wei >> np.uint64(32)
+        price_low = gas_price_wei & UINT32_MASK
+        return exact_uint64_sum(gas_used_wei * price_low) + (exact_uint64_sum(gas_used_wei * price_high) << 32)
+
+    # Valores fora do intervalo suportado: soma linha a linha em Decimal
+    logging.warning("Valores de gas fora do intervalo de uint64, somando as taxas com Decimal.")
+    return int(sum((Decimal(str(used)) * Decimal(str(price)) for used, price in zip(gas_used, gas_price)),
+                   Decimal(0)))
+
+
 # Função para calcular montante total e valor médio
+@stage('aggregate')
 def calculate_metrics(filtered_df, price_usd):
-    # Garantir que 'fee_paid' seja Decimal
-    filtered_df['fee_paid'] = filtered_df['fee_paid'].apply(Decimal)
+    total_fee_paid = sum_fees(filtered_df['gas_used'], filtered_df['gas_price'])
+    return metrics_from_totals(total_fee_paid, len(filtered_df), price_usd)
 
-    total_fee_paid = abs(filtered_df['fee_paid'].sum())
-    average_fee_paid = abs(filtered_df['fee_paid'].mean())
 
-    # Certificar que os valores são Decimals antes de fazer cálculos
-    total_fee_paid = Decimal(total_fee_paid)
-    average_fee_paid = Decimal(average_fee_paid)
+# Métricas a partir da soma exata das taxas e do número de transações. A média segue o
+# Series.mean() do pandas sobre Decimals (soma convertida para float e dividida pela contagem).
+def metrics_from_totals(total_fee_paid, count, price_usd):
+    total_fee_paid = abs(Decimal(total_fee_paid))
+    average_fee_paid = Decimal(float(total_fee_paid) / float(count))
     price_usd = Decimal(price_usd)
 
     # Log dos valores antes da conversão para USD
@@ -1,22 +1,91 @@
+import io
 import pandas as pd
-from src.data.data_loader import load_all_transactions
+from pymongo.errors import OperationFailure
+from src.config import DATA_SOURCE
+from src.data.data_loader import load_all_transactions, aggregate_transactions, TIMESTAMP_AS_DATE
+from src.data.dataset import FLASH_LOAN_FUNCTIONS
+from src.data.rollups import aggregate_rollups
+from src.data.async_access import aggregate_transactions_async, aggregate_rollups_async, get_from_cache_async, \
+    save_to_cache_async
 from src.utils.helpers import get_from_cache, save_to_cache
+from src.utils.tracing import traced, stage
 import logging
 import json
 
+# Colunas necessárias para as análises de frequência
+FREQUENCY_COLUMNS = ['timestamp', 'network', 'function_name']
 
-def analyze_flash_loan_frequency(use_cache=True, separate_by_network=True):
+# Nomes dos dias retornados pelo $dayOfWeek do MongoDB (1 = domingo)
+MONGO_DAY_NAMES = {
+    1: 'Sunday',
+    2: 'Monday',
+    3: 'Tuesday',
+    4: 'Wednesday',
+    5: 'Thursday',
+    6: 'Friday',
+    7: 'Saturday'
+}
+
+
+@traced('flash_loan_frequency')
+def analyze_flash_loan_frequency(use_cache=True, separate_by_network=True, dataset=None, engine='mongo',
+                                 start=None, end=None, resolution='day'):
     cache_key = 'flash_loan_frequency'
 
+    # Recortes por período ou resolução vêm dos rollups (ou do snapshot, lido apenas no período) e não passam
+    # pelo cache da série completa
+    if start is not None or end is not None or resolution != 'day':
+        if DATA_SOURCE == 'snapshot':
+            flash_loans = load_all_transactions(function_name=FLASH_LOAN_FUNCTIONS, columns=FREQUENCY_COLUMNS,
+                                                start=start, end=end)
+            return frequency_from_transactions(flash_loans, separate_by_network, resolution)
+        return frequency_from_rollups(separate_by_network, resolution, start, end)
+
     if use_cache:
         cached_data = get_from_cache(cache_key)
         if cached_data is not None and not cached_data.empty:
             logging.info("Dados carregados do cache Redis.")
             return cached_data
 
-    # Carrega todos os dados das transações
-    flash_loans = load_all_transactions(function_name=['flashLoan', 'flashLoanSimple'])
+    # Com o snapshot como fonte, a série sai sempre do pandas, sem consultar o MongoDB
+    if DATA_SOURCE == 'snapshot':
+        engine = 'pandas'
+
+    frequency_data = None
+    if engine == 'rollup' and dataset is None:
+        frequency_data = frequency_from_rollups(separate_by_network)
+    elif engine == 'mongo' and dataset is None:
+        try:
+            frequency_data = frequency_from_mongo(separate_by_network)
+        except OperationFailure as e:
+            logging.warning(f"Agregação no MongoDB falhou, usando o pandas: {e}")
+
+    if frequency_data is None:
+        # Carrega todos os dados das transações (ou reaproveita o conjunto compartilhado)
+        if dataset is not None:
+            flash_loans = dataset.get(FREQUENCY_COLUMNS)
+        else:
+            flash_loans = load_all_transactions(function_name=FLASH_LOAN_FUNCTIONS, columns=FREQUENCY_COLUMNS)
+
+        frequency_data = frequency_from_transactions(flash_loans, separate_by_network)
+        if frequency_data is None:
+            return None
+
+    # Log the frequency data (first 5 rows)
+    logging.info(f"Frequency data (first 5 rows):\n{frequency_data.head()}")
+
+    save_to_cache(cache_key, frequency_data)
+    logging.info(f"Dados salvos no cache Redis com a chave: {cache_key}")
+
+    return frequency_data
+
+
+# Instantes de cada resolução menor que um dia (como no $dateTrunc dos rollups)
+RESOLUTION_FREQUENCIES = {'minute': 'min', 'hour': 'h'}
+
 
+@stage('transform')
+def frequency_from_transactions(flash_loans, separate_by_network=True, resolution='day'):
     # Log the columns of the DataFrame
     logging.info(f"Columns in flash_loans DataFrame: {flash_loans.columns}")
 
@@ -28,80 +97,243 @@ def analyze_flash_loan_frequency(use_cache=True, separate_by_network=True):
     flash_loans['timestamp'] = pd.to_datetime(flash_loans['timestamp'], unit='s')
 
     # Filtra as transações pelas funções desejadas
-    flash_loans = flash_loans[flash_loans['function_name'].isin(['flashLoan', 'flashLoanSimple'])]
+    flash_loans = flash_loans[flash_loans['function_name'].isin(FLASH_LOAN_FUNCTIONS)]
+
+    if resolution == 'day':
+        buckets = flash_loans['timestamp'].dt.date
+    else:
+        buckets = flash_loans['timestamp'].dt.floor(RESOLUTION_FREQUENCIES[resolution])
 
     if separate_by_network:
         # Agrupa por data e rede para calcular a frequência
-        frequency_data = flash_loans.groupby([flash_loans['timestamp'].dt.date, 'network']).size().reset_index(
-            name='count')
+        frequency_data = flash_loans.groupby([buckets, 'network'], observed=True).size().reset_index(name='count')
     else:
         # Agrupa apenas por data para calcular a frequência
-        frequency_data = flash_loans.groupby(flash_loans['timestamp'].dt.date).size().reset_index(name='count')
+        frequency_data = flash_loans.groupby(buckets, observed=True).size().reset_index(name='count')
 
-    # Log the frequency data (first 5 rows)
-    logging.info(f"Frequency data (first 5 rows):\n{frequency_data.head()}")
+    return frequency_data
 
-    save_to_cache(cache_key, frequency_data)
-    logging.info(f"Dados salvos no cache Redis com a chave: {cache_key}")
 
+def frequency_from_mongo(separate_by_network=True):
+    # Mesmo agrupamento do pandas, executado no servidor: só as linhas agregadas trafegam
+    group_id = frequency_mongo_group(separate_by_network)
+    rows = aggregate_transactions([
+        {"$group": {"_id": group_id, "count": {"$sum": 1}}}
+    ], function_name=FLASH_LOAN_FUNCTIONS)
+    return frequency_frame(rows, list(group_id))
+
+
+def frequency_mongo_group(separate_by_network):
+    group_id = {'timestamp': {'$dateTrunc': {'date': TIMESTAMP_AS_DATE, 'unit': 'day'}}}
+    if separate_by_network:
+        group_id['network'] = '$network'
+    return group_id
+
+
+# Mesmo esquema da versão em pandas: datas (datetime.date) e contagens int64, ordenadas pelas chaves.
+# Em resoluções menores que um dia o timestamp fica como instante.
+def frequency_frame(rows, keys, resolution='day'):
+    frequency_data = pd.DataFrame([{**row['_id'], 'count': row['count']} for row in rows],
+                                  columns=keys + ['count'])
+
+    frequency_data['timestamp'] = pd.to_datetime(frequency_data['timestamp'])
+    if resolution == 'day':
+        frequency_data['timestamp'] = frequency_data['timestamp'].dt.date
+    frequency_data['count'] = frequency_data['count'].astype('int64')
+    return frequency_data.sort_values(keys).reset_index(drop=True)
+
+
+# Mesma série a partir dos rollups, em qualquer resolução do $dateTrunc (datas para 'day', instantes nas demais)
+def frequency_from_rollups(separate_by_network=True, resolution='day', start=None, end=None):
+    group_id = frequency_rollup_group(separate_by_network, resolution)
+    rows = aggregate_rollups([
+        {"$group": {"_id": group_id, "count": {"$sum": "$count"}}}
+    ], unit=resolution, start=start, end=end, function_name=FLASH_LOAN_FUNCTIONS, is_error=0)
+    return frequency_frame(rows, list(group_id), resolution)
+
+
+def frequency_rollup_group(separate_by_network, resolution):
+    group_id = {'timestamp': {'$dateTrunc': {'date': '$bucket', 'unit': resolution}}}
+    if separate_by_network:
+        group_id['network'] = '$network'
+    return group_id
+
+
+async def frequency_from_rollups_async(separate_by_network=True, resolution='day', start=None, end=None):
+    group_id = frequency_rollup_group(separate_by_network, resolution)
+    rows = await aggregate_rollups_async([
+        {"$group": {"_id": group_id, "count": {"$sum": "$count"}}}
+    ], unit=resolution, start=start, end=end, function_name=FLASH_LOAN_FUNCTIONS, is_error=0)
+    return frequency_frame(rows, list(group_id), resolution)
+
+
+# Versão assíncrona para o dashboard: mesmo cache e mesmos rollups; em um cache miss a série é agregada no
+# MongoDB (sem a alternativa em pandas, que carregaria a coleção inteira no servidor web)
+@traced('flash_loan_frequency')
+async def analyze_flash_loan_frequency_async(use_cache=True, separate_by_network=True, start=None, end=None,
+                                             resolution='day'):
+    cache_key = 'flash_loan_frequency'
+
+    if start is not None or end is not None or resolution != 'day':
+        return await frequency_from_rollups_async(separate_by_network, resolution, start, end)
+
+    if use_cache:
+        cached_data = await get_from_cache_async(cache_key)
+        if cached_data is not None and not cached_data.empty:
+            return cached_data
+
+    group_id = frequency_mongo_group(separate_by_network)
+    rows = await aggregate_transactions_async([
+        {"$group": {"_id": group_id, "count": {"$sum": 1}}}
+    ], function_name=FLASH_LOAN_FUNCTIONS)
+    frequency_data = frequency_frame(rows, list(group_id))
+
+    await save_to_cache_async(cache_key, frequency_data)
     return frequency_data
 
 
-def extract_day_hour(use_cache=True):
+@traced('flash_loan_day_hour')
+def extract_day_hour(use_cache=True, dataset=None, engine='mongo', start=None, end=None):
     cache_key_polygon = 'flash_loan_frequency_day_hour_polygon'
     cache_key_ethereum = 'flash_loan_frequency_day_hour_ethereum'
 
+    # Recortes por período vêm dos rollups (ou do snapshot, lido apenas no período) e não passam pelo cache
+    if start is not None or end is not None:
+        if DATA_SOURCE == 'snapshot':
+            grouped_data = day_hour_from_transactions(load_all_transactions(
+                function_name=FLASH_LOAN_FUNCTIONS, columns=FREQUENCY_COLUMNS, start=start, end=end))
+        else:
+            grouped_data = day_hour_from_rollups(start, end)
+        return (grouped_data[grouped_data['network'] == 'polygon'],
+                grouped_data[grouped_data['network'] == 'ethereum'])
+
     if use_cache:
         cached_data_polygon = get_from_cache(cache_key_polygon)
         cached_data_ethereum = get_from_cache(cache_key_ethereum)
 
         if cached_data_polygon is not None and cached_data_ethereum is not None:
             logging.info("Dados carregados do cache Redis para Polygon e Ethereum.")
-            frequency_data_polygon = pd.read_json(cached_data_polygon)
-            frequency_data_ethereum = pd.read_json(cached_data_ethereum)
+            # O JSON vem como texto: read_json não aceita mais strings literais a partir do pandas 3
+            frequency_data_polygon = pd.read_json(io.StringIO(cached_data_polygon))
+            frequency_data_ethereum = pd.read_json(io.StringIO(cached_data_ethereum))
             return frequency_data_polygon, frequency_data_ethereum
 
-    # Carrega todos os dados das transações
-    flash_loans = load_all_transactions(function_name=['flashLoan', 'flashLoanSimple'])
+    if DATA_SOURCE == 'snapshot':
+        engine = 'pandas'
+
+    grouped_data = None
+    if engine == 'rollup' and dataset is None:
+        grouped_data = day_hour_from_rollups()
+    elif engine == 'mongo' and dataset is None:
+        try:
+            grouped_data = day_hour_from_mongo()
+        except OperationFailure as e:
+            logging.warning(f"Agregação no MongoDB falhou, usando o pandas: {e}")
+
+    if grouped_data is None:
+        # Carrega todos os dados das transações (ou reaproveita o conjunto compartilhado)
+        if dataset is not None:
+            flash_loans = dataset.get(FREQUENCY_COLUMNS)
+        else:
+            flash_loans = load_all_transactions(function_name=FLASH_LOAN_FUNCTIONS, columns=FREQUENCY_COLUMNS)
+
+        grouped_data = day_hour_from_transactions(flash_loans)
+        if grouped_data is None:
+            return None, None
+
+    # Dividir os dados por rede
+    polygon_data = grouped_data[grouped_data['network'] == 'polygon']
+    ethereum_data = grouped_data[grouped_data['network'] == 'ethereum']
+
+    # Converte os DataFrames para JSON
+    polygon_data_json = polygon_data.to_json(orient='records')
+    ethereum_data_json = ethereum_data.to_json(orient='records')
 
+    # Salva os JSONs no cache
+    save_to_cache(cache_key_polygon, polygon_data_json)
+    save_to_cache(cache_key_ethereum, ethereum_data_json)
+    logging.info(f"Dados salvos no cache Redis com as chaves: {cache_key_polygon} e {cache_key_ethereum}")
+
+    return polygon_data, ethereum_data
+
+
+@stage('transform')
+def day_hour_from_transactions(flash_loans):
     # Log the columns of the DataFrame
     logging.info(f"Columns in flash_loans DataFrame: {flash_loans.columns}")
 
     # Check if 'timestamp' and 'network' columns exist
     if 'timestamp' not in flash_loans.columns or 'network' not in flash_loans.columns:
         logging.error("Column 'timestamp' or 'network' not found in the DataFrame.")
-        return None, None
+        return None
 
     flash_loans['timestamp'] = pd.to_datetime(flash_loans['timestamp'], unit='s')
 
-    frequency_data = flash_loans[flash_loans['function_name'].isin(['flashLoan', 'flashLoanSimple'])]
+    frequency_data = flash_loans[flash_loans['function_name'].isin(FLASH_LOAN_FUNCTIONS)].copy()
 
-    frequency_data['timestamp'] = pd.to_datetime(frequency_data['timestamp'])
     frequency_data['day_of_week'] = frequency_data['timestamp'].dt.day_name()
-    frequency_data['hour'] = frequency_data['timestamp'].dt.floor('30T').dt.hour
+    frequency_data['hour'] = frequency_data['timestamp'].dt.floor('30min').dt.hour
 
     # Agrupar por rede (network), dia da semana e hora arredondada, contando as ocorrências
-    grouped_data = frequency_data.groupby(['network', 'day_of_week', 'hour']).size().reset_index(name='count')
+    return frequency_data.groupby(['network', 'day_of_week', 'hour'], observed=True).size().reset_index(name='count')
 
-    # Dividir os dados por rede
-    polygon_data = grouped_data[grouped_data['network'] == 'polygon']
-    ethereum_data = grouped_data[grouped_data['network'] == 'ethereum']
 
-    # Converte os DataFrames para JSON
-    polygon_data_json = polygon_data.to_json(orient='records')
-    ethereum_data_json = ethereum_data.to_json(orient='records')
+def day_hour_from_mongo():
+    rows = aggregate_transactions([
+        {"$set": {"date": TIMESTAMP_AS_DATE}},
+        {"$group": {
+            "_id": {"network": "$network", "day_of_week": {"$dayOfWeek": "$date"}, "hour": {"$hour": "$date"}},
+            "count": {"$sum": 1}
+        }}
+    ], function_name=FLASH_LOAN_FUNCTIONS)
+    return day_hour_frame(rows)
 
-    # Salva os JSONs no cache
-    save_to_cache(cache_key_polygon, polygon_data_json)
-    save_to_cache(cache_key_ethereum, ethereum_data_json)
-    logging.info(f"Dados salvos no cache Redis com as chaves: {cache_key_polygon} e {cache_key_ethereum}")
 
-    return polygon_data, ethereum_data
+# Mesmo esquema da versão em pandas: nome do dia em inglês, hora int32 e ordenação pelas chaves
+def day_hour_frame(rows):
+    grouped_data = pd.DataFrame([{**row['_id'], 'count': row['count']} for row in rows],
+                                columns=['network', 'day_of_week', 'hour', 'count'])
+
+    grouped_data['day_of_week'] = grouped_data['day_of_week'].map(MONGO_DAY_NAMES)
+    grouped_data['hour'] = grouped_data['hour'].astype('int32')
+    grouped_data['count'] = grouped_data['count'].astype('int64')
+    return grouped_data.sort_values(['network', 'day_of_week', 'hour']).reset_index(drop=True)
+
+
+# Distribuição por dia da semana e hora a partir do rollup por hora
+DAY_HOUR_ROLLUP_GROUP = {"$group": {
+    "_id": {"network": "$network", "day_of_week": {"$dayOfWeek": "$bucket"}, "hour": {"$hour": "$bucket"}},
+    "count": {"$sum": "$count"}
+}}
+
+
+def day_hour_from_rollups(start=None, end=None):
+    rows = aggregate_rollups([DAY_HOUR_ROLLUP_GROUP], unit='hour', start=start, end=end,
+                             function_name=FLASH_LOAN_FUNCTIONS, is_error=0)
+    return day_hour_frame(rows)
+
+
+async def day_hour_from_rollups_async(start=None, end=None):
+    rows = await aggregate_rollups_async([DAY_HOUR_ROLLUP_GROUP], unit='hour', start=start, end=end,
+                                         function_name=FLASH_LOAN_FUNCTIONS, is_error=0)
+    return day_hour_frame(rows)
+
+
+def group_by_day_hour(start=None, end=None):
+    frequency_data_polygon, frequency_data_ethereum = extract_day_hour(start=start, end=end)
+    return pivot_day_hour(frequency_data_polygon, frequency_data_ethereum)
+
 
+# Distribuição de um período selecionado no dashboard, lida dos rollups sem bloquear o event loop
+@traced('flash_loan_day_hour')
+async def group_by_day_hour_async(start=None, end=None):
+    grouped_data = await day_hour_from_rollups_async(start, end)
+    return pivot_day_hour(grouped_data[grouped_data['network'] == 'polygon'],
+                          grouped_data[grouped_data['network'] == 'ethereum'])
 
-def group_by_day_hour():
-    frequency_data_polygon, frequency_data_ethereum = extract_day_hour()
 
+# Tabelas dia da semana x hora de cada rede, com os dias em português
+def pivot_day_hour(frequency_data_polygon, frequency_data_ethereum):
     # Mapping of English day names to Portuguese
     day_name_mapping = {
         'Monday': 'Segunda-feira',
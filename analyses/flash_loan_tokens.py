@@ -1,28 +1,19 @@
-import pandas as pd
-from collections import Counter
+from src.analyses.flash_loan_fee import token_decimals
 from src.data.data_loader import load_all_transactions
+from src.utils.decoder_input import decode_flash_loan_batch
 from src.utils.helpers import get_from_cache, save_to_cache
+from src.utils.tracing import traced, stage
 import logging
 
+# Colunas necessárias para a extração dos tokens
+TOKEN_COLUMNS = ['network', 'function_name', 'is_error', 'input']
 
-def parse_flashLoanSimple_input(input_data):
-    # Remover o prefixo '0x' se estiver presente
-    if input_data.startswith("0x"):
-        input_data = input_data[2:]
+# Endereço nulo não é um asset válido de flash loan
+INVALID_TOKENS = {'0x' + '0' * 40}
 
-    # Extrair o method_id (primeiros 4 bytes = 8 caracteres hexadecimais)
-    method_id = input_data[:8]
 
-    # Os parâmetros começam após o method_id
-    parameters = [input_data[i:i + 64] for i in range(8, len(input_data), 64)]
-
-    # Mapear os parâmetros conforme a assinatura
-    asset = "0x" + parameters[1][-40:]  # Este é o token usado
-
-    return asset
-
-
-def analyze_flash_loan_tokens(use_cache=True, separate_by_network=True):
+@traced('flash_loan_tokens')
+def analyze_flash_loan_tokens(use_cache=True, separate_by_network=True, dataset=None):
     cache_key = 'flash_loan_tokens'
 
     if use_cache:
@@ -30,28 +21,49 @@ def analyze_flash_loan_tokens(use_cache=True, separate_by_network=True):
         if cached_data is not None and not cached_data.empty:
             return cached_data
 
-    flash_loans = load_all_transactions(function_name=['flashLoan', 'flashLoanSimple'])
+    if dataset is not None:
+        flash_loans = dataset.get(TOKEN_COLUMNS)
+    else:
+        flash_loans = load_all_transactions(function_name=['flashLoan', 'flashLoanSimple'], columns=TOKEN_COLUMNS)
     flash_loans = flash_loans[flash_loans['is_error'] == 0]  # Filtrar transações sem erro
-    flash_loans['timestamp'] = pd.to_datetime(flash_loans['timestamp'])
-
-    # Extrair tokens do input
-    flash_loans['token'] = flash_loans['input'].apply(parse_flashLoanSimple_input)
 
-    # Filtrar tokens inválidos
-    invalid_tokens = {'0x' + '0' * 40, '0x00000000000000000000000000000000000000e0'}
-    flash_loans = flash_loans[~flash_loans['token'].isin(invalid_tokens)]
+    token_calls = extract_token_calls(flash_loans)
 
-    # Contar a frequência dos tokens
-    if separate_by_network:
-        token_data = flash_loans.groupby(['network', 'token']).size().reset_index(name='count')
-    else:
-        token_counts = Counter(flash_loans['token'])
-        token_data = pd.DataFrame(token_counts.items(), columns=['token', 'count'])
+    # Contar a frequência e somar o volume emprestado de cada token
+    token_data = aggregate_token_calls(token_calls, separate_by_network)
 
     # Log dos primeiros tokens que serão salvos
     logging.info("Primeiros tokens que serão salvos no Redis:")
     for index, row in token_data.head(5).iterrows():
-        logging.info(f"Token: {row['token']}, Count: {row['count']}")
+        logging.info(f"Token: {row['token']}, Count: {row['count']}, Volume: {row['volume']}")
 
     save_to_cache(cache_key, token_data)
     return token_data
+
+
+# Uma linha por (transação, asset, amount): chamadas flashLoan com vários assets são expandidas
+@stage('transform')
+def extract_token_calls(flash_loans):
+    calls = decode_flash_loan_batch(flash_loans['input'], errors='coerce', explode=True)
+    calls = calls.rename(columns={'asset': 'token'})
+    calls['network'] = flash_loans['network'].reindex(calls.index).to_numpy()
+
+    # Filtrar tokens inválidos
+    calls = calls[~calls['token'].isin(INVALID_TOKENS)]
+
+    # Volume normalizado pelas casas decimais do token (NaN para tokens sem precisão conhecida)
+    decimals = calls['token'].map(token_decimals).astype('float64')
+    calls = calls.assign(volume=calls['amount'].astype('float64') / 10.0 ** decimals)
+
+    return calls[['network', 'token', 'amount', 'volume']]
+
+
+@stage('aggregate')
+def aggregate_token_calls(token_calls, separate_by_network=True):
+    # Agrupamento direto pelos endereços: codificá-los no dicionário compartilhado exigiria o mesmo hash de cada
+    # linha, além de fazer o dicionário crescer com os tokens e de decodificar o resultado de volta
+    keys = ['network', 'token'] if separate_by_network else ['token']
+    grouped = token_calls.groupby(keys, observed=True)
+    token_data = grouped.size().reset_index(name='count')
+    token_data['volume'] = grouped['volume'].sum(min_count=1).to_numpy()
+    return token_data.sort_values(keys, ignore_index=True)
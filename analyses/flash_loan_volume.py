@@ -1,65 +1,161 @@
 import pandas as pd
-from pymongo import MongoClient
+from src.config import DATA_SOURCE
+from src.data.rollups import aggregate_rollups
+from src.data.snapshot import load_snapshot
+from src.data.async_access import aggregate_transactions_async, aggregate_rollups_async, get_from_cache_async, \
+    save_to_cache_async
+from src.utils.clients import get_collection
 from src.utils.helpers import get_from_cache, save_to_cache
+from src.utils.tracing import traced, stage
 import json
 
+# Chaves das contagens de volume, na coleção de transações e nos rollups
+VOLUME_GROUP_ID = {"function_name": "$function_name", "network": "$network", "is_error": "$is_error"}
+VOLUME_COLUMNS = list(VOLUME_GROUP_ID)
 
-def analyze_flash_loan_volume(use_cache=True, separate_by_network=False):
+
+@traced('flash_loan_volume')
+def analyze_flash_loan_volume(use_cache=True, separate_by_network=False, engine='mongo', start=None, end=None):
     cache_key = 'flash_loan_volume'
 
+    # Recortes por período vêm dos rollups (ou do snapshot, lido apenas no período) e não passam pelo cache
+    if start is not None or end is not None:
+        if DATA_SOURCE == 'snapshot':
+            return pd.DataFrame(volume_from_snapshot(start, end))
+        return pd.DataFrame(volume_from_rollups(start, end))
+
     if use_cache:
         cached_data = get_from_cache(cache_key)
         if cached_data is not None:
             return pd.DataFrame(json.loads(cached_data))
 
-    client = MongoClient()
-    db = client['defi_data']
-    collection = db['transactions']
+    if DATA_SOURCE == 'snapshot':
+        results = volume_from_snapshot()
+    elif engine == 'rollup':
+        results = volume_from_rollups()
+    else:
+        results = count_volume(get_collection())
+
+    volume_data = pd.DataFrame(results)
+    save_to_cache(cache_key, json.dumps(results))
+    return volume_data
+
 
-    function_names = collection.distinct("function_name")
-    networks = collection.distinct("network")
+@stage('query')
+def count_volume(collection, match=None):
+    # Uma única passada na coleção: contagem por (function_name, network, is_error) no servidor
+    grouped = collection.aggregate([
+        {"$match": match or {}},
+        {"$group": {"_id": VOLUME_GROUP_ID, "count": {"$sum": 1}}}
+    ], allowDiskUse=True)
+
+    return fill_volume_combinations(grouped)
+
+
+# Mesmas contagens a partir do snapshot, com as transações com erro e de todas as funções
+def volume_from_snapshot(start=None, end=None):
+    transactions = load_snapshot(columns=VOLUME_COLUMNS, start=start, end=end, is_error=None)
+    with stage('transform'):
+        grouped = transactions.groupby(VOLUME_COLUMNS, observed=True).size()
+        return fill_volume_combinations(
+            {'_id': {'function_name': function_name, 'network': network, 'is_error': int(is_error)},
+             'count': int(count)}
+            for (function_name, network, is_error), count in grouped.items())
+
+
+# Mesmas contagens a partir do rollup diário, no intervalo [start, end)
+def volume_from_rollups(start=None, end=None):
+    grouped = aggregate_rollups([
+        {"$group": {"_id": VOLUME_GROUP_ID, "count": {"$sum": "$count"}}}
+    ], unit='day', start=start, end=end)
+    return fill_volume_combinations(grouped)
+
+
+async def volume_from_rollups_async(start=None, end=None):
+    grouped = await aggregate_rollups_async([
+        {"$group": {"_id": VOLUME_GROUP_ID, "count": {"$sum": "$count"}}}
+    ], unit='day', start=start, end=end)
+    return fill_volume_combinations(grouped)
+
+
+# Versão assíncrona para o dashboard, com o mesmo cache; em um cache miss a contagem é feita no MongoDB
+@traced('flash_loan_volume')
+async def analyze_flash_loan_volume_async(use_cache=True, start=None, end=None):
+    cache_key = 'flash_loan_volume'
+
+    if start is not None or end is not None:
+        return pd.DataFrame(await volume_from_rollups_async(start, end))
+
+    if use_cache:
+        cached_data = await get_from_cache_async(cache_key)
+        if cached_data is not None:
+            return pd.DataFrame(json.loads(cached_data))
+
+    grouped = await aggregate_transactions_async([
+        {"$group": {"_id": VOLUME_GROUP_ID, "count": {"$sum": 1}}}
+    ])
+    results = fill_volume_combinations(grouped)
+    await save_to_cache_async(cache_key, json.dumps(results))
+    return pd.DataFrame(results)
 
-    results = []
 
+def fill_volume_combinations(grouped):
+    counts = {}
+    for row in grouped:
+        key = (row['_id'].get('function_name'), row['_id'].get('network'), row['_id'].get('is_error'))
+        counts[key] = row['count']
+
+    # As funções e redes distintas saem do próprio agrupamento, sem consultas de distinct
+    function_names = sorted({key[0] for key in counts if key[0] is not None}, key=str)
+    networks = sorted({key[1] for key in counts if key[1] is not None}, key=str)
+
+    # Combinações sem transações continuam presentes com contagem zero
+    results = []
     for function_name in function_names:
         for network in networks:
             for is_error in [0, 1]:
-                count = collection.count_documents({
-                    'function_name': function_name,
-                    'network': network,
-                    'is_error': is_error
-                })
                 results.append({
                     'function_name': function_name,
                     'network': network,
                     'is_error': is_error,
-                    'count': count
+                    'count': counts.get((function_name, network, is_error), 0)
                 })
 
-    volume_data = pd.DataFrame(results)
-    save_to_cache(cache_key, json.dumps(results))
-    return volume_data
+    return results
 
 
-def analyze_flash_loan_volume_all(use_cache=True, separate_by_network=True):
+@traced('flash_loan_volume_all')
+def analyze_flash_loan_volume_all(use_cache=True, separate_by_network=True, start=None, end=None):
     cache_key = 'flash_loan_volume'
 
+    if start is not None or end is not None:
+        return combine_volume_all(analyze_flash_loan_volume(start=start, end=end), separate_by_network)
+
     if use_cache:
         cached_data = get_from_cache(cache_key)
         if cached_data is not None:
-            volume_data = pd.DataFrame(json.loads(cached_data))
-            # Filtrar para flashLoan e flashLoanSimple
-            flash_loan_data = volume_data[volume_data['function_name'].isin(['flashLoan', 'flashLoanSimple'])]
-            if separate_by_network:
-                all_data = volume_data.groupby('network')['count'].sum().reset_index()
-                flash_loan_data = flash_loan_data.groupby('network')['count'].sum().reset_index()
-            else:
-                all_data = pd.DataFrame([{'network': 'all', 'count': volume_data['count'].sum()}])
-                flash_loan_data = pd.DataFrame([{'network': 'all', 'count': flash_loan_data['count'].sum()}])
-            flash_loan_data['type'] = 'flashLoan'
-            all_data['type'] = 'all'
-            combined_data = pd.concat([flash_loan_data, all_data])
-            return combined_data
+            return combine_volume_all(pd.DataFrame(json.loads(cached_data)), separate_by_network)
 
     # Se o cache não for usado ou os dados não estiverem disponíveis no cache, usar o método original
-    return analyze_flash_loan_volume(use_cache=False)
\ No newline at end of file
+    return combine_volume_all(analyze_flash_loan_volume(use_cache=False), separate_by_network)
+
+
+@traced('flash_loan_volume_all')
+async def analyze_flash_loan_volume_all_async(use_cache=True, separate_by_network=True, start=None, end=None):
+    volume_data = await analyze_flash_loan_volume_async(use_cache, start, end)
+    return combine_volume_all(volume_data, separate_by_network)
+
+
+def combine_volume_all(volume_data, separate_by_network=True):
+    # Filtrar para flashLoan e flashLoanSimple
+    flash_loan_data = volume_data[volume_data['function_name'].isin(['flashLoan', 'flashLoanSimple'])]
+    if separate_by_network:
+        all_data = volume_data.groupby('network')['count'].sum().reset_index()
+        flash_loan_data = flash_loan_data.groupby('network')['count'].sum().reset_index()
+    else:
+        all_data = pd.DataFrame([{'network': 'all', 'count': volume_data['count'].sum()}])
+        flash_loan_data = pd.DataFrame([{'network': 'all', 'count': flash_loan_data['count'].sum()}])
+    flash_loan_data['type'] = 'flashLoan'
+    all_data['type'] = 'all'
+    combined_data = pd.concat([flash_loan_data, all_data])
+    return combined_data
\ No newline at end of file
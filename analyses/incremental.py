@@ -0,0 +1,197 @@
+import json
+import logging
+import pandas as pd
+from bson import ObjectId
+from src.analyses.flash_loan_fee import FEE_COLUMNS, sum_fees, metrics_from_totals, network_prices_usd
+from src.analyses.flash_loan_frequency import FREQUENCY_COLUMNS, frequency_from_transactions, \
+    day_hour_from_transactions
+from src.analyses.flash_loan_tokens import TOKEN_COLUMNS, extract_token_calls, aggregate_token_calls
+from src.analyses.flash_loan_volume import count_volume
+from src.data.addresses import update_address_dictionary
+from src.data.data_loader import get_db, build_query, load_all_transactions
+from src.data.dataset import FLASH_LOAN_FUNCTIONS
+from src.data.rollups import update_rollups
+from src.data.watermarks import advance_watermarks, delta_filter, after_watermarks
+from src.utils.helpers import get_from_cache, save_to_cache
+
+# Chaves das marcas d'água (maior _id processado por rede, até o limite da janela de segurança de
+# src.data.watermarks) e dos agregados parciais, que cobrem apenas as transações até as marcas
+FLASH_LOANS_WATERMARKS_KEY = 'incremental_flash_loans_watermarks'
+FREQUENCY_PARTIAL_KEY = 'incremental_flash_loan_frequency'
+DAY_HOUR_PARTIAL_KEY = 'incremental_flash_loan_day_hour'
+TOKENS_PARTIAL_KEY = 'incremental_flash_loan_tokens'
+FEE_PARTIAL_KEY = 'incremental_flash_loan_fee'
+VOLUME_WATERMARKS_KEY = 'incremental_flash_loan_volume_watermarks'
+VOLUME_PARTIAL_KEY = 'incremental_flash_loan_volume'
+
+
+def load_watermarks(cache_key):
+    watermarks = get_from_cache(cache_key)
+    if not watermarks:
+        return {}
+    return {network: ObjectId(watermark) for network, watermark in watermarks.items()}
+
+
+def save_watermarks(cache_key, watermarks):
+    save_to_cache(cache_key, {network: str(watermark) for network, watermark in watermarks.items()})
+
+
+def merge_counts(partial, delta, keys, sum_columns=('count',)):
+    if partial is None or partial.empty:
+        merged = delta
+    elif delta is None or delta.empty:
+        merged = partial
+    else:
+        merged = pd.concat([partial, delta], ignore_index=True)
+
+    grouped = merged.groupby(keys, observed=True)
+    result = grouped[list(sum_columns)[0]].sum().reset_index()
+    for column in list(sum_columns)[1:]:
+        result[column] = grouped[column].sum(min_count=1).to_numpy()
+    return result
+
+
+def merge_fee_totals(partial, delta):
+    merged = {network: dict(totals) for network, totals in (partial or {}).items()}
+    for network, totals in delta.items():
+        if network in merged:
+            merged[network]['total_fee_paid'] += totals['total_fee_paid']
+            merged[network]['count'] += totals['count']
+        else:
+            merged[network] = dict(totals)
+    return merged
+
+
+def fee_totals(flash_loans):
+    totals = {}
+    for network, network_df in flash_loans.groupby('network', observed=True):
+        totals[network] = {
+            'total_fee_paid': sum_fees(network_df['gas_used'], network_df['gas_price']),
+            'count': len(network_df)
+        }
+    return totals
+
+
+# Colunas dos flash loans usadas pelos agregados incrementais
+AGGREGATE_COLUMNS = list(dict.fromkeys(FREQUENCY_COLUMNS + TOKEN_COLUMNS + FEE_COLUMNS))
+FLASH_LOAN_PARTIAL_KEYS = [FREQUENCY_PARTIAL_KEY, DAY_HOUR_PARTIAL_KEY, TOKENS_PARTIAL_KEY, FEE_PARTIAL_KEY]
+
+
+def load_flash_loans(filters):
+    if filters is None:
+        return pd.DataFrame(columns=AGGREGATE_COLUMNS)
+    return load_all_transactions(function_name=FLASH_LOAN_FUNCTIONS, columns=AGGREGATE_COLUMNS, filters=filters)
+
+
+# Agregados de um conjunto de flash loans combinados com os parciais (None para começar do zero)
+def merge_flash_loan_aggregates(partials, flash_loans):
+    token_calls = extract_token_calls(flash_loans[TOKEN_COLUMNS])
+    return {
+        FREQUENCY_PARTIAL_KEY: merge_counts(partials[FREQUENCY_PARTIAL_KEY],
+                                            frequency_from_transactions(flash_loans[FREQUENCY_COLUMNS].copy()),
+                                            ['timestamp', 'network']),
+        DAY_HOUR_PARTIAL_KEY: merge_counts(partials[DAY_HOUR_PARTIAL_KEY],
+                                           day_hour_from_transactions(flash_loans[FREQUENCY_COLUMNS].copy()),
+                                           ['network', 'day_of_week', 'hour']),
+        TOKENS_PARTIAL_KEY: merge_counts(partials[TOKENS_PARTIAL_KEY], aggregate_token_calls(token_calls),
+                                         ['network', 'token'], sum_columns=('count', 'volume')),
+        FEE_PARTIAL_KEY: merge_fee_totals(partials[FEE_PARTIAL_KEY], fee_totals(flash_loans[FEE_COLUMNS])),
+    }
+
+
+# Atualiza frequência, dia/hora, tokens e taxas a partir apenas dos flash loans novos desde a última execução.
+# Os parciais avançam até as marcas d'água; os flash loans acima delas (dentro da janela de segurança) são
+# relidos a cada execução e entram apenas nos resultados publicados, sem ser somados aos parciais.
+def refresh_flash_loan_aggregates():
+    collection = get_db()['transactions']
+    query = build_query(function_name=FLASH_LOAN_FUNCTIONS)
+
+    partials = {key: get_from_cache(key) for key in FLASH_LOAN_PARTIAL_KEYS}
+
+    # Sem os agregados parciais completos, recomeça do zero
+    watermarks = load_watermarks(FLASH_LOANS_WATERMARKS_KEY)
+    if any(partial is None for partial in partials.values()):
+        logging.info("Agregados parciais ausentes, recalculando a partir de toda a coleção.")
+        watermarks = {}
+        partials = {key: None for key in FLASH_LOAN_PARTIAL_KEYS}
+
+    new_watermarks = advance_watermarks(collection, query, watermarks)
+    filters = delta_filter(watermarks, new_watermarks)
+    if filters is not None or any(partial is None for partial in partials.values()):
+        delta = load_flash_loans(filters)
+        logging.info(f"{len(delta)} flash loans novos desde a última atualização.")
+        partials = merge_flash_loan_aggregates(partials, delta)
+        for key, partial in partials.items():
+            save_to_cache(key, partial)
+        save_watermarks(FLASH_LOANS_WATERMARKS_KEY, new_watermarks)
+    else:
+        logging.info("Nenhum flash loan novo abaixo da janela de segurança desde a última atualização.")
+
+    recent = load_flash_loans(after_watermarks(new_watermarks))
+    published = merge_flash_loan_aggregates(partials, recent)
+    frequency, day_hour = published[FREQUENCY_PARTIAL_KEY], published[DAY_HOUR_PARTIAL_KEY]
+
+    # Resultados nas mesmas chaves e formatos lidos pelas análises
+    save_to_cache('flash_loan_frequency', frequency)
+    save_to_cache('flash_loan_frequency_day_hour_polygon',
+                  day_hour[day_hour['network'] == 'polygon'].to_json(orient='records'))
+    save_to_cache('flash_loan_frequency_day_hour_ethereum',
+                  day_hour[day_hour['network'] == 'ethereum'].to_json(orient='records'))
+    save_to_cache('flash_loan_tokens', published[TOKENS_PARTIAL_KEY])
+    for network, totals in published[FEE_PARTIAL_KEY].items():
+        if network in network_prices_usd and totals['count']:
+            save_to_cache(f'flash_loan_fee_{network}',
+                          metrics_from_totals(totals['total_fee_paid'], totals['count'], network_prices_usd[network]))
+
+    logging.info("Agregados de flash loans atualizados incrementalmente.")
+
+
+def volume_counts(collection, filters):
+    if filters is None:
+        return pd.DataFrame(columns=['function_name', 'network', 'is_error', 'count'])
+    return pd.DataFrame(count_volume(collection, filters), columns=['function_name', 'network', 'is_error', 'count'])
+
+
+# Atualiza as contagens por (function_name, network, is_error) com as transações novas; como nos flash loans,
+# as transações da janela de segurança são relidas a cada execução e entram apenas no resultado publicado
+def refresh_flash_loan_volume():
+    collection = get_db()['transactions']
+
+    partial = get_from_cache(VOLUME_PARTIAL_KEY)
+    watermarks = load_watermarks(VOLUME_WATERMARKS_KEY) if partial is not None else {}
+
+    new_watermarks = advance_watermarks(collection, {}, watermarks)
+    filters = delta_filter(watermarks, new_watermarks)
+    if filters is not None or partial is None:
+        partial = merge_counts(partial, volume_counts(collection, filters), ['function_name', 'network', 'is_error'])
+        save_to_cache(VOLUME_PARTIAL_KEY, partial)
+        save_watermarks(VOLUME_WATERMARKS_KEY, new_watermarks)
+    else:
+        logging.info("Nenhuma transação nova abaixo da janela de segurança desde a última atualização.")
+
+    volume = merge_counts(partial, volume_counts(collection, after_watermarks(new_watermarks)),
+                          ['function_name', 'network', 'is_error'])
+
+    # Combinações sem transações continuam presentes com contagem zero
+    index = pd.MultiIndex.from_product([sorted(volume['function_name'].unique(), key=str),
+                                        sorted(volume['network'].unique(), key=str), [0, 1]],
+                                       names=['function_name', 'network', 'is_error'])
+    volume = volume.set_index(['function_name', 'network', 'is_error'])['count'] \
+        .reindex(index, fill_value=0).reset_index()
+    volume['count'] = volume['count'].astype('int64')
+
+    results = [{'function_name': row.function_name, 'network': row.network,
+                'is_error': int(row.is_error), 'count': int(row.count)} for row in volume.itertuples(index=False)]
+    save_to_cache('flash_loan_volume', json.dumps(results))
+    logging.info("Volume de transações atualizado incrementalmente.")
+
+
+def refresh_all():
+    refresh_flash_loan_aggregates()
+    refresh_flash_loan_volume()
+    update_rollups()
+    update_address_dictionary()
+
+
+if __name__ == "__main__":
+    refresh_all()
@@ -0,0 +1,250 @@
+import argparse
+import logging
+from decimal import Decimal
+import bson
+import pandas as pd
+from pymongo import MongoClient
+from src.analyses.flash_loan_fee import metrics_from_totals, network_prices_usd, sum_fees_wei
+from src.analyses.flash_loan_tokens import extract_token_calls
+from src.config import MONGO_URI, DATABASE_NAME, COLLECTION_NAME
+from src.data.dataset import FLASH_LOAN_FUNCTIONS
+from src.utils.helpers import redis_client
+
+# Agregados ao vivo mantidos pelo change stream de defi_data.transactions. Requer um replica set
+# (um nó local basta: mongod --replSet rs0 seguido de rs.initiate()).
+LIVE_PREFIX = 'live_flash_loan'
+RESUME_TOKEN_KEY = f'{LIVE_PREFIX}_resume_token'
+NETWORKS_KEY = f'{LIVE_PREFIX}_networks'
+VOLUME_KEY = f'{LIVE_PREFIX}_volume'
+
+# Contador incrementado a cada lote aplicado: versão dos agregados ao vivo lida pelo dashboard
+VERSION_KEY = f'{LIVE_PREFIX}_version'
+
+# Eventos aplicados por transação do Redis, no change stream e na carga inicial
+BATCH_SIZE = 500
+SEED_BATCH_SIZE = 10000
+
+# Campos do documento inserido usados pelos agregados
+WATCHED_FIELDS = ['function_name', 'network', 'is_error', 'timestamp', 'gas_price', 'gas_used', 'input']
+
+# A soma exata das taxas (gas_used * gas_price) de cada lote é acumulada em três campos de 32 bits (o último
+# recebe os bits restantes) com HINCRBY, para que a soma continue exata nos inteiros de 64 bits do Redis
+FEE_LIMB_BITS = 32
+FEE_LIMBS = 3
+FEE_LIMB_MASK = (1 << FEE_LIMB_BITS) - 1
+
+# Inserções acompanhadas pelo change stream, apenas com os campos usados
+CHANGE_PIPELINE = [
+    {"$match": {"operationType": "insert"}},
+    {"$project": {f"fullDocument.{field}": 1 for field in WATCHED_FIELDS}}
+]
+
+
+def live_key(name, network):
+    return f'{LIVE_PREFIX}_{name}:{network}'
+
+
+def load_resume_token():
+    token = redis_client.get(RESUME_TOKEN_KEY)
+    return bson.decode(token) if token else None
+
+
+def apply_volume(pipeline, documents):
+    grouped = documents.groupby(['function_name', 'network', 'is_error']).size()
+    for (function_name, network, is_error), count in grouped.items():
+        pipeline.hincrby(VOLUME_KEY, f'{function_name}|{network}|{int(is_error)}', int(count))
+
+
+def apply_flash_loans(pipeline, flash_loans):
+    for network in flash_loans['network'].unique():
+        pipeline.sadd(NETWORKS_KEY, network)
+
+    timestamps = pd.to_datetime(pd.to_numeric(flash_loans['timestamp']), unit='s')
+    dates = timestamps.dt.date.astype(str)
+    for (network, date), count in flash_loans.groupby(['network', dates]).size().items():
+        pipeline.hincrby(live_key('frequency', network), date, int(count))
+
+    day_hour = flash_loans.groupby(['network', timestamps.dt.day_name(), timestamps.dt.hour]).size()
+    for (network, day_of_week, hour), count in day_hour.items():
+        pipeline.hincrby(live_key('day_hour', network), f'{day_of_week}|{hour}', int(count))
+
+    token_calls = extract_token_calls(flash_loans)
+    for (network, token), calls in token_calls.groupby(['network', 'token']):
+        pipeline.hincrby(live_key('tokens', network), token, len(calls))
+        volume = calls['volume'].sum(min_count=1)
+        if pd.notna(volume):
+            pipeline.hincrbyfloat(live_key('tokens_volume', network), token, float(volume))
+
+    # Flash loans sem gas_used ou gas_price ficam fora da soma (com um aviso), mas entram na contagem, como na
+    # análise completa
+    for network, network_df in flash_loans.groupby('network'):
+        total_wei = sum_fees_wei(network_df['gas_used'], network_df['gas_price'])
+        fee_key = live_key('fee', network)
+        for limb in range(FEE_LIMBS):
+            value = total_wei >> (FEE_LIMB_BITS * limb)
+            pipeline.hincrby(fee_key, f'limb{limb}', value & FEE_LIMB_MASK if limb < FEE_LIMBS - 1 else value)
+        pipeline.hincrby(fee_key, 'count', len(network_df))
+
+
+# Aplica um lote de inserções e grava o resume token na mesma transação do Redis: após uma queda,
+# o updater retoma exatamente do último lote aplicado, sem contar eventos duas vezes. Sem token (lotes da carga
+# inicial), apenas os agregados são atualizados.
+def apply_batch(documents, resume_token=None):
+    # Colunas object: com um valor ausente, o pandas converteria os inteiros de gas para float, perdendo precisão
+    documents = pd.DataFrame(documents, columns=WATCHED_FIELDS, dtype=object)
+    flash_loans = documents[documents['function_name'].isin(FLASH_LOAN_FUNCTIONS) & (documents['is_error'] == 0)]
+
+    pipeline = redis_client.pipeline(transaction=True)
+    if not documents.empty:
+        apply_volume(pipeline, documents.dropna(subset=['function_name', 'network', 'is_error']))
+        pipeline.incr(VERSION_KEY)
+    if not flash_loans.empty:
+        apply_flash_loans(pipeline, flash_loans.reset_index(drop=True))
+    if resume_token is not None:
+        pipeline.set(RESUME_TOKEN_KEY, bson.encode(resume_token))
+    pipeline.execute()
+
+
+def clear_live_aggregates():
+    keys = list(redis_client.scan_iter(match=f'{LIVE_PREFIX}_*'))
+    if keys:
+        redis_client.delete(*keys)
+
+
+# Carga inicial dos agregados a partir da coleção inteira. O resume token é obtido antes da leitura, para que
+# nenhuma inserção feita durante a carga se perca (uma inserção que a leitura também alcance é contada duas vezes,
+# então a carga deve ser feita sem escritas concorrentes quando a contagem precisa ser exata). O token só é gravado
+# no último lote: uma carga interrompida deixa o Redis sem token e é refeita do zero na próxima execução.
+def seed_live_aggregates(collection, batch_size=SEED_BATCH_SIZE):
+    with collection.watch(CHANGE_PIPELINE) as stream:
+        resume_token = stream.resume_token
+
+    logging.info("Carregando os agregados ao vivo a partir da coleção inteira...")
+    clear_live_aggregates()
+
+    cursor = collection.aggregate([{"$project": {field: 1 for field in WATCHED_FIELDS}}],
+                                  batchSize=batch_size, allowDiskUse=True)
+    batch = []
+    seeded = 0
+    for document in cursor:
+        batch.append(document)
+        if len(batch) == batch_size:
+            apply_batch(batch)
+            seeded += len(batch)
+            batch = []
+    apply_batch(batch, resume_token)
+    seeded += len(batch)
+
+    logging.info(f"{seeded} transações carregadas nos agregados ao vivo.")
+    return resume_token
+
+
+def run_updater(collection, batch_size=BATCH_SIZE, max_await_time_ms=1000):
+    resume_token = load_resume_token()
+    if resume_token is None:
+        logging.info("Nenhum resume token salvo, fazendo a carga inicial dos agregados.")
+        resume_token = seed_live_aggregates(collection)
+    else:
+        logging.info("Retomando o change stream do último lote aplicado.")
+
+    with collection.watch(CHANGE_PIPELINE, resume_after=resume_token,
+                          max_await_time_ms=max_await_time_ms) as stream:
+        batch = []
+        while stream.alive:
+            change = stream.try_next()
+            if change is not None:
+                batch.append(change['fullDocument'])
+                if len(batch) < batch_size:
+                    continue
+
+            # Lote cheio ou stream ocioso: aplica o que houver e avança o checkpoint
+            if batch or (stream.resume_token is not None and stream.resume_token != resume_token):
+                resume_token = stream.resume_token
+                apply_batch(batch, resume_token)
+                if batch:
+                    logging.info(f"{len(batch)} inserções aplicadas aos agregados ao vivo.")
+                batch = []
+
+
+# Chaves da versão dos agregados ao vivo: None enquanto a carga inicial não terminou (sem resume token gravado)
+LIVE_VERSION_KEYS = [VERSION_KEY, RESUME_TOKEN_KEY]
+
+
+def version_from_live_keys(version, resume_token):
+    if resume_token is None:
+        return None
+    return version.decode() if version else '0'
+
+
+def live_version():
+    return version_from_live_keys(*redis_client.mget(LIVE_VERSION_KEYS))
+
+
+# Leituras dos agregados ao vivo, nos mesmos formatos das análises
+def live_networks():
+    return sorted(network.decode() for network in redis_client.smembers(NETWORKS_KEY))
+
+
+def read_live_frequency():
+    rows = []
+    for network in live_networks():
+        for date, count in redis_client.hgetall(live_key('frequency', network)).items():
+            rows.append({'timestamp': pd.Timestamp(date.decode()).date(), 'network': network, 'count': int(count)})
+    frequency_data = pd.DataFrame(rows, columns=['timestamp', 'network', 'count'])
+    return frequency_data.sort_values(['timestamp', 'network']).reset_index(drop=True)
+
+
+def read_live_day_hour(network):
+    rows = []
+    for field, count in redis_client.hgetall(live_key('day_hour', network)).items():
+        day_of_week, hour = field.decode().split('|')
+        rows.append({'network': network, 'day_of_week': day_of_week, 'hour': int(hour), 'count': int(count)})
+    grouped_data = pd.DataFrame(rows, columns=['network', 'day_of_week', 'hour', 'count'])
+    return grouped_data.sort_values(['day_of_week', 'hour']).reset_index(drop=True)
+
+
+def read_live_tokens():
+    rows = []
+    for network in live_networks():
+        volumes = redis_client.hgetall(live_key('tokens_volume', network))
+        for token, count in redis_client.hgetall(live_key('tokens', network)).items():
+            volume = volumes.get(token)
+            rows.append({'network': network, 'token': token.decode(), 'count': int(count),
+                         'volume': float(volume) if volume is not None else float('nan')})
+    token_data = pd.DataFrame(rows, columns=['network', 'token', 'count', 'volume'])
+    return token_data.sort_values(['network', 'token']).reset_index(drop=True)
+
+
+def read_live_volume():
+    counts = {}
+    for field, count in redis_client.hgetall(VOLUME_KEY).items():
+        function_name, network, is_error = field.decode().split('|')
+        counts[(function_name, network, int(is_error))] = int(count)
+
+    function_names = sorted({key[0] for key in counts})
+    networks = sorted({key[1] for key in counts})
+    return [{'function_name': function_name, 'network': network, 'is_error': is_error,
+             'count': counts.get((function_name, network, is_error), 0)}
+            for function_name in function_names for network in networks for is_error in [0, 1]]
+
+
+def read_live_fee(network):
+    fields = redis_client.hgetall(live_key('fee', network))
+    count = int(fields.get(b'count', 0))
+    if not count:
+        return {}
+    price_usd = network_prices_usd.get(network)
+    if price_usd is None:
+        raise ValueError(f"Preço em USD desconhecido para a rede {network}; adicione-o em network_prices_usd.")
+    total_wei = sum(int(fields.get(f'limb{limb}'.encode(), 0)) << (FEE_LIMB_BITS * limb) for limb in range(FEE_LIMBS))
+    return metrics_from_totals(Decimal(total_wei).scaleb(-18), count, price_usd)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Atualiza os agregados ao vivo a partir do change stream.")
+    parser.add_argument('--uri', default=MONGO_URI)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    run_updater(MongoClient(args.uri)[DATABASE_NAME][COLLECTION_NAME], args.batch_size)
@@ -1,89 +1,203 @@
+import numpy as np
 import pandas as pd
-from pymongo import MongoClient
-from bson import ObjectId
+from src.config import DATA_SOURCE
+from src.data.addresses import get_address_dictionary, WalletIndex, NO_ADDRESS
+from src.data.data_loader import load_all_transactions, build_query
+from src.data.dataset import FLASH_LOAN_FUNCTIONS
+from src.utils.clients import get_collection
 from src.utils.helpers import get_from_cache, save_to_cache
-import json
+from src.utils.tracing import traced, stage, count
 
+# Colunas das transações usadas na mineração das sequências
+SEQUENCE_COLUMNS = ['network', 'from', 'function_name', 'timestamp']
 
-def analyze_flash_loan_wallets(use_cache=True):
-    cache_key_polygon = 'flash_loan_wallets_analysis_polygon'
-    cache_key_ethereum = 'flash_loan_wallets_analysis_ethereum'
+# Transações seguintes examinadas após cada flash loan, dentro da janela (em unidades da coluna de ordem:
+# segundos para timestamp, blocos para um número de bloco; None para não limitar)
+NEXT_K = 5
+SEQUENCE_WINDOW = 24 * 60 * 60
+NGRAM_SIZES = (2, 3)
 
+# Carteiras por consulta no filtro $in, bem abaixo do limite de 16 MB de um comando do MongoDB
+WALLET_BATCH_SIZE = 10000
+
+# Resultados gravados no cache: funções por passo, n-gramas e matriz de transições, todos por rede
+SEQUENCE_CACHE_KEYS = {
+    'steps': 'flash_loan_sequence_steps',
+    'ngrams': 'flash_loan_sequence_ngrams',
+    'transitions': 'flash_loan_sequence_transitions',
+}
+
+
+@traced('flash_loan_sequences')
+def analyze_flash_loan_sequences(use_cache=True, next_k=NEXT_K, window=SEQUENCE_WINDOW, ngram_sizes=NGRAM_SIZES):
     if use_cache:
-        cached_data_polygon = get_from_cache(cache_key_polygon)
-        cached_data_ethereum = get_from_cache(cache_key_ethereum)
-        if cached_data_polygon is not None and cached_data_ethereum is not None:
-            return pd.DataFrame(json.loads(cached_data_polygon)), pd.DataFrame(json.loads(cached_data_ethereum))
-
-    client = MongoClient()
-    db = client['defi_data']
-    collection = db['transactions']
-
-    # Query to get wallets and their networks for flash loans
-    flash_loan_wallets = collection.aggregate([
-        {"$match": {"function_name": {"$in": ["flashLoan", "flashLoanSimple"]}}},
-        {"$group": {"_id": {"wallet": "$from", "network": "$network"}}}
-    ])
-
-    # Flatten the aggregation result
-    flash_loan_wallets_data = pd.DataFrame(list(flash_loan_wallets))
-    flash_loan_wallets_data = pd.concat(
-        [flash_loan_wallets_data['_id'].apply(pd.Series), flash_loan_wallets_data.drop(columns=['_id'])], axis=1)
-
-    # Select 20 wallets from each network
-    polygon_wallets = flash_loan_wallets_data[flash_loan_wallets_data['network'] == 'polygon'].head(20)[
-        'wallet'].tolist()
-    ethereum_wallets = flash_loan_wallets_data[flash_loan_wallets_data['network'] == 'ethereum'].head(20)[
-        'wallet'].tolist()
-
-    # Analyze the next 5 interactions of these wallets on the same network
-    transactions_data_polygon = []
-    transactions_data_ethereum = []
-
-    for wallet in polygon_wallets:
-        network = 'polygon'
-        flash_loan_transactions = list(collection.find(
-            {"from": wallet, "network": network, "function_name": {"$in": ["flashLoan", "flashLoanSimple"]}}).sort(
-            "timestamp", 1))
-
-        for flash_loan_transaction in flash_loan_transactions:
-            flash_loan_transaction['_id'] = str(flash_loan_transaction['_id'])
-            flash_loan_transaction['wallet'] = wallet  # Add wallet to each transaction
-            transactions_data_polygon.append(flash_loan_transaction)
-
-            # Get the next 5 transactions after the flash loan transaction
-            next_transactions = list(collection.find(
-                {"from": wallet, "network": network, "timestamp": {"$gt": flash_loan_transaction['timestamp']}}).sort(
-                "timestamp", 1).limit(5))
-            for transaction in next_transactions:
-                transaction['_id'] = str(transaction['_id'])
-                transaction['wallet'] = wallet  # Add wallet to each transaction
-                transactions_data_polygon.append(transaction)
-
-    for wallet in ethereum_wallets:
-        network = 'ethereum'
-        flash_loan_transactions = list(collection.find(
-            {"from": wallet, "network": network, "function_name": {"$in": ["flashLoan", "flashLoanSimple"]}}).sort(
-            "timestamp", 1))
-
-        for flash_loan_transaction in flash_loan_transactions:
-            flash_loan_transaction['_id'] = str(flash_loan_transaction['_id'])
-            flash_loan_transaction['wallet'] = wallet  # Add wallet to each transaction
-            transactions_data_ethereum.append(flash_loan_transaction)
-
-            # Get the next 5 transactions after the flash loan transaction
-            next_transactions = list(collection.find(
-                {"from": wallet, "network": network, "timestamp": {"$gt": flash_loan_transaction['timestamp']}}).sort(
-                "timestamp", 1).limit(5))
-            for transaction in next_transactions:
-                transaction['_id'] = str(transaction['_id'])
-                transaction['wallet'] = wallet  # Add wallet to each transaction
-                transactions_data_ethereum.append(transaction)
-
-    transactions_df_polygon = pd.DataFrame(transactions_data_polygon)
-    transactions_df_ethereum = pd.DataFrame(transactions_data_ethereum)
-
-    save_to_cache(cache_key_polygon, json.dumps(transactions_df_polygon.to_dict(orient='records')))
-    save_to_cache(cache_key_ethereum, json.dumps(transactions_df_ethereum.to_dict(orient='records')))
-
-    return transactions_df_polygon, transactions_df_ethereum
+        cached = {name: get_from_cache(cache_key) for name, cache_key in SEQUENCE_CACHE_KEYS.items()}
+        if all(data is not None for data in cached.values()):
+            return cached
+
+    transactions = load_sequence_transactions()
+    sequences = mine_flash_loan_sequences(transactions, next_k, window, ngram_sizes)
+
+    for name, cache_key in SEQUENCE_CACHE_KEYS.items():
+        save_to_cache(cache_key, sequences[name])
+    return sequences
+
+
+# Carteiras com ao menos um flash loan sem erro, agrupadas no servidor
+@stage('query')
+def flash_loan_wallets(collection):
+    rows = collection.aggregate([
+        {"$match": build_query(function_name=FLASH_LOAN_FUNCTIONS)},
+        {"$group": {"_id": "$from"}}
+    ], allowDiskUse=True)
+    return sorted(row['_id'] for row in rows if row['_id'] is not None)
+
+
+# Todas as transações (de qualquer função) das carteiras com flash loans. No MongoDB o filtro por carteira vai na
+# consulta, pelo índice (from, network, timestamp), em lotes de carteiras; o snapshot é lido por inteiro e
+# filtrado em memória pelo mine_flash_loan_sequences.
+def load_sequence_transactions():
+    if DATA_SOURCE == 'snapshot':
+        return load_all_transactions(columns=SEQUENCE_COLUMNS)
+
+    wallets = flash_loan_wallets(get_collection())
+    chunks = [load_all_transactions(columns=SEQUENCE_COLUMNS,
+                                    filters={'from': {'$in': wallets[start:start + WALLET_BATCH_SIZE]}})
+              for start in range(0, len(wallets), WALLET_BATCH_SIZE)]
+    if not chunks:
+        return pd.DataFrame(columns=SEQUENCE_COLUMNS)
+
+    # Os lotes têm dicionários próprios: as colunas categóricas são refeitas sobre a união
+    transactions = pd.concat(chunks, ignore_index=True)
+    return transactions.astype({column: 'category' for column in ['network', 'from', 'function_name']})
+
+
+# Funções chamadas em cada passo após os flash loans, separadas por rede (polygon, ethereum)
+def analyze_flash_loan_wallets(use_cache=True, next_k=NEXT_K, window=SEQUENCE_WINDOW):
+    steps = analyze_flash_loan_sequences(use_cache=use_cache, next_k=next_k, window=window)['steps']
+    return (steps[steps['network'] == 'polygon'].reset_index(drop=True),
+            steps[steps['network'] == 'ethereum'].reset_index(drop=True))
+
+
+# Sequências de todos os flash loans de todas as carteiras, por rede. `order_column` ordena as transações de
+# cada carteira e define a janela (timestamp, ou um número de bloco quando disponível). Sem `dictionary`, as
+# carteiras recebem ids do dicionário compartilhado pelo processo.
+def mine_flash_loan_sequences(transactions, next_k=NEXT_K, window=SEQUENCE_WINDOW, ngram_sizes=NGRAM_SIZES,
+                              order_column='timestamp', dictionary=None):
+    transactions = transactions.dropna(subset=['network', 'from', order_column])
+    function_names = transactions['function_name'].astype('category')
+    transactions = transactions.assign(function_name=function_names)
+
+    # Apenas as carteiras com algum flash loan entram no índice (o carregamento do MongoDB já chega filtrado)
+    is_flash_loan = function_names.isin(FLASH_LOAN_FUNCTIONS)
+    transactions = transactions[transactions['from'].isin(transactions.loc[is_flash_loan, 'from'].unique())]
+
+    names = np.asarray(function_names.cat.categories, dtype=object)
+    flash_codes = np.flatnonzero(np.isin(names, FLASH_LOAN_FUNCTIONS))
+    if dictionary is None:
+        dictionary = get_address_dictionary()
+
+    results = {name: [] for name in SEQUENCE_CACHE_KEYS}
+    for network, network_transactions in transactions.groupby('network', observed=True, sort=True):
+        index = WalletIndex(dictionary.encode(network_transactions['from'], add=True),
+                            network_transactions[order_column].to_numpy(), len(dictionary))
+        codes = network_transactions['function_name'].cat.codes.to_numpy()[index.order].astype(np.int64)
+        sequences = flash_loan_sequences(index, codes, flash_codes, next_k, window)
+        count('flash_loan_sequences', len(sequences))
+
+        network_results = {
+            'steps': step_counts(sequences, names),
+            'ngrams': ngram_counts(sequences, names, ngram_sizes),
+            'transitions': transition_counts(sequences, names),
+        }
+        for name, data in network_results.items():
+            results[name].append(data.assign(network=str(network)))
+
+    columns = {
+        'steps': ['network', 'step', 'function_name', 'count'],
+        'ngrams': ['network', 'n', 'ngram', 'count'],
+        'transitions': ['network', 'source', 'target', 'count', 'probability'],
+    }
+    return {name: pd.concat(frames, ignore_index=True)[columns[name]] if frames else pd.DataFrame(columns=columns[name])
+            for name, frames in results.items()}
+
+
+# Uma linha por flash loan: o código da sua função seguido dos códigos das next_k transações seguintes da mesma
+# carteira com ordem em (t, t + window], ou -1 onde a carteira tem menos transações na janela. Todas as buscas
+# são feitas de uma vez com searchsorted sobre a chave (carteira, posto da ordem), crescente no índice.
+@stage('transform')
+def flash_loan_sequences(index, codes, flash_codes, next_k=NEXT_K, window=SEQUENCE_WINDOW):
+    values, ranks = np.unique(index.timestamps, return_inverse=True)
+    wallets = index.wallet_ids.astype(np.uint64) << np.uint64(32)
+    keys = wallets | ranks.astype(np.uint64)
+
+    flash_loans = np.flatnonzero(np.isin(codes, flash_codes) & (index.wallet_ids != NO_ADDRESS))
+
+    # Primeira transação estritamente posterior ao flash loan e fim da janela (ou da carteira)
+    starts = np.searchsorted(keys, keys[flash_loans] + np.uint64(1), side='left')
+    if window is None:
+        limits = np.full(len(flash_loans), len(values), dtype=np.uint64)
+    else:
+        limits = np.searchsorted(values, index.timestamps[flash_loans] + window, side='right').astype(np.uint64)
+    ends = np.searchsorted(keys, wallets[flash_loans] | limits, side='left')
+
+    steps = np.arange(next_k)
+    positions = starts[:, None] + steps
+    found = steps < (ends - starts)[:, None]
+    following = np.where(found, codes[np.where(found, positions, 0)], -1)
+    return np.column_stack([codes[flash_loans], following])
+
+
+# Frequência de cada função em cada passo (0 = o próprio flash loan)
+@stage('aggregate')
+def step_counts(sequences, names):
+    n_steps = sequences.shape[1]
+    steps = np.broadcast_to(np.arange(n_steps), sequences.shape)
+    valid = sequences >= 0
+    counts = np.bincount(steps[valid] * len(names) + sequences[valid], minlength=n_steps * len(names))
+
+    step, code = np.divmod(np.flatnonzero(counts), len(names))
+    return pd.DataFrame({'step': step, 'function_name': names[code], 'count': counts[counts > 0]})
+
+
+# Janelas de n funções consecutivas (começando no flash loan ou em qualquer passo seguinte), codificadas em
+# um inteiro na base len(names) para a contagem
+def ngram_codes(sequences, n, base):
+    windows = np.lib.stride_tricks.sliding_window_view(sequences, n, axis=1).reshape(-1, n)
+    windows = windows[(windows >= 0).all(axis=1)]
+    return windows @ (base ** np.arange(n - 1, -1, -1, dtype=np.int64))
+
+
+@stage('aggregate')
+def ngram_counts(sequences, names, ngram_sizes=NGRAM_SIZES):
+    frames = []
+    for n in ngram_sizes:
+        if n > sequences.shape[1] or len(names) ** n >= 2 ** 63:
+            continue
+        grams, counts = np.unique(ngram_codes(sequences, n, len(names)), return_counts=True)
+        digits = [names[(grams // len(names) ** power) % len(names)] for power in range(n - 1, -1, -1)]
+        labels = [' > '.join(gram) for gram in zip(*digits)]
+        frames.append(pd.DataFrame({'n': n, 'ngram': labels, 'count': counts}))
+
+    if not frames:
+        return pd.DataFrame(columns=['n', 'ngram', 'count'])
+    return pd.concat(frames, ignore_index=True).sort_values(['n', 'count'], ascending=[True, False],
+                                                            ignore_index=True)
+
+
+# Matriz de transições entre funções consecutivas das sequências, em formato longo: contagem e probabilidade
+# de `target` vir logo após `source`
+@stage('aggregate')
+def transition_counts(sequences, names):
+    base = len(names)
+    pairs = ngram_codes(sequences, 2, base) if sequences.shape[1] > 1 else np.empty(0, dtype=np.int64)
+    matrix = np.bincount(pairs, minlength=base * base).reshape(base, base)
+
+    source, target = np.nonzero(matrix)
+    counts = matrix[source, target]
+    return pd.DataFrame({
+        'source': names[source],
+        'target': names[target],
+        'count': counts,
+        'probability': counts / matrix.sum(axis=1)[source],
+    })
@@ -0,0 +1,180 @@
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from pymongo import MongoClient
+import src.utils.helpers as helpers
+from src.analyses.flash_loan_fee import analyze_flash_loan_fee, FEE_COLUMNS
+from src.analyses.flash_loan_frequency import analyze_flash_loan_frequency, extract_day_hour, FREQUENCY_COLUMNS
+from src.analyses.flash_loan_tokens import analyze_flash_loan_tokens, TOKEN_COLUMNS
+from src.analyses.flash_loan_volume import count_volume
+from src.analyses.transaction_sequence import mine_flash_loan_sequences, SEQUENCE_COLUMNS
+from src.benchmarks.synthetic import generate_flash_loans, generate_transactions, insert_transactions
+from src.data.addresses import AddressDictionary
+from src.data.dataset import FlashLoanDataset
+from src.utils.clients import get_redis
+from src.utils.decoder_input import decode_flash_loan_batch
+from src.utils.helpers import encode_cache_value, decode_cache_value
+
+DEFAULT_SCALES = [10000, 100000, 1000000]
+
+# Benchmarks cujos dados são preparados à parte (transações de todas as carteiras, coleção do MongoDB): a
+# preparação só é feita quando algum deles é selecionado
+SEQUENCE_BENCHMARKS = ['mine_flash_loan_sequences']
+MONGO_BENCHMARKS = ['count_volume']
+
+# Banco do Redis (no servidor do TCC_REDIS_URL) usado pelas análises durante o benchmark, para não sobrescrever o
+# cache do dashboard
+BENCHMARK_REDIS_DB = 15
+
+
+# Melhor tempo entre `repeat` execuções e pico de memória alocada (tracemalloc) em uma execução à parte,
+# já que o rastreamento das alocações deixa a função mais lenta. Buffers do pool do Arrow não passam pelo
+# tracemalloc e ficam de fora do pico.
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(timings), peak
+
+
+# Benchmarks que rodam sobre os flash loans em memória: (nome, função sem argumentos)
+def frame_benchmarks(flash_loans):
+    dataset = FlashLoanDataset(FEE_COLUMNS + FREQUENCY_COLUMNS + TOKEN_COLUMNS, transactions=flash_loans)
+    payload = encode_cache_value(flash_loans)
+    return [
+        ('analyze_flash_loan_fee', lambda: analyze_flash_loan_fee(use_cache=False, dataset=dataset)),
+        ('analyze_flash_loan_frequency',
+         lambda: analyze_flash_loan_frequency(use_cache=False, dataset=dataset, engine='pandas')),
+        ('extract_day_hour', lambda: extract_day_hour(use_cache=False, dataset=dataset, engine='pandas')),
+        ('analyze_flash_loan_tokens', lambda: analyze_flash_loan_tokens(use_cache=False, dataset=dataset)),
+        ('decode_flash_loan_batch', lambda: decode_flash_loan_batch(flash_loans['input'], errors='coerce',
+                                                                     explode=True)),
+        ('encode_cache_value', lambda: encode_cache_value(flash_loans)),
+        ('decode_cache_value', lambda: decode_cache_value(payload)),
+    ]
+
+
+# Benchmarks das consultas executadas no MongoDB, sobre uma coleção preenchida com os mesmos dados
+def mongo_benchmarks(collection):
+    return [
+        ('count_volume', lambda: count_volume(collection)),
+    ]
+
+
+# Mineração das sequências sobre todas as transações sem erro (não só os flash loans). Cada execução usa um
+# dicionário de endereços novo: o compartilhado cresceria a cada repetição (e viria do arquivo do dicionário).
+def sequence_benchmarks(rows, seed):
+    transactions = pd.concat([chunk.loc[chunk['is_error'] == 0, SEQUENCE_COLUMNS]
+                              for chunk in generate_transactions(rows, seed)], ignore_index=True)
+    transactions = transactions.astype({'network': 'category', 'from': 'category', 'function_name': 'category'})
+    return [
+        ('mine_flash_loan_sequences',
+         lambda: mine_flash_loan_sequences(transactions, dictionary=AddressDictionary())),
+    ]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def selected(names, only):
+    return not only or any(name in only for name in names)
+
+
+def run_benchmarks(scales=DEFAULT_SCALES, seed=0, repeat=3, collection=None, only=None):
+    results = []
+    for rows in scales:
+        flash_loans = generate_flash_loans(rows, seed)
+        benchmarks = frame_benchmarks(flash_loans)
+        if selected(SEQUENCE_BENCHMARKS, only):
+            benchmarks += sequence_benchmarks(rows, seed)
+
+        if collection is not None and selected(MONGO_BENCHMARKS, only):
+            collection.drop()
+            insert_transactions(collection, rows, seed)
+            collection.create_index([('from', 1), ('network', 1), ('timestamp', 1)])
+            benchmarks += mongo_benchmarks(collection)
+
+        for name, func in benchmarks:
+            if only and name not in only:
+                continue
+            seconds, peak = measure(func, repeat)
+            results.append({'benchmark': name, 'rows': rows, 'flash_loans': len(flash_loans),
+                            'seconds': seconds, 'peak_memory_bytes': peak})
+            print(f"{name:<32} {rows:>10} linhas  {seconds:10.4f} s  {peak / 2 ** 20:10.1f} MiB")
+
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'seed': seed,
+        'repeat': repeat,
+        'results': results
+    }
+
+
+# Razão entre os tempos e picos de memória de dois relatórios (novo / antigo) para cada benchmark e escala
+def compare_reports(old_report, new_report):
+    old_results = {(result['benchmark'], result['rows']): result for result in old_report['results']}
+    comparison = []
+    for result in new_report['results']:
+        old = old_results.get((result['benchmark'], result['rows']))
+        if old is None:
+            continue
+        comparison.append({
+            'benchmark': result['benchmark'],
+            'rows': result['rows'],
+            'time_ratio': result['seconds'] / old['seconds'] if old['seconds'] else float('inf'),
+            'memory_ratio': (result['peak_memory_bytes'] / old['peak_memory_bytes']
+                             if old['peak_memory_bytes'] else float('inf'))
+        })
+    return comparison
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mede tempo e memória das análises sobre dados sintéticos.")
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', nargs='+', help="Executa apenas os benchmarks com estes nomes")
+    parser.add_argument('--uri', help="MongoDB usado pelos benchmarks das consultas (omitido: apenas em memória)")
+    parser.add_argument('--database', default='tcc_benchmark')
+    parser.add_argument('--redis-db', type=int, default=BENCHMARK_REDIS_DB)
+    parser.add_argument('--output', default='benchmark_report.json')
+    parser.add_argument('--compare', help="Relatório anterior para comparar com o gerado")
+    args = parser.parse_args()
+
+    helpers.redis_client = get_redis(args.redis_db)
+    collection = MongoClient(args.uri)[args.database]['transactions'] if args.uri else None
+
+    report = run_benchmarks(args.scales, args.seed, args.repeat, collection, args.only)
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Relatório salvo em {args.output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            old_report = json.load(file)
+        for row in compare_reports(old_report, report):
+            print(f"{row['benchmark']:<32} {row['rows']:>10} linhas  tempo {row['time_ratio']:6.2f}x  "
+                  f"memória {row['memory_ratio']:6.2f}x")
@@ -0,0 +1,74 @@
+import argparse
+import time
+from pymongo import MongoClient
+from src.analyses.flash_loan_volume import count_volume
+
+
+# Implementação anterior: um count_documents por combinação (function_name x network x is_error)
+def count_volume_loop(collection):
+    function_names = collection.distinct("function_name")
+    networks = collection.distinct("network")
+
+    results = []
+    for function_name in function_names:
+        for network in networks:
+            for is_error in [0, 1]:
+                count = collection.count_documents({
+                    'function_name': function_name,
+                    'network': network,
+                    'is_error': is_error
+                })
+                results.append({
+                    'function_name': function_name,
+                    'network': network,
+                    'is_error': is_error,
+                    'count': count
+                })
+    return results
+
+
+def time_call(func, collection, repeat):
+    timings = []
+    results = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = func(collection)
+        timings.append(time.perf_counter() - start)
+    return min(timings), results
+
+
+def as_counts(results):
+    return {(r['function_name'], r['network'], r['is_error']): r['count'] for r in results}
+
+
+def run_benchmark(collection, repeat=3):
+    loop_time, loop_results = time_call(count_volume_loop, collection, repeat)
+    group_time, group_results = time_call(count_volume, collection, repeat)
+
+    # As duas implementações precisam devolver exatamente as mesmas contagens
+    if as_counts(loop_results) != as_counts(group_results):
+        raise AssertionError("As contagens do $group diferem das contagens por count_documents.")
+
+    return {
+        'combinations': len(group_results),
+        'loop_seconds': loop_time,
+        'group_seconds': group_time,
+        'speedup': loop_time / group_time if group_time else float('inf')
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara count_documents por combinação com um único $group.")
+    parser.add_argument('--uri', default='mongodb://localhost:27017/')
+    parser.add_argument('--database', default='defi_data')
+    parser.add_argument('--collection', default='transactions')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    collection = MongoClient(args.uri)[args.database][args.collection]
+    report = run_benchmark(collection, args.repeat)
+
+    print(f"Combinações: {report['combinations']}")
+    print(f"Loop count_documents: {report['loop_seconds']:.3f} s")
+    print(f"$group único: {report['group_seconds']:.3f} s")
+    print(f"Ganho: {report['speedup']:.1f}x")
@@ -0,0 +1,159 @@
+import argparse
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pymongo import MongoClient
+from src.data.schema import canonical_frame
+
+# Gerador determinístico de transações com o mesmo esquema da coleção defi_data.transactions.
+# As chamadas flashLoan/flashLoanSimple carregam calldata ABI válida, decodificável pelo decoder_input.
+
+CHUNK_SIZE = 100000
+
+NETWORKS = ['ethereum', 'polygon']
+NETWORK_WEIGHTS = [0.4, 0.6]
+
+# Funções comuns na coleção além dos flash loans, com seus method IDs
+OTHER_FUNCTIONS = {
+    'transfer': '0xa9059cbb',
+    'approve': '0x095ea7b3',
+    'deposit': '0xe8eda9df',
+    'withdraw': '0x69328dec',
+    'borrow': '0xa415bcad',
+    'repay': '0x573ade81',
+    'swapExactTokensForTokens': '0x38ed1739'
+}
+FLASH_LOAN_METHOD_IDS = {'flashLoanSimple': '0x5cffe9de', 'flashLoan': '0xab9c4b5d'}
+
+# Assets emprestados: os tokens com casas decimais conhecidas e alguns endereços sem precisão cadastrada
+ASSETS = [
+    '0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48',
+    '0xdac17f958d2ee523a2206206994597c13d831ec7',
+    '0x6b175474e89094c44da98b954eedeac495271d0f',
+    '0xc02aaa39b223fe8d0a0e5c4f27ead9083c756cc2',
+    '0x2260fac5e5542a773aa44fbcfedf7c193bc2c599'
+]
+
+# Início do período gerado (2022-01-01 UTC) e duração média entre transações, em segundos
+START_TIMESTAMP = 1640995200
+SECONDS_PER_TRANSACTION = 2
+
+
+def word(value):
+    return format(value, '064x')
+
+
+def address_word(address):
+    return address[2:].rjust(64, '0')
+
+
+# flashLoanSimple(address receiver, address asset, uint256 amount, bytes params, uint16 referralCode)
+def encode_flash_loan_simple(receiver, asset, amount):
+    return (FLASH_LOAN_METHOD_IDS['flashLoanSimple'] + address_word(receiver) + address_word(asset) + word(amount) +
+            word(5 * 32) + word(0) + word(0))
+
+
+# flashLoan(address receiver, address[] assets, uint256[] amounts, uint256[] modes, address onBehalfOf,
+#           bytes params, uint16 referralCode)
+def encode_flash_loan(receiver, assets, amounts):
+    k = len(assets)
+    assets_offset = 7 * 32
+    amounts_offset = assets_offset + 32 * (1 + k)
+    modes_offset = amounts_offset + 32 * (1 + k)
+    params_offset = modes_offset + 32 * (1 + k)
+
+    head = (address_word(receiver) + word(assets_offset) + word(amounts_offset) + word(modes_offset) +
+            address_word(receiver) + word(params_offset) + word(0))
+    tail = (word(k) + ''.join(address_word(asset) for asset in assets) +
+            word(k) + ''.join(word(amount) for amount in amounts) +
+            word(k) + word(0) * k +
+            word(0))
+    return FLASH_LOAN_METHOD_IDS['flashLoan'] + head + tail
+
+
+def random_addresses(rng, count):
+    raw = rng.bytes(20 * count).hex()
+    return ['0x' + raw[40 * index:40 * (index + 1)] for index in range(count)]
+
+
+# Um bloco de `size` transações a partir da posição `offset` da sequência gerada com a semente `seed`
+def generate_chunk(offset, size, seed=0, flash_loan_ratio=0.05, error_ratio=0.03, wallets=None):
+    rng = np.random.default_rng([seed, offset])
+    wallets = wallets if wallets is not None else random_addresses(np.random.default_rng(seed), 1000)
+
+    is_flash_loan = rng.random(size) < flash_loan_ratio
+    is_simple = rng.random(size) < 0.7
+    other_names = np.array(list(OTHER_FUNCTIONS))
+    function_name = np.where(is_flash_loan, np.where(is_simple, 'flashLoanSimple', 'flashLoan'),
+                             other_names[rng.integers(0, len(other_names), size)])
+    network = np.array(NETWORKS)[rng.choice(len(NETWORKS), size, p=NETWORK_WEIGHTS)]
+
+    # Timestamps crescentes ao longo da sequência, com jitter dentro de cada posição
+    timestamp = (START_TIMESTAMP + (offset + np.arange(size)) * SECONDS_PER_TRANSACTION +
+                 rng.integers(0, SECONDS_PER_TRANSACTION, size))
+
+    gas_price = np.where(network == 'ethereum', rng.integers(5, 200, size) * 10 ** 9,
+                         rng.integers(30, 500, size) * 10 ** 9)
+    gas_used = np.where(is_flash_loan, rng.integers(150000, 2000000, size), rng.integers(21000, 300000, size))
+    senders = np.array(wallets, dtype=object)[rng.integers(0, len(wallets), size)]
+
+    # Demais funções: method ID seguido de dois argumentos aleatórios
+    method_ids = [OTHER_FUNCTIONS.get(name) for name in function_name]
+    arguments = rng.bytes(64 * size).hex()
+    inputs = np.array([method_id + arguments[128 * row:128 * (row + 1)] if method_id is not None else None
+                       for row, method_id in enumerate(method_ids)], dtype=object)
+
+    # Flash loans: calldata completa, um ou mais assets por chamada em flashLoan
+    for row in np.flatnonzero(is_flash_loan):
+        if function_name[row] == 'flashLoanSimple':
+            inputs[row] = encode_flash_loan_simple(senders[row], ASSETS[rng.integers(len(ASSETS))],
+                                                   int(rng.integers(1, 10 ** 12)) * 10 ** 6)
+        else:
+            k = int(rng.integers(1, 4))
+            assets = [ASSETS[index] for index in rng.choice(len(ASSETS), k, replace=False)]
+            amounts = [int(rng.integers(1, 10 ** 12)) * 10 ** 6 for _ in range(k)]
+            inputs[row] = encode_flash_loan(senders[row], assets, amounts)
+
+    return pd.DataFrame({
+        'function_name': function_name.astype(object),
+        'network': network.astype(object),
+        'is_error': (rng.random(size) < error_ratio).astype(np.int64),
+        'timestamp': timestamp.astype(np.int64),
+        'gas_price': gas_price.astype(np.int64),
+        'gas_used': gas_used.astype(np.int64),
+        'value': '0',
+        'from': senders,
+        'input': inputs
+    })
+
+
+# Gera `n_rows` transações em blocos de até `chunk_size` linhas, sem manter o conjunto inteiro em memória.
+# A mesma semente e o mesmo chunk_size produzem sempre os mesmos dados.
+def generate_transactions(n_rows, seed=0, chunk_size=CHUNK_SIZE, flash_loan_ratio=0.05, error_ratio=0.03):
+    wallets = random_addresses(np.random.default_rng(seed), 1000)
+    for offset in range(0, n_rows, chunk_size):
+        yield generate_chunk(offset, min(chunk_size, n_rows - offset), seed, flash_loan_ratio, error_ratio, wallets)
+
+
+# Apenas os flash loans da sequência gerada, concatenados e no esquema canônico devolvido pelo load_all_transactions
+def generate_flash_loans(n_rows, seed=0, chunk_size=CHUNK_SIZE):
+    chunks = [chunk[chunk['function_name'].isin(FLASH_LOAN_METHOD_IDS) & (chunk['is_error'] == 0)]
+              for chunk in generate_transactions(n_rows, seed, chunk_size)]
+    return canonical_frame(pa.Table.from_pandas(pd.concat(chunks, ignore_index=True), preserve_index=False))
+
+
+def insert_transactions(collection, n_rows, seed=0, chunk_size=CHUNK_SIZE):
+    for chunk in generate_transactions(n_rows, seed, chunk_size):
+        collection.insert_many(chunk.to_dict(orient='records'), ordered=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Insere transações sintéticas em uma coleção do MongoDB.")
+    parser.add_argument('rows', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--uri', default='mongodb://localhost:27017/')
+    parser.add_argument('--database', default='tcc_benchmark')
+    parser.add_argument('--collection', default='transactions')
+    args = parser.parse_args()
+
+    insert_transactions(MongoClient(args.uri)[args.database][args.collection], args.rows, args.seed)
@@ -1,10 +1,32 @@
-from pymongo import MongoClient
+import os
 
-MONGO_URI = 'mongodb://localhost:27017/'
-DATABASE_NAME = 'defi_data'
+MONGO_URI = os.getenv('TCC_MONGO_URI', 'mongodb://localhost:27017/')
+DATABASE_NAME = os.getenv('TCC_DATABASE_NAME', 'defi_data')
 COLLECTION_NAME = 'transactions'
 
+# Pool de conexões do cliente MongoDB compartilhado pelo processo (utils/clients.py)
+MONGO_MAX_POOL_SIZE = int(os.getenv('TCC_MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.getenv('TCC_MONGO_MIN_POOL_SIZE', '0'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('TCC_MONGO_SERVER_SELECTION_TIMEOUT_MS', '30000'))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv('TCC_MONGO_SOCKET_TIMEOUT_MS', '0')) or None
+MONGO_READ_PREFERENCE = os.getenv('TCC_MONGO_READ_PREFERENCE', 'primary')
+
+# Redis do cache das análises, com o pool de conexões compartilhado pelo processo
+REDIS_URL = os.getenv('TCC_REDIS_URL', 'redis://localhost:6379/0')
+REDIS_MAX_CONNECTIONS = int(os.getenv('TCC_REDIS_MAX_CONNECTIONS', '50'))
+REDIS_SOCKET_TIMEOUT = float(os.getenv('TCC_REDIS_SOCKET_TIMEOUT', '0')) or None
+
+# Origem das transações carregadas pelas análises: 'mongo' ou 'snapshot' (Parquet exportado por data/snapshot.py)
+DATA_SOURCE = os.getenv('TCC_DATA_SOURCE', 'mongo')
+SNAPSHOT_DIR = os.getenv('TCC_SNAPSHOT_DIR', 'snapshot')
+
+# Dicionário persistente de endereços -> ids uint32 (data/addresses.py), gravado ao lado do diretório do snapshot
+# (não dentro dele: o snapshot é lido como um dataset de todos os arquivos Parquet do diretório)
+ADDRESS_DICTIONARY_PATH = os.getenv('TCC_ADDRESS_DICTIONARY', os.path.join(
+    os.path.dirname(os.path.normpath(SNAPSHOT_DIR)), 'addresses.parquet'))
+
 
 def get_mongo_client():
-    client = MongoClient(MONGO_URI)
-    return client[DATABASE_NAME][COLLECTION_NAME]
+    # Importado aqui: utils/clients.py depende deste módulo
+    from src.utils.clients import get_collection
+    return get_collection()
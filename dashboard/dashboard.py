@@ -1,22 +1,63 @@
-from dash import Dash, html, dcc
-from dash.dependencies import Input, Output
+from dash import Dash, html, dcc, no_update, Patch
+from dash.dependencies import Input, Output, State
 
-from src.analyses.flash_loan_frequency import analyze_flash_loan_frequency, group_by_day_hour
+from src.analyses.flash_loan_frequency import analyze_flash_loan_frequency, analyze_flash_loan_frequency_async, \
+    group_by_day_hour, group_by_day_hour_async, pivot_day_hour
 from src.utils.visualization import plot_flash_loan_tokens, plot_flash_loan_frequency, plot_day_hour_distribution, \
     plot_flash_loan_volume, plot_flash_loan_volume_all, plot_wallet_interactions, plot_flash_loan_fees
 from src.analyses.flash_loan_tokens import analyze_flash_loan_tokens
-from src.analyses.flash_loan_volume import analyze_flash_loan_volume, analyze_flash_loan_volume_all
+from src.analyses.flash_loan_volume import analyze_flash_loan_volume, analyze_flash_loan_volume_all, \
+    analyze_flash_loan_volume_async, analyze_flash_loan_volume_all_async, combine_volume_all
 from src.analyses.transaction_sequence import analyze_flash_loan_wallets
 from src.analyses.flash_loan_fee import analyze_flash_loan_fee
+from src.analyses.live_updater import LIVE_VERSION_KEYS, version_from_live_keys, read_live_frequency, \
+    read_live_day_hour, read_live_tokens, read_live_volume, read_live_fee
+from src.dashboard.figure_cache import figure_version_async, get_figures, get_or_build_figures, serialize_figures, \
+    store_figures, version_from_cache_versions
+from src.utils.downsampling import downsample_frequency, MAX_POINTS
+from src.data.rollups import date_range_bounds, pick_resolution
+from src.data.async_access import get_from_cache_async, rollup_version_async
+from src.utils.clients import get_async_redis
+from src.utils.helpers import redis_client
+from src.utils.tracing import trace_analysis, publish_totals, load_published_totals, prometheus_text
+from src.dashboard.jobs import background_callback_manager, job_running, job_running_async, run_deduplicated
+import asyncio
 import logging
+import os
+import pandas as pd
 
-app = Dash(__name__)
+# Servidor do dashboard: apenas 'fastapi' (ASGI, servido pelo uvicorn). Os callbacks que só leem o cache e os
+# rollups são assíncronos; as análises completas continuam nos jobs em segundo plano. O backend flask executa cada
+# view assíncrona em um event loop novo (asgiref async_to_sync), e os clientes assíncronos do Redis e do MongoDB
+# (src.utils.clients) ficam presos ao loop do primeiro pedido: com ele, todo callback após o primeiro falharia.
+DASHBOARD_BACKEND = os.getenv('DASHBOARD_BACKEND', 'fastapi')
+if DASHBOARD_BACKEND != 'fastapi':
+    raise ValueError(f"DASHBOARD_BACKEND={DASHBOARD_BACKEND} não é suportado: os callbacks assíncronos exigem o "
+                     f"backend fastapi, com um único event loop por processo.")
+
+app = Dash(__name__, backend=DASHBOARD_BACKEND, use_async=True,
+           background_callback_manager=background_callback_manager)
+server = app.server
 app.config.suppress_callback_exceptions = True
 
+# Com o updater do change stream em execução (analyses/live_updater.py), os painéis são montados a partir dos
+# agregados ao vivo no Redis em vez do cache das análises. Desligado com DASHBOARD_LIVE=0.
+DASHBOARD_LIVE = os.getenv('DASHBOARD_LIVE', '1') == '1'
+
+# Método de downsampling da série de frequência ('lttb' ou 'minmax')
+FREQUENCY_DOWNSAMPLING = 'lttb'
+
+PANEL_NAMES = ["frequency", "day-hour", "tokens", "volume", "volume-all", "wallet-interactions", "fees"]
+
 app.layout = html.Div([
     html.H1("Dashboard de Análise de Flash Loans - Aave"),
+    html.Div([
+        html.Label("Período (frequência, dia/hora e volume, calculados a partir dos rollups)"),
+        dcc.DatePickerRange(id="date-range", clearable=True)
+    ]),
     html.Div([
         html.H2("Quantidade Absoluta de Flash Loans"),
+        html.Div(id="frequency-progress", style={"display": "none"}),
         dcc.Graph(id="frequency-plot-polygon"),
         dcc.Graph(id="frequency-plot-ethereum"),
         dcc.Checklist(
@@ -27,11 +68,13 @@ app.layout = html.Div([
     ]),
     html.Div([
         html.H2("Distribuição de Flash Loans por Dia e Horário"),
+        html.Div(id="day-hour-progress", style={"display": "none"}),
         dcc.Graph(id="day-hour-distribution-plot-polygon"),
         dcc.Graph(id="day-hour-distribution-plot-ethereum")
     ]),
     html.Div([
         html.H2("Top Tokens Utilizados em Flash Loans"),
+        html.Div(id="tokens-progress", style={"display": "none"}),
         dcc.Graph(id="tokens-plot"),
         dcc.Checklist(
             id='network-separation-tokens',
@@ -41,6 +84,7 @@ app.layout = html.Div([
     ]),
     html.Div([
         html.H2("Volume de Transações Bem-Sucedidas"),
+        html.Div(id="volume-progress", style={"display": "none"}),
         dcc.Graph(id="volume-plot"),
         dcc.Checklist(
             id='network-separation-volume',
@@ -50,6 +94,7 @@ app.layout = html.Div([
     ]),
     html.Div([
         html.H2("Volume de Todas as Transações"),
+        html.Div(id="volume-all-progress", style={"display": "none"}),
         dcc.Graph(id="volume-all-plot"),
         dcc.Checklist(
             id='network-separation-volume-all',
@@ -59,6 +104,7 @@ app.layout = html.Div([
     ]),
     html.Div([
         html.H2("Tipos de Interação nas 5 Transações Subsequentes - Polygon"),
+        html.Div(id="wallet-interactions-progress", style={"display": "none"}),
         dcc.Graph(id="wallet-interactions-plot-polygon")
     ]),
     html.Div([
@@ -67,27 +113,41 @@ app.layout = html.Div([
     ]),
     html.Div([
         html.H2("Flash Loan Fees (Total and Average)"),
+        html.Div(id="fees-progress", style={"display": "none"}),
         dcc.Graph(id="fees-plot"),
     ]),
     dcc.Interval(
         id="interval-component",
         interval=60 * 1000,  # Atualiza a cada 60 segundos
         n_intervals=0
-    )
+    ),
+    # Versão das figuras que cada aba já recebeu (dados inalterados não são reenviados) e pedidos de
+    # atualização para os callbacks em segundo plano
+    html.Div([dcc.Store(id=f"{name}-{store}") for name in PANEL_NAMES for store in ["version", "request"]])
 ])
 
 
-@app.callback(
-    [
-        Output("frequency-plot-polygon", "figure"),
-        Output("frequency-plot-ethereum", "figure")
-    ],
-    Input("interval-component", "n_intervals"),
-    Input("network-separation", "value")
-)
-def update_frequency_plots(n_intervals, network_separation):
-    separate_by_network = 'separate' in network_separation
-    frequency_data = analyze_flash_loan_frequency(separate_by_network=separate_by_network)
+# Montagem das figuras de cada painel; `separate_by_network` é None nos painéis sem opção de rede.
+# As versões assíncronas atendem um período selecionado, lido dos rollups dentro do próprio callback; o
+# downsampling e a montagem das figuras rodam em uma thread, fora do event loop.
+def build_frequency_figures(separate_by_network, start=None, end=None):
+    frequency_data = analyze_flash_loan_frequency(separate_by_network=separate_by_network, start=start, end=end,
+                                                  resolution=range_resolution(start, end))
+    return frequency_figures(frequency_data, separate_by_network)
+
+
+async def build_frequency_figures_async(separate_by_network, start=None, end=None):
+    frequency_data = await analyze_flash_loan_frequency_async(separate_by_network=separate_by_network, start=start,
+                                                              end=end, resolution=range_resolution(start, end))
+    return await asyncio.to_thread(frequency_figures, frequency_data, separate_by_network)
+
+
+def range_resolution(start, end):
+    return pick_resolution(start, end, MAX_POINTS) if start is not None and end is not None else 'day'
+
+
+def frequency_figures(frequency_data, separate_by_network):
+    frequency_data = downsample_frequency(frequency_data, method=FREQUENCY_DOWNSAMPLING)
 
     if separate_by_network:
         fig_polygon, fig_ethereum = plot_flash_loan_frequency(frequency_data, separate_by_network)
@@ -98,74 +158,56 @@ def update_frequency_plots(n_intervals, network_separation):
     return fig_polygon, fig_ethereum
 
 
-@app.callback(
-    [
-        Output("day-hour-distribution-plot-polygon", "figure"),
-        Output("day-hour-distribution-plot-ethereum", "figure")
-    ],
-    Input("interval-component", "n_intervals")
-)
-def update_day_hour_distribution_plots(n_intervals):
-    pivot_data_polygon, pivot_data_ethereum = group_by_day_hour()
-    fig_polygon = plot_day_hour_distribution(pivot_data_polygon, "Distribuição de Flash Loans por Dia e Hora - Polygon")
+def build_day_hour_figures(separate_by_network, start=None, end=None):
+    return day_hour_figures(*group_by_day_hour(start, end))
+
+
+async def build_day_hour_figures_async(separate_by_network, start=None, end=None):
+    return await asyncio.to_thread(day_hour_figures, *await group_by_day_hour_async(start, end))
+
+
+def day_hour_figures(pivot_data_polygon, pivot_data_ethereum):
+    fig_polygon = plot_day_hour_distribution(pivot_data_polygon,
+                                             "Distribuição de Flash Loans por Dia e Hora - Polygon")
     fig_ethereum = plot_day_hour_distribution(pivot_data_ethereum,
                                               "Distribuição de Flash Loans por Dia e Hora - Ethereum")
     return fig_polygon, fig_ethereum
 
 
-@app.callback(
-    Output("tokens-plot", "figure"),
-    Input("interval-component", "n_intervals"),
-    Input("network-separation-tokens", "value")
-)
-def update_tokens_plot(n_intervals, network_separation_tokens):
-    separate_by_network = 'separate' in network_separation_tokens
+def build_tokens_figures(separate_by_network):
     token_data = analyze_flash_loan_tokens(separate_by_network=separate_by_network)
-    tokens_plot = plot_flash_loan_tokens(token_data, separate_by_network)
-    return tokens_plot
-
-
-@app.callback(
-    Output("volume-plot", "figure"),
-    Input("interval-component", "n_intervals"),
-    Input("network-separation-volume", "value")
-)
-def update_volume_plot(n_intervals, network_separation_volume):
-    separate_by_network = 'separate' in network_separation_volume
-    volume_data = analyze_flash_loan_volume()
-    volume_plot = plot_flash_loan_volume(volume_data, separate_by_network)
-    return volume_plot
-
-
-@app.callback(
-    Output("volume-all-plot", "figure"),
-    Input("interval-component", "n_intervals"),
-    Input("network-separation-volume-all", "value")
-)
-def update_volume_all_plot(n_intervals, network_separation_volume_all):
-    separate_by_network = 'separate' in network_separation_volume_all
-    volume_data = analyze_flash_loan_volume_all(separate_by_network=separate_by_network)
-    volume_plot = plot_flash_loan_volume_all(volume_data, separate_by_network)
-    return volume_plot
-
-
-@app.callback(
-    Output("wallet-interactions-plot-polygon", "figure"),
-    Output("wallet-interactions-plot-ethereum", "figure"),
-    Input("interval-component", "n_intervals")
-)
-def update_wallet_interactions_plot(n_intervals):
+    return plot_flash_loan_tokens(token_data, separate_by_network),
+
+
+def build_volume_figures(separate_by_network, start=None, end=None):
+    volume_data = analyze_flash_loan_volume(start=start, end=end)
+    return plot_flash_loan_volume(volume_data, separate_by_network),
+
+
+async def build_volume_figures_async(separate_by_network, start=None, end=None):
+    volume_data = await analyze_flash_loan_volume_async(start=start, end=end)
+    return await asyncio.to_thread(plot_flash_loan_volume, volume_data, separate_by_network),
+
+
+def build_volume_all_figures(separate_by_network, start=None, end=None):
+    volume_data = analyze_flash_loan_volume_all(separate_by_network=separate_by_network, start=start, end=end)
+    return plot_flash_loan_volume_all(volume_data, separate_by_network),
+
+
+async def build_volume_all_figures_async(separate_by_network, start=None, end=None):
+    volume_data = await analyze_flash_loan_volume_all_async(separate_by_network=separate_by_network, start=start,
+                                                            end=end)
+    return await asyncio.to_thread(plot_flash_loan_volume_all, volume_data, separate_by_network),
+
+
+def build_wallet_interactions_figures(separate_by_network):
     flash_loan_wallets_analysis_polygon, flash_loan_wallets_analysis_ethereum = analyze_flash_loan_wallets()
     wallet_interactions_plot_polygon = plot_wallet_interactions(flash_loan_wallets_analysis_polygon, 'polygon')
     wallet_interactions_plot_ethereum = plot_wallet_interactions(flash_loan_wallets_analysis_ethereum, 'ethereum')
     return wallet_interactions_plot_polygon, wallet_interactions_plot_ethereum
 
 
-@app.callback(
-    Output("fees-plot", "figure"),
-    Input("interval-component", "n_intervals")
-)
-def update_fees_plot(n_intervals):
+def build_fees_figures(separate_by_network):
     # Analisar as métricas das taxas de flash loans
     ethereum_metrics, polygon_metrics = analyze_flash_loan_fee()
     metrics_data = {
@@ -174,10 +216,272 @@ def update_fees_plot(n_intervals):
     }
 
     # Gerar o gráfico
-    fees_plot = plot_flash_loan_fees(metrics_data)
-    return fees_plot
+    return plot_flash_loan_fees(metrics_data),
+
+
+# Montagem das figuras a partir dos agregados ao vivo, nos mesmos formatos lidos do cache
+def build_frequency_figures_live(separate_by_network):
+    return frequency_figures(frequency_for_separation(read_live_frequency(), separate_by_network),
+                             separate_by_network)
+
+
+# A série de frequência na forma pedida pela opção "Separar por Rede": sem separação, as redes são somadas.
+# None se a separação foi pedida e a série não tem a coluna network (a chave flash_loan_frequency guarda a
+# série no formato da última análise executada).
+def frequency_for_separation(frequency_data, separate_by_network):
+    if 'network' not in frequency_data.columns:
+        return None if separate_by_network else frequency_data
+    if separate_by_network:
+        return frequency_data
+    return frequency_data.groupby('timestamp', as_index=False)['count'].sum()
+
+
+def build_day_hour_figures_live(separate_by_network):
+    return day_hour_figures(*pivot_day_hour(read_live_day_hour('polygon'), read_live_day_hour('ethereum')))
+
+
+def build_tokens_figures_live(separate_by_network):
+    token_data = read_live_tokens()
+    if not separate_by_network:
+        token_data = token_data.groupby('token', as_index=False).agg(count=('count', 'sum'),
+                                                                    volume=('volume', lambda v: v.sum(min_count=1)))
+    return plot_flash_loan_tokens(token_data, separate_by_network),
+
+
+def build_volume_figures_live(separate_by_network):
+    return plot_flash_loan_volume(pd.DataFrame(read_live_volume()), separate_by_network),
+
+
+def build_volume_all_figures_live(separate_by_network):
+    volume_data = combine_volume_all(pd.DataFrame(read_live_volume()), separate_by_network)
+    return plot_flash_loan_volume_all(volume_data, separate_by_network),
+
+
+def build_fees_figures_live(separate_by_network):
+    metrics_data = {network: read_live_fee(network) for network in ['ethereum', 'polygon']}
+    return plot_flash_loan_fees({network: metrics for network, metrics in metrics_data.items() if metrics}),
+
+
+# Versão dos agregados ao vivo, ou None se o updater não está em uso ou ainda faz a carga inicial
+async def live_version_async():
+    if not DASHBOARD_LIVE:
+        return None
+    return version_from_live_keys(*await get_async_redis().mget(LIVE_VERSION_KEYS))
+
+
+# Monta e serializa as figuras de uma vez, para rodar inteiro em uma thread
+def build_serialized(build, separate_by_network):
+    return serialize_figures(build(separate_by_network))
+
+
+def job_key(name, separate_by_network):
+    return f'{name}|{separate_by_network!r}'
+
+
+# Cada painel tem dois callbacks. O primeiro roda a cada intervalo no próprio servidor, de forma assíncrona, e só
+# lê o cache: responde sem reenviar nada se a aba já tem a versão atual, ou com as figuras já montadas. Em um
+# cache miss ele apenas dispara o segundo, em segundo plano, que executa a análise fora do servidor, enquanto a
+# aba continua exibindo as últimas figuras válidas. Nos painéis com `build_range`, um período selecionado é
+# respondido direto dos rollups, sem passar pelo cache nem pela coleção bruta, e as figuras são versionadas pelas
+# marcas d'água dos rollups. Nos painéis com `build_live`, os agregados ao vivo, quando disponíveis, têm
+# precedência sobre o cache: são lidos do Redis no próprio callback.
+def register_panel(name, figure_ids, option_id, cache_keys, build, build_range=None, build_live=None):
+    date_filtered = build_range is not None
+    inputs = [Input("interval-component", "n_intervals")]
+    if option_id is not None:
+        inputs.append(Input(option_id, "value"))
+    if date_filtered:
+        inputs += [Input("date-range", "start_date"), Input("date-range", "end_date")]
+
+    @app.callback(
+        [Output(figure_id, "figure") for figure_id in figure_ids] +
+        [Output(f"{name}-version", "data"), Output(f"{name}-request", "data")],
+        inputs,
+        State(f"{name}-version", "data")
+    )
+    async def update_panel(n_intervals, *args):
+        args = list(args)
+        client_version = args.pop()
+        end_date, start_date = (args.pop(), args.pop()) if date_filtered else (None, None)
+        separate_by_network = 'separate' in args[0] if option_id is not None else None
+        unchanged = [no_update] * (len(figure_ids) + 2)
+
+        if start_date or end_date:
+            # As figuras do período só mudam quando os rollups avançam
+            start, end = date_range_bounds(start_date, end_date)
+            version = version_from_cache_versions(name, (separate_by_network, start, end),
+                                                  [await rollup_version_async()])
+            if version is not None and version == client_version:
+                return unchanged
+            figures = await asyncio.to_thread(get_figures, version)
+            if figures is None:
+                figures = await asyncio.to_thread(serialize_figures, await build_range(separate_by_network, start, end))
+                if version is not None:
+                    await asyncio.to_thread(store_figures, version, figures)
+            return list(figures) + [version, no_update]
+
+        live_version = await live_version_async() if build_live is not None else None
+        if live_version is not None:
+            version = f'live|{name}|{separate_by_network!r}|{live_version}'
+            if version == client_version:
+                return unchanged
+            figures = await asyncio.to_thread(get_figures, version)
+            if figures is None:
+                figures = await asyncio.to_thread(build_serialized, build_live, separate_by_network)
+                await asyncio.to_thread(store_figures, version, figures)
+            return list(figures) + [version, no_update]
+
+        version = await figure_version_async(name, separate_by_network, cache_keys)
+        if version is not None and version == client_version:
+            return unchanged
+
+        figures = await asyncio.to_thread(get_figures, version)
+        if figures is not None:
+            return list(figures) + [version, no_update]
+
+        # Um job idêntico já em andamento é reaproveitado: as figuras que ele montar são servidas no próximo
+        # intervalo. Disparar de novo faria o Dash encerrar o job anterior desta aba.
+        if await job_running_async(job_key(name, separate_by_network)):
+            return unchanged
+        return [no_update] * (len(figure_ids) + 1) + [{'panel': name, 'separate_by_network': separate_by_network,
+                                                        'n_intervals': n_intervals}]
+
+    @app.callback(
+        [Output(figure_id, "figure", allow_duplicate=True) for figure_id in figure_ids] +
+        [Output(f"{name}-version", "data", allow_duplicate=True)],
+        Input(f"{name}-request", "data"),
+        background=True,
+        running=[(Output(f"{name}-progress", "style"), {"display": "block"}, {"display": "none"})],
+        progress=Output(f"{name}-progress", "children"),
+        prevent_initial_call=True
+    )
+    def build_panel(set_progress, request):
+        separate_by_network = request['separate_by_network']
+
+        def run():
+            set_progress("Executando a análise...")
+            return get_or_build_figures(name, separate_by_network, cache_keys, build)
+
+        if job_running(job_key(name, separate_by_network)):
+            set_progress("Aguardando atualização em andamento...")
+        try:
+            with trace_analysis(f'dashboard:{name}'):
+                figures, version = run_deduplicated(job_key(name, separate_by_network), run)
+        except Exception as e:
+            # Mantém as últimas figuras válidas na tela; o próximo intervalo tenta novamente
+            logging.error(f"Erro ao atualizar o painel {name}: {e}")
+            return [no_update] * (len(figure_ids) + 1)
+        finally:
+            # O job roda em outro processo: os totais da instrumentação vão para o Redis, lidos pelo /metrics
+            publish_totals(redis_client)
+        return list(figures) + [version]
+
+
+register_panel("frequency", ["frequency-plot-polygon", "frequency-plot-ethereum"], "network-separation",
+               ['flash_loan_frequency'], build_frequency_figures, build_frequency_figures_async,
+               build_frequency_figures_live)
+register_panel("day-hour", ["day-hour-distribution-plot-polygon", "day-hour-distribution-plot-ethereum"], None,
+               ['flash_loan_frequency_day_hour_polygon', 'flash_loan_frequency_day_hour_ethereum'],
+               build_day_hour_figures, build_day_hour_figures_async, build_day_hour_figures_live)
+register_panel("tokens", ["tokens-plot"], "network-separation-tokens",
+               ['flash_loan_tokens'], build_tokens_figures, build_live=build_tokens_figures_live)
+register_panel("volume", ["volume-plot"], "network-separation-volume",
+               ['flash_loan_volume'], build_volume_figures, build_volume_figures_async, build_volume_figures_live)
+register_panel("volume-all", ["volume-all-plot"], "network-separation-volume-all",
+               ['flash_loan_volume'], build_volume_all_figures, build_volume_all_figures_async,
+               build_volume_all_figures_live)
+register_panel("wallet-interactions", ["wallet-interactions-plot-polygon", "wallet-interactions-plot-ethereum"], None,
+               ['flash_loan_sequence_steps'], build_wallet_interactions_figures)
+register_panel("fees", ["fees-plot"], None,
+               ['flash_loan_fee_ethereum', 'flash_loan_fee_polygon'], build_fees_figures,
+               build_live=build_fees_figures_live)
+
+
+# Intervalo visível informado pelo relayoutData: (início, fim), None ao voltar para o gráfico inteiro,
+# ou False se o evento não alterou o eixo x
+def visible_range(relayout_data):
+    if not relayout_data:
+        return False
+    if 'xaxis.range[0]' in relayout_data:
+        return relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+    if 'xaxis.range' in relayout_data:
+        return tuple(relayout_data['xaxis.range'])
+    if relayout_data.get('xaxis.autorange'):
+        return None
+    return False
+
+
+# Ao aproximar ou afastar, reenvia apenas os pontos do intervalo visível, com a resolução limitada a
+# MAX_POINTS. Lê somente o cache: sem dados prontos, o gráfico atual é mantido.
+def register_frequency_zoom(figure_id, network):
+    @app.callback(
+        Output(figure_id, "figure", allow_duplicate=True),
+        Input(figure_id, "relayoutData"),
+        State("network-separation", "value"),
+        State("date-range", "start_date"),
+        State("date-range", "end_date"),
+        prevent_initial_call=True
+    )
+    async def zoom_frequency_plot(relayout_data, network_separation, start_date, end_date):
+        separate_by_network = 'separate' in network_separation
+        x_range = visible_range(relayout_data)
+        if x_range is False or (network == 'ethereum' and not separate_by_network):
+            return no_update
+
+        if start_date or end_date:
+            # Com um período selecionado, o trecho visível vem dos rollups, na resolução mais fina que cabe
+            # em MAX_POINTS
+            start, end = date_range_bounds(start_date, end_date)
+            if x_range is not None:
+                visible_start, visible_end = (pd.Timestamp(bound).to_pydatetime() for bound in x_range)
+                start = max(start, visible_start) if start is not None else visible_start
+                end = min(end, visible_end) if end is not None else visible_end
+            resolution = pick_resolution(start, end, MAX_POINTS) if start is not None and end is not None else 'day'
+            frequency_data = await analyze_flash_loan_frequency_async(separate_by_network=separate_by_network,
+                                                                      start=start, end=end, resolution=resolution)
+        else:
+            frequency_data = await get_from_cache_async('flash_loan_frequency')
+        if frequency_data is None:
+            return no_update
+        sampled = await asyncio.to_thread(zoom_series, frequency_data, separate_by_network, network, x_range)
+        if sampled is None:
+            return no_update
+
+        figure = Patch()
+        figure['data'][0]['x'] = sampled['timestamp']
+        figure['data'][0]['y'] = sampled['count']
+        if x_range is None:
+            figure['layout']['xaxis']['autorange'] = True
+        else:
+            figure['layout']['xaxis']['range'] = list(x_range)
+            figure['layout']['xaxis']['autorange'] = False
+        return figure
+
+
+# Pontos do intervalo visível, calculados fora do event loop; None sem dados na forma pedida
+def zoom_series(frequency_data, separate_by_network, network, x_range):
+    frequency_data = frequency_for_separation(frequency_data, separate_by_network)
+    if frequency_data is None or frequency_data.empty:
+        return None
+    return downsample_frequency(frequency_data, network if separate_by_network else None, x_range,
+                                method=FREQUENCY_DOWNSAMPLING)
+
+
+register_frequency_zoom("frequency-plot-polygon", 'polygon')
+register_frequency_zoom("frequency-plot-ethereum", 'ethereum')
+
+
+# Totais da instrumentação (TCC_TRACING=1) no formato do Prometheus, somando os jobs em segundo plano
+def metrics():
+    publish_totals(redis_client)
+    return app.backend.make_response(prometheus_text(load_published_totals(redis_client)),
+                                     mimetype='text/plain; version=0.0.4')
+
+
+app.backend.add_url_rule("/metrics", view_func=metrics, endpoint="metrics")
 
 
+# Em produção, com o backend fastapi: uvicorn src.dashboard.dashboard:server --workers <n>
 if __name__ == "__main__":
     logging.info("Iniciando o servidor do Dash...")
-    app.run_server(debug=True)
+    app.run(debug=True)
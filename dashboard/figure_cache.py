@@ -0,0 +1,62 @@
+import os
+import tempfile
+import diskcache
+from src.data.async_access import get_cache_versions_async
+from src.utils.helpers import get_cache_versions
+
+# Figuras já montadas, indexadas por (callback, opções da interface, versões dos dados no cache).
+# Ficam em disco para que o servidor e os processos dos callbacks em segundo plano compartilhem as mesmas figuras.
+FIGURE_CACHE_DIR = os.getenv('DASHBOARD_FIGURES_DIR', os.path.join(tempfile.gettempdir(), 'tcc_dashboard_figures'))
+FIGURE_CACHE_SIZE_LIMIT = 256 * 1024 * 1024
+figure_cache = diskcache.Cache(FIGURE_CACHE_DIR, size_limit=FIGURE_CACHE_SIZE_LIMIT,
+                               eviction_policy='least-recently-used')
+
+
+# Versão dos dados de um callback; None se algum valor ainda não está no cache (sem memoização)
+def figure_version(callback_name, options, cache_keys):
+    return version_from_cache_versions(callback_name, options, get_cache_versions(cache_keys))
+
+
+async def figure_version_async(callback_name, options, cache_keys):
+    return version_from_cache_versions(callback_name, options, await get_cache_versions_async(cache_keys))
+
+
+def version_from_cache_versions(callback_name, options, versions):
+    if any(version is None for version in versions):
+        return None
+    return '|'.join([callback_name, repr(options)] + versions)
+
+
+def serialize_figure(figure):
+    return figure.to_dict() if hasattr(figure, 'to_dict') else figure
+
+
+def serialize_figures(figures):
+    return tuple(serialize_figure(figure) for figure in figures)
+
+
+# Figuras já montadas para a versão informada, ou None
+def get_figures(version):
+    if version is None:
+        return None
+    return figure_cache.get(version)
+
+
+def store_figures(version, figures):
+    figure_cache.set(version, figures)
+
+
+# Retorna as figuras do callback e a versão dos dados, montando-as (e pré-serializando) apenas na primeira vez.
+# Em um cache miss a própria análise grava os dados no Redis, então a versão é lida de novo após a montagem.
+def get_or_build_figures(callback_name, options, cache_keys, build):
+    version = figure_version(callback_name, options, cache_keys)
+    figures = get_figures(version)
+    if figures is not None:
+        return figures, version
+
+    figures = serialize_figures(build(options))
+    if version is None:
+        version = figure_version(callback_name, options, cache_keys)
+    if version is not None:
+        figure_cache.set(version, figures)
+    return figures, version
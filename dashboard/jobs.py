@@ -0,0 +1,35 @@
+import os
+import tempfile
+import diskcache
+from dash import DiskcacheManager
+from src.utils.clients import get_async_redis
+from src.utils.helpers import redis_client
+
+# Resultados e progresso dos callbacks em segundo plano ficam em disco, compartilhados entre os
+# processos dos jobs e os workers do servidor
+JOBS_CACHE_DIR = os.getenv('DASHBOARD_JOBS_DIR', os.path.join(tempfile.gettempdir(), 'tcc_dashboard_jobs'))
+background_callback_manager = DiskcacheManager(diskcache.Cache(JOBS_CACHE_DIR))
+
+# Lock por job no Redis; expira sozinho caso o processo do job morra sem liberá-lo
+JOB_LOCK_PREFIX = 'dashboard_job:'
+JOB_LOCK_TIMEOUT = 30 * 60
+
+
+def job_lock(job_key):
+    return redis_client.lock(f'{JOB_LOCK_PREFIX}{job_key}', timeout=JOB_LOCK_TIMEOUT)
+
+
+def job_running(job_key):
+    return job_lock(job_key).locked()
+
+
+# Mesma verificação pelo cliente assíncrono: o lock do redis-py é apenas a chave com o nome do lock
+async def job_running_async(job_key):
+    return await get_async_redis().exists(f'{JOB_LOCK_PREFIX}{job_key}') > 0
+
+
+# Requisições idênticas (mesmo painel e opções) vindas de várias abas executam a análise uma única vez:
+# o primeiro job segura o lock e os demais esperam por ele, reaproveitando os resultados que ficaram em cache
+def run_deduplicated(job_key, run):
+    with job_lock(job_key):
+        return run()
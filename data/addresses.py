@@ -0,0 +1,195 @@
+import json
+import logging
+import os
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from bson import ObjectId
+from src.config import ADDRESS_DICTIONARY_PATH
+from src.data.watermarks import advance_watermarks, delta_filter
+from src.utils.clients import get_collection
+
+# Dicionário persistente de endereços: cada endereço (em minúsculas) recebe um id denso uint32, na ordem em que
+# foi visto pela primeira vez. Os ids não mudam entre execuções, então carteiras, tokens e receivers podem ser
+# comparados, agrupados e unidos como inteiros em vez de strings de 42 caracteres.
+ID_TYPE = np.uint32
+
+# Id dos valores ausentes ou desconhecidos (o maior uint32, nunca atribuído a um endereço)
+NO_ADDRESS = np.iinfo(ID_TYPE).max
+
+# Campos das transações cujos endereços entram no dicionário
+ADDRESS_FIELDS = ['from', 'to']
+
+
+def normalize_addresses(values):
+    return pd.Index(values, dtype=object).str.lower()
+
+
+class AddressDictionary:
+    def __init__(self, addresses=(), watermarks=None):
+        self.index = pd.Index(list(addresses), dtype=object)
+        # Maior _id já incorporado de cada rede, para a atualização incremental a partir do MongoDB
+        self.watermarks = dict(watermarks or {})
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.index)
+
+    # Acrescenta os endereços ainda não conhecidos; devolve quantos foram adicionados
+    def add(self, values):
+        addresses = normalize_addresses(values)
+        with self._lock:
+            return self._add(addresses)
+
+    def _add(self, addresses):
+        new = addresses[(self.index.get_indexer(addresses) == -1) & addresses.notna()].unique()
+        if len(new) == 0:
+            return 0
+        if len(self.index) + len(new) >= NO_ADDRESS:
+            raise OverflowError("O dicionário de endereços excedeu a capacidade de ids uint32.")
+        self.index = self.index.append(pd.Index(new, dtype=object))
+        return len(new)
+
+    # Ids dos endereços (NO_ADDRESS para nulos e, sem add=True, para os desconhecidos). Colunas categóricas
+    # têm apenas as categorias consultadas, e os ids de cada linha vêm dos códigos.
+    def encode(self, values, add=False):
+        if isinstance(getattr(values, 'dtype', None), pd.CategoricalDtype):
+            codes = np.asarray(values.cat.codes)
+            if len(values.cat.categories) == 0:
+                return np.full(len(codes), NO_ADDRESS, dtype=ID_TYPE)
+            category_ids = self.encode(values.cat.categories, add)
+            return np.where(codes >= 0, category_ids[codes], NO_ADDRESS).astype(ID_TYPE)
+
+        addresses = normalize_addresses(values)
+        with self._lock:
+            if add:
+                self._add(addresses)
+            positions = self.index.get_indexer(addresses)
+        return np.where(positions >= 0, positions, NO_ADDRESS).astype(ID_TYPE)
+
+    def decode(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        valid = (ids != NO_ADDRESS) & (ids < len(self.index))
+        addresses = np.full(len(ids), None, dtype=object)
+        addresses[valid] = self.index.to_numpy()[ids[valid]]
+        return addresses
+
+    # Gravação atômica: o arquivo anterior só é substituído depois que o novo foi escrito por completo
+    def save(self, path=ADDRESS_DICTIONARY_PATH):
+        with self._lock:
+            table = pa.table({'address': pa.array(self.index.to_numpy(), type=pa.string())})
+            watermarks = {network: str(watermark) for network, watermark in self.watermarks.items()}
+        table = table.replace_schema_metadata({'watermarks': json.dumps(watermarks)})
+
+        temporary_path = f'{path}.tmp'
+        pq.write_table(table, temporary_path)
+        os.replace(temporary_path, path)
+
+
+# O id de cada endereço é a sua linha no arquivo
+def load_address_dictionary(path=ADDRESS_DICTIONARY_PATH):
+    if not os.path.exists(path):
+        return AddressDictionary()
+
+    table = pq.read_table(path)
+    metadata = table.schema.metadata or {}
+    watermarks = json.loads(metadata.get(b'watermarks', b'{}'))
+    return AddressDictionary(table.column('address').to_pylist(),
+                             {network: ObjectId(watermark) for network, watermark in watermarks.items()})
+
+
+lock = threading.Lock()
+shared_dictionary = None
+
+
+# Dicionário compartilhado pelo processo, lido do arquivo no primeiro uso. Endereços novos vistos pelas análises
+# recebem ids apenas em memória; o arquivo é atualizado por update_address_dictionary.
+def get_address_dictionary():
+    global shared_dictionary
+    if shared_dictionary is None:
+        with lock:
+            if shared_dictionary is None:
+                shared_dictionary = load_address_dictionary()
+    return shared_dictionary
+
+
+# Acrescenta ao dicionário os endereços das transações inseridas desde a última atualização e o grava
+def update_address_dictionary(path=ADDRESS_DICTIONARY_PATH):
+    collection = get_collection()
+    dictionary = load_address_dictionary(path)
+
+    new_watermarks = advance_watermarks(collection, {}, dictionary.watermarks)
+    filters = delta_filter(dictionary.watermarks, new_watermarks)
+    if filters is None:
+        logging.info("Nenhuma transação nova para o dicionário de endereços.")
+        return dictionary
+
+    rows = collection.aggregate([
+        {"$match": filters},
+        {"$project": {"address": [f"${field}" for field in ADDRESS_FIELDS]}},
+        {"$unwind": "$address"},
+        {"$match": {"address": {"$type": "string"}}},
+        {"$group": {"_id": {"$toLower": "$address"}}}
+    ], allowDiskUse=True)
+
+    # Endereços novos em ordem alfabética, para que a mesma coleção produza sempre os mesmos ids
+    added = dictionary.add(sorted(row['_id'] for row in rows))
+    dictionary.watermarks = new_watermarks
+    dictionary.save(path)
+    logging.info(f"{added} endereços novos no dicionário ({len(dictionary)} no total).")
+    return dictionary
+
+
+# Índice por carteira: as linhas de um DataFrame ordenadas por (carteira, timestamp). As transações da carteira
+# de id w são as linhas order[offsets[w]:offsets[w + 1]], já em ordem cronológica. Linhas sem carteira ficam
+# fora dos intervalos.
+class WalletIndex:
+    def __init__(self, wallet_ids, timestamps, size):
+        wallet_ids = np.asarray(wallet_ids, dtype=ID_TYPE)
+        timestamps = np.asarray(timestamps)
+
+        self.order = np.lexsort((timestamps, wallet_ids))
+        self.wallet_ids = wallet_ids[self.order]
+        self.timestamps = timestamps[self.order]
+
+        counts = np.bincount(self.wallet_ids[self.wallet_ids != NO_ADDRESS], minlength=size)
+        self.offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+
+    def __len__(self):
+        return len(self.order)
+
+    # Ids das carteiras com ao menos uma transação
+    def wallets(self):
+        return np.flatnonzero(np.diff(self.offsets)).astype(ID_TYPE)
+
+    def range(self, wallet_id):
+        if wallet_id >= len(self.offsets) - 1:
+            return 0, 0
+        return int(self.offsets[wallet_id]), int(self.offsets[wallet_id + 1])
+
+    # Linhas da carteira em ordem cronológica, opcionalmente restritas a timestamps em [start, end)
+    def rows(self, wallet_id, start=None, end=None):
+        base, last = self.range(wallet_id)
+        timestamps = self.timestamps[base:last]
+        first = base
+        if start is not None:
+            first = base + int(np.searchsorted(timestamps, start, side='left'))
+        if end is not None:
+            last = base + int(np.searchsorted(timestamps, end, side='left'))
+        return self.order[first:max(first, last)]
+
+
+# Índice das transações de um DataFrame pela carteira de `column`, com ids do dicionário compartilhado
+def build_wallet_index(transactions, column='from', dictionary=None):
+    if dictionary is None:
+        dictionary = get_address_dictionary()
+    wallet_ids = dictionary.encode(transactions[column], add=True)
+    return WalletIndex(wallet_ids, transactions['timestamp'].to_numpy(), len(dictionary))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    update_address_dictionary()
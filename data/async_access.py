@@ -0,0 +1,100 @@
+import logging
+from src.config import DATABASE_NAME, COLLECTION_NAME
+from src.data.data_loader import build_query, build_projection, BATCH_SIZE
+from src.data.rollups import ROLLUP_SOURCES, ROLLUP_STATE_COLLECTION, rollup_match
+from src.data.schema import frame_from_columns
+from src.utils.clients import get_async_mongo_client, get_async_redis
+from src.utils.helpers import encode_cache_value, decode_cache_value, cache_version, CACHE_VERSION_PREFIX
+from src.utils.tracing import stage, count
+
+# Acesso assíncrono ao MongoDB e ao Redis, usado pelos callbacks do dashboard servidos por ASGI: enquanto uma
+# consulta espera o servidor, o mesmo processo atende outras requisições. Os clientes e seus pools vêm de
+# utils/clients.py.
+
+
+def get_async_db():
+    return get_async_mongo_client()[DATABASE_NAME]
+
+
+# Equivalente assíncrono do aggregate_transactions
+async def aggregate_transactions_async(stages, function_name=None, min_value=None):
+    collection = get_async_db()[COLLECTION_NAME]
+    pipeline = [{"$match": build_query(function_name, min_value)}] + list(stages)
+
+    logging.info(f"Executando agregação assíncrona com filtro: {pipeline[0]['$match']}")
+    with stage('query'):
+        cursor = await collection.aggregate(pipeline, allowDiskUse=True)
+        results = await cursor.to_list()
+        count('documents_fetched', len(results))
+    return results
+
+
+# Equivalente assíncrono do load_all_transactions com `columns`: as colunas são acumuladas lote a lote pelo cursor
+async def load_all_transactions_async(function_name=None, min_value=None, columns=None, filters=None,
+                                      batch_size=BATCH_SIZE):
+    if not columns:
+        raise ValueError("O carregamento assíncrono exige a lista de colunas.")
+
+    collection = get_async_db()[COLLECTION_NAME]
+    pipeline = [{"$match": build_query(function_name, min_value, filters)}, {"$project": build_projection(columns)}]
+
+    data = {column: [] for column in columns}
+    with stage('query'):
+        cursor = await collection.aggregate(pipeline, batchSize=batch_size, allowDiskUse=True)
+        async for document in cursor:
+            for column in columns:
+                data[column].append(document.get(column))
+        count('documents_fetched', len(data[columns[0]]))
+    with stage('frame_build'):
+        return frame_from_columns(data)
+
+
+# Equivalente assíncrono do aggregate_rollups
+async def aggregate_rollups_async(stages, unit='day', start=None, end=None, function_name=None, is_error=None):
+    if unit not in ROLLUP_SOURCES:
+        raise ValueError(f"Resolução não suportada pelos rollups: {unit}")
+
+    collection = get_async_db()[f'transactions_rollup_{ROLLUP_SOURCES[unit]}']
+    pipeline = [{"$match": rollup_match(start, end, function_name, is_error)}] + list(stages)
+
+    with stage('query'):
+        cursor = await collection.aggregate(pipeline, allowDiskUse=True)
+        results = await cursor.to_list()
+        count('documents_fetched', len(results))
+    return results
+
+
+# Versão dos rollups: as marcas d'água de todas as resoluções, que só mudam quando uma upkeep soma novas
+# transações. None enquanto não há rollups.
+async def rollup_version_async():
+    state = await get_async_db()[ROLLUP_STATE_COLLECTION].find_one({'_id': 'watermarks'})
+    if not state:
+        return None
+    marks = sorted((resolution, sorted(watermarks.items())) for resolution, watermarks in state.items()
+                   if resolution != '_id')
+    return cache_version(repr(marks).encode())
+
+
+async def get_from_cache_async(cache_key):
+    with stage('cache_read'):
+        cached_data = await get_async_redis().get(cache_key)
+        if cached_data:
+            count('cache_hits')
+            return decode_cache_value(cached_data)
+        count('cache_misses')
+        return None
+
+
+async def save_to_cache_async(cache_key, data):
+    with stage('cache_write'):
+        payload = encode_cache_value(data)
+        async with get_async_redis().pipeline() as pipeline:
+            pipeline.set(cache_key, payload)
+            pipeline.set(f'{CACHE_VERSION_PREFIX}{cache_key}', cache_version(payload))
+            await pipeline.execute()
+        count('bytes_written', len(payload))
+
+
+async def get_cache_versions_async(cache_keys):
+    versions = await get_async_redis().mget([f'{CACHE_VERSION_PREFIX}{cache_key}' for cache_key in cache_keys])
+    return [version.decode() if version else None for version in versions]
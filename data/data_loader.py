@@ -1,15 +1,33 @@
-from pymongo import MongoClient, ASCENDING
-import pandas as pd
+from pymongo import ASCENDING
 import logging
 import random
+from src.config import DATA_SOURCE
+from src.data.schema import canonical_frame, frame_from_columns
+from src.utils.clients import get_db
+from src.utils.tracing import stage, count
+
+try:
+    from pymongoarrow.api import aggregate_arrow_all
+except ImportError:  # pymongoarrow é opcional; sem ele as colunas são montadas em lotes pelo cursor
+    aggregate_arrow_all = None
 
 logging.basicConfig(level=logging.INFO)
 
+# Tamanho dos lotes do cursor no carregamento por colunas
+BATCH_SIZE = 10000
+
+# Converte o timestamp (segundos desde a época) em data BSON no servidor
+TIMESTAMP_AS_DATE = {'$toDate': {'$multiply': [{'$toLong': '$timestamp'}, 1000]}}
 
-def get_db():
-    client = MongoClient('mongodb://localhost:27017/')
-    db = client['defi_data']
-    return db
+# Expressões de projeção que normalizam o tipo de cada coluna no servidor. O pymongoarrow
+# descarta (null) valores cujo tipo difere do inferido, e os valores em wei chegam como
+# string ou inteiro dependendo da origem do documento.
+COLUMN_PROJECTIONS = {
+    'timestamp': {'$toLong': '$timestamp'},
+    'gas_price': {'$toString': '$gas_price'},
+    'gas_used': {'$toString': '$gas_used'},
+    'value': {'$toString': '$value'},
+}
 
 
 def create_indexes():
@@ -21,15 +39,13 @@ def create_indexes():
     collection.create_index([('timestamp', ASCENDING)])
     collection.create_index([('network', ASCENDING)])
     collection.create_index([('is_error', ASCENDING), ('function_name', ASCENDING), ('network', ASCENDING)])
+    collection.create_index([('from', ASCENDING), ('network', ASCENDING), ('timestamp', ASCENDING)])
 
     print("Índices criados com sucesso.")
 
 
-def load_all_transactions(function_name=None, min_value=None):
-    db = get_db()
-    collection = db['transactions']
-
-    query = {}
+def build_query(function_name=None, min_value=None, filters=None):
+    query = dict(filters or {})
     if function_name:
         if isinstance(function_name, list):
             query['function_name'] = {"$in": function_name}
@@ -40,12 +56,107 @@ def load_all_transactions(function_name=None, min_value=None):
 
     # Adiciona o filtro is_error: 0
     query['is_error'] = 0
+    return query
+
+
+def build_projection(columns):
+    projection = {column: COLUMN_PROJECTIONS.get(column, 1) for column in columns}
+    if '_id' not in columns:
+        projection['_id'] = 0
+    return projection
+
+
+def load_columns(collection, query, columns, batch_size=BATCH_SIZE):
+    pipeline = [{"$match": query}, {"$project": build_projection(columns)}]
+
+    if aggregate_arrow_all is not None:
+        # O pymongoarrow monta as colunas Arrow diretamente a partir dos lotes BSON
+        with stage('query'):
+            table = aggregate_arrow_all(collection, pipeline, allowDiskUse=True)
+            count('documents_fetched', table.num_rows)
+        with stage('frame_build'):
+            return canonical_frame(table, columns)
+
+    # Sem pymongoarrow: acumula apenas os valores das colunas pedidas, lote a lote,
+    # sem manter os documentos completos em memória
+    data = {column: [] for column in columns}
+    with stage('query'):
+        for document in collection.aggregate(pipeline, batchSize=batch_size, allowDiskUse=True):
+            for column in columns:
+                data[column].append(document.get(column))
+        count('documents_fetched', len(data[columns[0]]) if columns else 0)
+    with stage('frame_build'):
+        return frame_from_columns(data)
+
+
+# Filtros de período ([start, end), datetimes em UTC) e de rede sobre a coleção, com a mesma conversão do
+# timestamp usada nas agregações
+def period_filters(start=None, end=None, networks=None):
+    filters = {}
+    bounds = []
+    if start is not None:
+        bounds.append({'$gte': [TIMESTAMP_AS_DATE, start]})
+    if end is not None:
+        bounds.append({'$lt': [TIMESTAMP_AS_DATE, end]})
+    if bounds:
+        filters['$expr'] = {'$and': bounds}
+    if networks:
+        filters['network'] = {'$in': list(networks)}
+    return filters
+
+
+# `start`, `end` e `networks` valem para as duas fontes; no snapshot eles eliminam partições e grupos de linhas
+# antes da leitura
+def load_all_transactions(function_name=None, min_value=None, columns=None, filters=None, start=None, end=None,
+                          networks=None):
+    if DATA_SOURCE == 'snapshot':
+        if min_value or filters:
+            raise ValueError("Filtros de valor e consultas do MongoDB não são suportados pelo snapshot.")
+        # Importado aqui: o módulo do snapshot depende deste
+        from src.data.snapshot import load_snapshot
+        return load_snapshot(columns=columns, function_name=function_name, networks=networks, start=start,
+                             end=end)
+
+    db = get_db()
+    collection = db['transactions']
+
+    period = period_filters(start, end, networks)
+    if period:
+        filters = {'$and': [filters, period]} if filters else period
+    query = build_query(function_name, min_value, filters)
 
     # Log the query being executed
     logging.info(f"Executando consulta com filtro: {query}")
 
-    # Executa a consulta com base no filtro definido
-    transactions = pd.DataFrame(list(collection.find(query)))
+    if columns:
+        # Projeção no servidor: apenas as colunas pedidas atravessam a rede
+        transactions = load_columns(collection, query, list(columns))
+    else:
+        # Executa a consulta com base no filtro definido
+        with stage('query'):
+            documents = list(collection.find(query))
+            count('documents_fetched', len(documents))
+        with stage('frame_build'):
+            fields = dict.fromkeys(field for document in documents for field in document)
+            transactions = frame_from_columns({field: [document.get(field) for document in documents]
+                                               for field in fields})
     logging.info(f"{len(transactions)} transações carregadas.")
 
     return transactions
+
+
+def aggregate_transactions(stages, function_name=None, min_value=None):
+    db = get_db()
+    collection = db['transactions']
+
+    # Mesmo filtro do load_all_transactions, seguido dos estágios de agregação executados no servidor
+    query = build_query(function_name, min_value)
+    pipeline = [{"$match": query}] + list(stages)
+
+    logging.info(f"Executando agregação com filtro: {query}")
+    with stage('query'):
+        results = list(collection.aggregate(pipeline, allowDiskUse=True))
+        count('documents_fetched', len(results))
+    logging.info(f"{len(results)} linhas agregadas recebidas.")
+
+    return results
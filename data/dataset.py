@@ -0,0 +1,34 @@
+from src.data.data_loader import load_all_transactions
+import logging
+import threading
+
+FLASH_LOAN_FUNCTIONS = ['flashLoan', 'flashLoanSimple']
+
+
+# Conjunto de flash loans carregado uma única vez e compartilhado entre as análises.
+# Guarda a união das colunas pedidas por cada análise; a consulta ao MongoDB só é feita
+# no primeiro acesso, de modo que análises servidas pelo cache não a disparam. Análises executadas em
+# paralelo esperam a mesma carga em vez de repeti-la. Com `transactions`, o conjunto já chega carregado (como nos
+# benchmarks, sobre dados sintéticos).
+class FlashLoanDataset:
+    def __init__(self, columns, function_name=None, transactions=None):
+        self.columns = list(dict.fromkeys(columns))
+        self.function_name = function_name or FLASH_LOAN_FUNCTIONS
+        self._transactions = transactions
+        self._lock = threading.Lock()
+
+    @property
+    def transactions(self):
+        with self._lock:
+            if self._transactions is None:
+                logging.info(f"Carregando conjunto compartilhado de flash loans com as colunas: {self.columns}")
+                self._transactions = load_all_transactions(function_name=self.function_name, columns=self.columns)
+        return self._transactions
+
+    def get(self, columns):
+        missing = [column for column in columns if column not in self.columns]
+        if missing:
+            raise ValueError(f"Colunas não carregadas no conjunto compartilhado: {missing}")
+
+        # Cópia, pois as análises alteram o DataFrame recebido
+        return self.transactions.reindex(columns=list(columns)).copy()
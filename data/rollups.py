@@ -0,0 +1,218 @@
+import argparse
+import logging
+from datetime import datetime, timedelta
+from pymongo import ASCENDING
+from src.data.data_loader import get_db, TIMESTAMP_AS_DATE
+from src.data.watermarks import advance_watermarks, delta_filter
+
+# Coleções de agregados pré-calculados das transações brutas: contagem, soma de gas_used e soma das taxas
+# (gas_used * gas_price, em wei) por rede x função x is_error x intervalo de tempo
+ROLLUP_RESOLUTIONS = ['minute', 'hour', 'day']
+ROLLUP_KEYS = ['network', 'function_name', 'is_error', 'bucket']
+ROLLUP_STATE_COLLECTION = 'transactions_rollup_state'
+
+# Duração de cada resolução dos rollups
+RESOLUTION_SECONDS = {'minute': 60, 'hour': 60 * 60, 'day': 24 * 60 * 60}
+
+# Rollup lido para cada unidade de tempo do $dateTrunc: o mais grosso que ainda tem a resolução pedida
+ROLLUP_SOURCES = {
+    'minute': 'minute',
+    'hour': 'hour',
+    'day': 'day',
+    'week': 'day',
+    'month': 'day',
+    'quarter': 'day',
+    'year': 'day'
+}
+
+# Taxas somadas como Decimal128: a soma em wei passa facilmente do limite dos inteiros de 64 bits
+FEE_AS_DECIMAL = {'$multiply': [{'$toDecimal': '$gas_used'}, {'$toDecimal': '$gas_price'}]}
+
+
+def rollup_collection(resolution, db=None):
+    db = db if db is not None else get_db()
+    return db[f'transactions_rollup_{resolution}']
+
+
+def create_rollup_indexes(db=None):
+    for resolution in ROLLUP_RESOLUTIONS:
+        collection = rollup_collection(resolution, db)
+        # O $merge exige um índice único nos campos usados para casar os documentos
+        collection.create_index([(key, ASCENDING) for key in ROLLUP_KEYS], unique=True)
+        collection.create_index([('bucket', ASCENDING), ('function_name', ASCENDING)])
+
+
+# Agrupamento das transações brutas (ou de um rollup mais fino, com from_raw=False) na resolução pedida
+def rollup_stages(resolution, from_raw=True):
+    if from_raw:
+        date, count, gas_used, fee = TIMESTAMP_AS_DATE, 1, {'$toLong': '$gas_used'}, FEE_AS_DECIMAL
+    else:
+        date, count, gas_used, fee = '$bucket', '$count', '$gas_used', '$fee'
+
+    return [
+        {"$group": {
+            "_id": {
+                "network": "$network",
+                "function_name": "$function_name",
+                "is_error": "$is_error",
+                "bucket": {"$dateTrunc": {"date": date, "unit": resolution}}
+            },
+            "count": {"$sum": count},
+            "gas_used": {"$sum": gas_used},
+            "fee": {"$sum": fee}
+        }},
+        {"$project": {"_id": 0, **{key: f"$_id.{key}" for key in ROLLUP_KEYS},
+                      "count": 1, "gas_used": 1, "fee": 1}}
+    ]
+
+
+# Grava o agrupamento no rollup; com accumulate=True os valores são somados aos já existentes no intervalo
+def merge_stage(resolution, accumulate):
+    when_matched = 'replace'
+    if accumulate:
+        when_matched = [{"$set": {field: {"$add": [f"${field}", f"$$new.{field}"]}
+                                  for field in ['count', 'gas_used', 'fee']}}]
+    return {"$merge": {
+        "into": f'transactions_rollup_{resolution}',
+        "on": ROLLUP_KEYS,
+        "whenMatched": when_matched,
+        "whenNotMatched": "insert"
+    }}
+
+
+# Marcas d'água de cada resolução, gravadas logo após o $merge dela: uma falha no meio da atualização não faz
+# as resoluções já atualizadas somarem o mesmo intervalo de novo. Estados antigos, com uma marca comum, valem
+# para todas as resoluções.
+def load_rollup_watermarks(db):
+    state = db[ROLLUP_STATE_COLLECTION].find_one({'_id': 'watermarks'}) or {}
+    shared = state.get('watermarks', {})
+    return {resolution: state.get(resolution, shared) for resolution in ROLLUP_RESOLUTIONS}
+
+
+def save_rollup_watermarks(db, resolution, watermarks):
+    db[ROLLUP_STATE_COLLECTION].update_one({'_id': 'watermarks'}, {'$set': {resolution: watermarks}}, upsert=True)
+
+
+# Reconstrói os rollups a partir de toda a coleção: o de minutos vem das transações brutas
+# e cada resolução seguinte do rollup anterior, sem varrer a coleção bruta de novo
+def backfill_rollups():
+    db = get_db()
+    transactions = db['transactions']
+
+    # Sem estado até o fim do backfill: um backfill interrompido é refeito por inteiro na próxima upkeep
+    db[ROLLUP_STATE_COLLECTION].delete_one({'_id': 'watermarks'})
+    for resolution in ROLLUP_RESOLUTIONS:
+        rollup_collection(resolution, db).drop()
+    create_rollup_indexes(db)
+
+    # Marcas d'água calculadas antes da varredura: inserções feitas durante o backfill ficam para a próxima upkeep
+    watermarks = advance_watermarks(transactions, {}, {})
+    match = delta_filter({}, watermarks)
+    if match is None:
+        logging.info("Coleção de transações vazia, rollups não criados.")
+        return
+
+    source, from_raw = transactions, True
+    for resolution in ROLLUP_RESOLUTIONS:
+        logging.info(f"Calculando o rollup por {resolution}...")
+        source.aggregate([{"$match": match}] + rollup_stages(resolution, from_raw) +
+                         [merge_stage(resolution, accumulate=False)], allowDiskUse=True)
+        source, from_raw, match = rollup_collection(resolution, db), False, {}
+
+    for resolution in ROLLUP_RESOLUTIONS:
+        save_rollup_watermarks(db, resolution, watermarks)
+    logging.info("Rollups reconstruídos a partir de toda a coleção.")
+
+
+# Maior marca de cada rede entre as resoluções (após uma falha, as primeiras resoluções estão à frente)
+def latest_watermarks(watermarks):
+    latest = {}
+    for resolution_watermarks in watermarks.values():
+        for network, watermark in resolution_watermarks.items():
+            if network not in latest or watermark > latest[network]:
+                latest[network] = watermark
+    return latest
+
+
+# Soma aos rollups apenas as transações inseridas desde a última execução de cada resolução
+def update_rollups():
+    db = get_db()
+    transactions = db['transactions']
+
+    watermarks = load_rollup_watermarks(db)
+    if not all(watermarks.values()):
+        logging.info("Rollups sem marcas d'água, executando o backfill.")
+        backfill_rollups()
+        return
+
+    new_watermarks = advance_watermarks(transactions, {}, latest_watermarks(watermarks))
+    updated = False
+    for resolution in ROLLUP_RESOLUTIONS:
+        match = delta_filter(watermarks[resolution], new_watermarks)
+        if match is None:
+            continue
+        transactions.aggregate([{"$match": match}] + rollup_stages(resolution) +
+                               [merge_stage(resolution, accumulate=True)], allowDiskUse=True)
+        save_rollup_watermarks(db, resolution, new_watermarks)
+        updated = True
+
+    if updated:
+        logging.info("Rollups atualizados com as transações novas.")
+    else:
+        logging.info("Nenhuma transação nova para os rollups.")
+
+
+def rollup_match(start=None, end=None, function_name=None, is_error=None):
+    match = {}
+    if start is not None or end is not None:
+        match['bucket'] = {}
+        if start is not None:
+            match['bucket']['$gte'] = start
+        if end is not None:
+            match['bucket']['$lt'] = end
+    if function_name:
+        match['function_name'] = {"$in": function_name} if isinstance(function_name, list) else function_name
+    if is_error is not None:
+        match['is_error'] = is_error
+    return match
+
+
+# Equivalente ao aggregate_transactions sobre os rollups: filtra pelo intervalo [start, end) e executa os
+# estágios no rollup adequado à unidade de tempo pedida
+def aggregate_rollups(stages, unit='day', start=None, end=None, function_name=None, is_error=None):
+    if unit not in ROLLUP_SOURCES:
+        raise ValueError(f"Resolução não suportada pelos rollups: {unit}")
+
+    collection = rollup_collection(ROLLUP_SOURCES[unit])
+    pipeline = [{"$match": rollup_match(start, end, function_name, is_error)}] + list(stages)
+
+    logging.info(f"Executando agregação no rollup por {ROLLUP_SOURCES[unit]}.")
+    return list(collection.aggregate(pipeline, allowDiskUse=True))
+
+
+# Menor resolução dos rollups que cobre o intervalo [start, end) com no máximo `max_points` intervalos
+def pick_resolution(start, end, max_points):
+    span = (end - start).total_seconds()
+    for resolution in ROLLUP_RESOLUTIONS:
+        if span / RESOLUTION_SECONDS[resolution] <= max_points:
+            return resolution
+    return ROLLUP_RESOLUTIONS[-1]
+
+
+# Intervalo [start, end) a partir de datas inclusivas no formato YYYY-MM-DD (como as do DatePickerRange)
+def date_range_bounds(start_date=None, end_date=None):
+    start = datetime.fromisoformat(start_date[:10]) if start_date else None
+    end = datetime.fromisoformat(end_date[:10]) + timedelta(days=1) if end_date else None
+    return start, end
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mantém os rollups de transações por minuto, hora e dia.")
+    parser.add_argument('command', choices=['backfill', 'update'])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    if args.command == 'backfill':
+        backfill_rollups()
+    else:
+        update_rollups()
@@ -0,0 +1,104 @@
+import logging
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Esquema canônico dos DataFrames de transações entregues às análises:
+# - network, function_name, from e to: categóricos (códigos inteiros sobre um dicionário de valores únicos)
+# - _id: os 12 bytes do ObjectId
+# - timestamp: int64 (segundos desde a época); is_error: int8
+# - gas_price e gas_used: uint64; value (wei): decimal de 38 dígitos, exato e de largura fixa
+# Colunas fora do esquema (como input) mantêm o tipo do Arrow.
+CATEGORY_COLUMNS = ['network', 'function_name', 'from', 'to']
+OBJECT_ID_COLUMNS = ['_id']
+WEI_TYPES = {
+    'gas_price': pa.uint64(),
+    'gas_used': pa.uint64(),
+    'value': pa.decimal128(38, 0),
+}
+INTEGER_TYPES = {
+    'timestamp': pa.int64(),
+    'is_error': pa.int8(),
+}
+OBJECT_ID_TYPE = pa.binary(12)
+
+# Tipos do pandas para as colunas convertidas: inteiros de wei anuláveis e sem passar por float
+PANDAS_TYPES = {
+    pa.uint64(): pd.UInt64Dtype(),
+    pa.decimal128(38, 0): pd.ArrowDtype(pa.decimal128(38, 0)),
+    OBJECT_ID_TYPE: pd.ArrowDtype(OBJECT_ID_TYPE),
+}
+
+
+# O cast de texto para decimal128 só falha pouco acima da precisão: valores bem mais longos transbordam em
+# silêncio (61 dígitos viram um número negativo ou zero). Os dígitos são contados antes do cast.
+def exceeds_precision(strings, precision):
+    digits = pc.utf8_length(pc.utf8_ltrim(pc.utf8_ltrim(strings, characters='+-'), characters='0'))
+    longest = pc.max(digits).as_py()
+    return longest is not None and longest > precision
+
+
+# Valores em wei convertidos sem perda; fora do intervalo do tipo (acima de 2**64 - 1 no gas, de 38 dígitos
+# no value) a coluna continua como texto, que as análises somam com Decimal
+def wei_array(name, array):
+    target = WEI_TYPES[name]
+    if array.type == target:
+        return array
+    try:
+        if pa.types.is_integer(array.type):
+            return array.cast(target)
+        strings = array.cast(pa.string())
+        if pa.types.is_decimal(target) and exceeds_precision(strings, target.precision):
+            raise pa.ArrowInvalid(f"Valores com mais de {target.precision} dígitos")
+        return strings.cast(target)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        logging.warning(f"Valores da coluna {name} fora do intervalo de {target}, mantidos como texto.")
+        return array.cast(pa.string())
+
+
+def canonical_array(name, array):
+    if isinstance(array.type, pa.ExtensionType):
+        array = array.storage
+    if name in CATEGORY_COLUMNS:
+        return pc.dictionary_encode(array.cast(pa.string()))
+    if name in OBJECT_ID_COLUMNS:
+        if pa.types.is_string(array.type):
+            # ObjectId em hexadecimal (como no snapshot)
+            return pa.array([bytes.fromhex(value) if value is not None else None for value in array.to_pylist()],
+                            type=OBJECT_ID_TYPE)
+        return array.cast(OBJECT_ID_TYPE)
+    if name in WEI_TYPES:
+        return wei_array(name, array)
+    if name in INTEGER_TYPES:
+        return array.cast(INTEGER_TYPES[name])
+    return array
+
+
+def canonical_table(table):
+    return pa.table({name: canonical_array(name, table.column(name).combine_chunks())
+                     for name in table.column_names})
+
+
+def canonical_frame(table, columns=None):
+    frame = canonical_table(table).to_pandas(types_mapper=PANDAS_TYPES.get)
+
+    # Categorias em ordem alfabética (o dictionary_encode segue a ordem de aparição), para que agrupamentos
+    # saiam na mesma ordem que com strings
+    for name in CATEGORY_COLUMNS:
+        if name in frame.columns:
+            frame[name] = frame[name].cat.reorder_categories(sorted(frame[name].cat.categories))
+    return frame.reindex(columns=columns) if columns is not None else frame
+
+
+# Coluna Arrow a partir dos valores lidos pelo cursor (ObjectIds como bytes; tipos mistos viram texto)
+def column_array(name, values):
+    if name in OBJECT_ID_COLUMNS:
+        return pa.array([value.binary if value is not None else None for value in values], type=OBJECT_ID_TYPE)
+    try:
+        return pa.array(values, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([str(value) if value is not None else None for value in values], type=pa.string())
+
+
+def frame_from_columns(data):
+    return canonical_frame(pa.table({name: column_array(name, values) for name, values in data.items()}))
@@ -0,0 +1,151 @@
+import argparse
+import logging
+from datetime import datetime, timezone
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from pyarrow import fs
+from src.config import SNAPSHOT_DIR
+from src.data.data_loader import get_db, BATCH_SIZE
+from src.data.schema import canonical_frame
+from src.utils.tracing import stage, count
+
+# Esquema do snapshot. gas_price e gas_used cabem em uint64; value pode chegar a uint256 e fica como string
+# decimal, convertida para o esquema canônico (data/schema.py) na leitura.
+SNAPSHOT_SCHEMA = pa.schema([
+    ('_id', pa.string()),
+    ('function_name', pa.string()),
+    ('is_error', pa.int8()),
+    ('timestamp', pa.int64()),
+    ('from', pa.string()),
+    ('input', pa.string()),
+    ('value', pa.string()),
+    ('gas_price', pa.uint64()),
+    ('gas_used', pa.uint64()),
+    ('network', pa.string()),
+    ('month', pa.string())
+])
+
+# Partições em diretórios network=<rede>/month=<AAAA-MM>
+PARTITIONING = ds.partitioning(pa.schema([('network', pa.string()), ('month', pa.string())]), flavor='hive')
+
+# Conversões feitas no servidor para que cada campo chegue com o tipo do esquema (null quando não converte)
+SNAPSHOT_PROJECTION = {
+    '_id': {'$toString': '$_id'},
+    'function_name': {'$convert': {'input': '$function_name', 'to': 'string', 'onError': None, 'onNull': None}},
+    'is_error': {'$convert': {'input': '$is_error', 'to': 'int', 'onError': None, 'onNull': None}},
+    'timestamp': {'$convert': {'input': '$timestamp', 'to': 'long', 'onError': None, 'onNull': None}},
+    'from': {'$convert': {'input': '$from', 'to': 'string', 'onError': None, 'onNull': None}},
+    'input': {'$convert': {'input': '$input', 'to': 'string', 'onError': None, 'onNull': None}},
+    'value': {'$convert': {'input': '$value', 'to': 'string', 'onError': None, 'onNull': None}},
+    'gas_price': {'$convert': {'input': '$gas_price', 'to': 'long', 'onError': None, 'onNull': None}},
+    'gas_used': {'$convert': {'input': '$gas_used', 'to': 'long', 'onError': None, 'onNull': None}},
+    'network': {'$ifNull': ['$network', 'unknown']},
+}
+
+# Linhas por grupo do Parquet: grupos menores deixam o filtro por timestamp descartar mais dados sem lê-los
+ROW_GROUP_SIZE = 64 * 1024
+
+
+# Segundos desde a época; datetimes sem fuso são tratados como UTC, como os timestamps das transações
+def to_epoch(moment):
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp())
+
+
+def month_of(timestamp):
+    if timestamp is None:
+        return 'unknown'
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y-%m')
+
+
+# Lê a coleção em lotes pelo cursor e converte cada lote em um RecordBatch do esquema
+def snapshot_batches(collection, query, batch_size):
+    cursor = collection.aggregate([{"$match": query}, {"$project": SNAPSHOT_PROJECTION}],
+                                  batchSize=batch_size, allowDiskUse=True)
+
+    batch = []
+    for document in cursor:
+        document['month'] = month_of(document.get('timestamp'))
+        batch.append(document)
+        if len(batch) == batch_size:
+            yield pa.RecordBatch.from_pylist(batch, schema=SNAPSHOT_SCHEMA)
+            batch = []
+    if batch:
+        yield pa.RecordBatch.from_pylist(batch, schema=SNAPSHOT_SCHEMA)
+
+
+# Exporta a coleção de transações para Parquet particionado por rede e mês, sem carregá-la inteira em memória.
+# As partições exportadas substituem as existentes.
+def export_snapshot(snapshot_dir=SNAPSHOT_DIR, query=None, batch_size=BATCH_SIZE):
+    collection = get_db()['transactions']
+    logging.info(f"Exportando snapshot das transações para {snapshot_dir}...")
+
+    ds.write_dataset(
+        snapshot_batches(collection, query or {}, batch_size),
+        snapshot_dir,
+        schema=SNAPSHOT_SCHEMA,
+        format='parquet',
+        partitioning=PARTITIONING,
+        existing_data_behavior='delete_matching',
+        max_rows_per_group=ROW_GROUP_SIZE,
+        min_rows_per_group=ROW_GROUP_SIZE
+    )
+    logging.info("Snapshot exportado.")
+
+
+def open_snapshot(snapshot_dir=SNAPSHOT_DIR):
+    # Leitura com memory map: as páginas do Parquet vêm direto do cache de arquivos do sistema operacional
+    return ds.dataset(snapshot_dir, schema=SNAPSHOT_SCHEMA, format='parquet', partitioning=PARTITIONING,
+                      filesystem=fs.LocalFileSystem(use_mmap=True))
+
+
+# Filtro do scan: rede e mês eliminam partições inteiras; timestamp, função e is_error usam as
+# estatísticas de cada grupo de linhas antes de decodificá-lo
+def snapshot_filter(function_name=None, networks=None, start=None, end=None, is_error=0):
+    conditions = []
+    if function_name:
+        names = function_name if isinstance(function_name, list) else [function_name]
+        conditions.append(pc.field('function_name').isin(names))
+    if networks:
+        conditions.append(pc.field('network').isin(list(networks)))
+    if start is not None:
+        conditions.append(pc.field('month') >= month_of(to_epoch(start)))
+        conditions.append(pc.field('timestamp') >= to_epoch(start))
+    if end is not None:
+        conditions.append(pc.field('month') <= month_of(to_epoch(end)))
+        conditions.append(pc.field('timestamp') < to_epoch(end))
+    if is_error is not None:
+        conditions.append(pc.field('is_error') == is_error)
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+# Equivalente ao load_all_transactions a partir do snapshot: só as colunas pedidas são lidas dos arquivos.
+# `start` e `end` são datetimes em UTC ([start, end)).
+def load_snapshot(columns=None, function_name=None, networks=None, start=None, end=None, is_error=0,
+                  snapshot_dir=SNAPSHOT_DIR):
+    dataset = open_snapshot(snapshot_dir)
+    columns = list(columns) if columns else [name for name in SNAPSHOT_SCHEMA.names if name != 'month']
+
+    with stage('query'):
+        table = dataset.to_table(columns=columns,
+                                 filter=snapshot_filter(function_name, networks, start, end, is_error))
+        count('documents_fetched', table.num_rows)
+    logging.info(f"{table.num_rows} transações carregadas do snapshot.")
+    with stage('frame_build'):
+        return canonical_frame(table)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta a coleção de transações para um snapshot em Parquet.")
+    parser.add_argument('--output', default=SNAPSHOT_DIR)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    export_snapshot(args.output, batch_size=args.batch_size)
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+
+# Marcas d'água por rede: maior _id já processado de cada rede. Os ObjectIds são gerados pelos clientes, então
+# a ordem dos _ids só acompanha a das inserções de forma aproximada: um documento pode ficar visível depois de
+# outro com _id maior (escritores concorrentes, relógios diferentes). Por isso as marcas só avançam até
+# SAFETY_WINDOW antes de agora; os documentos acima desse limite não são dados como processados e são relidos
+# na execução seguinte. A janela deve cobrir o atraso de inserção e a diferença de relógio dos escritores.
+SAFETY_WINDOW = timedelta(minutes=10)
+
+
+# Maior _id que pode ser dado como processado: o de um documento gerado no início da janela de segurança
+def settled_limit(now=None):
+    now = now if now is not None else datetime.now(timezone.utc)
+    return ObjectId.from_datetime(now - SAFETY_WINDOW)
+
+
+# Filtra as transações ainda não processadas: _id acima da marca de cada rede (redes novas entram inteiras)
+def after_watermarks(watermarks):
+    if not watermarks:
+        return {}
+    clauses = [{'network': network, '_id': {'$gt': watermark}} for network, watermark in watermarks.items()]
+    clauses.append({'network': {'$nin': list(watermarks)}})
+    return {'$or': clauses}
+
+
+# Nova marca d'água de cada rede, calculada apenas sobre as transações ainda não processadas e com _id até
+# `limit` (por padrão, o limite da janela de segurança)
+def advance_watermarks(collection, query, watermarks, limit=None):
+    limit = limit if limit is not None else settled_limit()
+    match = {**query, **after_watermarks(watermarks), '_id': {'$lte': limit}}
+    rows = collection.aggregate([
+        {"$match": match},
+        {"$group": {"_id": "$network", "watermark": {"$max": "$_id"}}}
+    ])
+
+    new_watermarks = dict(watermarks)
+    new_watermarks.update({row['_id']: row['watermark'] for row in rows if row['_id'] is not None})
+    return new_watermarks
+
+
+# Intervalo (marca anterior, nova marca] de cada rede que avançou; None se não há transações novas
+def delta_filter(watermarks, new_watermarks):
+    clauses = []
+    for network, watermark in new_watermarks.items():
+        if watermarks.get(network) == watermark:
+            continue
+        id_range = {'$lte': watermark}
+        if network in watermarks:
+            id_range['$gt'] = watermarks[network]
+        clauses.append({'network': network, '_id': id_range})
+
+    if not clauses:
+        return None
+    return {'$or': clauses}
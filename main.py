@@ -1,65 +1,257 @@
-import logging
-from analyses.flash_loan_frequency import analyze_flash_loan_frequency, extract_day_hour
-from analyses.flash_loan_fee import analyze_flash_loan_fee
-from analyses.flash_loan_volume import analyze_flash_loan_volume, analyze_flash_loan_volume_all
-from analyses.flash_loan_tokens import analyze_flash_loan_tokens
-from analyses.transaction_sequence import analyze_flash_loan_wallets
-from utils.decoder_input import decode_flash_loan_transaction
-from data.data_loader import create_indexes
-from utils.helpers import save_to_cache
+import argparse
 import json
+import logging
+import os
+import sys
+import time
+
+# As análises (e com elas pandas, pymongo, redis e eth_abi) são importadas apenas dentro do subcomando que as
+# executa: uma invocação de uma única análise não paga a importação das demais. Todas pelo pacote `src`, como nos
+# próprios módulos (python -m src.main), para que nenhum módulo, e o estado do tracing, seja carregado duas vezes.
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+NETWORKS = ['ethereum', 'polygon']
+
+
+def selected_networks(args):
+    return [args.network] if args.network else NETWORKS
+
+
+def filter_network(data, args):
+    if args.network is None or data is None or 'network' not in data.columns:
+        return data
+    return data[data['network'] == args.network].reset_index(drop=True)
+
+
+# Intervalo [start, end) a partir de --since/--until (datas inclusivas, YYYY-MM-DD)
+def date_bounds(args):
+    if args.since is None and args.until is None:
+        return None, None
+    from src.data.rollups import date_range_bounds
+    return date_range_bounds(args.since, args.until)
+
+
+def run_fee(args):
+    from src.analyses.flash_loan_fee import analyze_flash_loan_fee
+    ethereum_metrics, polygon_metrics = analyze_flash_loan_fee(use_cache=not args.no_cache)
+    metrics = {'ethereum': ethereum_metrics, 'polygon': polygon_metrics}
+    return {network: metrics[network] for network in selected_networks(args)}
+
+
+def run_frequency(args):
+    from src.analyses.flash_loan_frequency import analyze_flash_loan_frequency
+    start, end = date_bounds(args)
+    return filter_network(analyze_flash_loan_frequency(use_cache=not args.no_cache, start=start, end=end), args)
+
+
+def run_day_hour(args):
+    import pandas as pd
+    from src.analyses.flash_loan_frequency import extract_day_hour
+    start, end = date_bounds(args)
+    parts = extract_day_hour(use_cache=not args.no_cache, start=start, end=end)
+
+    # extract_day_hour devolve (None, None) quando não há dados; redes sem linhas ficam de fora do concat
+    parts = [part for part in parts if part is not None and not part.empty]
+    if not parts:
+        return pd.DataFrame(columns=['network', 'day_of_week', 'hour', 'count'])
+    return filter_network(pd.concat(parts, ignore_index=True), args)
+
+
+def run_tokens(args):
+    from src.analyses.flash_loan_tokens import analyze_flash_loan_tokens
+    return filter_network(analyze_flash_loan_tokens(use_cache=not args.no_cache), args)
+
+
+def run_volume(args):
+    from src.analyses.flash_loan_volume import analyze_flash_loan_volume
+    start, end = date_bounds(args)
+    return filter_network(analyze_flash_loan_volume(use_cache=not args.no_cache, start=start, end=end), args)
+
+
+def run_wallets(args):
+    from src.analyses.transaction_sequence import analyze_flash_loan_sequences
+    return filter_network(analyze_flash_loan_sequences(use_cache=not args.no_cache)['steps'], args)
+
+
+def run_ngrams(args):
+    from src.analyses.transaction_sequence import analyze_flash_loan_sequences
+    return filter_network(analyze_flash_loan_sequences(use_cache=not args.no_cache)['ngrams'], args)
+
+
+def run_transitions(args):
+    from src.analyses.transaction_sequence import analyze_flash_loan_sequences
+    return filter_network(analyze_flash_loan_sequences(use_cache=not args.no_cache)['transitions'], args)
+
+
+# Análises do lote e as chaves do cache que cada uma grava. Apenas volume_all depende de outra etapa
+# (lê o flash_loan_volume gravado por volume); as demais rodam em paralelo.
+def analysis_nodes(dataset, use_cache=True):
+    from src.analyses.flash_loan_fee import analyze_flash_loan_fee
+    from src.analyses.flash_loan_frequency import analyze_flash_loan_frequency, extract_day_hour
+    from src.analyses.flash_loan_tokens import analyze_flash_loan_tokens
+    from src.analyses.flash_loan_volume import analyze_flash_loan_volume, analyze_flash_loan_volume_all
+    from src.analyses.transaction_sequence import analyze_flash_loan_sequences, SEQUENCE_CACHE_KEYS
+    from src.utils.helpers import save_to_cache
+    from src.utils.pipeline import Node
+
+    def fee():
+        logging.info("Analisando taxas de flash loans...")
+        ethereum_metrics, polygon_metrics = analyze_flash_loan_fee(use_cache=use_cache, dataset=dataset)
+
+        #Exibir os resultados
+        print("Métricas Ethereum:", ethereum_metrics)
+        print("Métricas Polygon:", polygon_metrics)
+
+    def volume_all():
+        logging.info("Analisando volume de flash loans...")
+        volume_data = analyze_flash_loan_volume_all(use_cache=use_cache)
+        save_to_cache('flash_loan_volume_all', volume_data)
+
+    return [
+        Node('fee', fee,
+             outputs=['flash_loan_fee_ethereum', 'flash_loan_fee_polygon']),
+        Node('frequency', lambda: analyze_flash_loan_frequency(use_cache=use_cache, dataset=dataset),
+             outputs=['flash_loan_frequency']),
+        Node('day_hour', lambda: extract_day_hour(use_cache=use_cache, dataset=dataset),
+             outputs=['flash_loan_frequency_day_hour_polygon', 'flash_loan_frequency_day_hour_ethereum']),
+        Node('volume', lambda: analyze_flash_loan_volume(use_cache=use_cache),
+             outputs=['flash_loan_volume']),
+        Node('volume_all', volume_all, requires=['volume'],
+             outputs=['flash_loan_volume_all']),
+        Node('sequences', lambda: analyze_flash_loan_sequences(use_cache=use_cache),
+             outputs=list(SEQUENCE_CACHE_KEYS.values())),
+        Node('tokens', lambda: analyze_flash_loan_tokens(use_cache=use_cache, dataset=dataset),
+             outputs=['flash_loan_tokens']),
+    ]
+
+
+# Todas as análises, em paralelo, gravando os resultados no cache do dashboard
+def run_all(args):
+    from src.analyses.flash_loan_fee import FEE_COLUMNS
+    from src.analyses.flash_loan_frequency import FREQUENCY_COLUMNS
+    from src.analyses.flash_loan_tokens import TOKEN_COLUMNS
+    from src.data.dataset import FlashLoanDataset
+    from src.utils.pipeline import run_pipeline, log_summary
 
-def main():
     logging.info("Iniciando a análise de dados DeFi.")
-    #create_indexes()
 
-    #Executar a análise das taxas de flash loans
-    logging.info("Analisando taxas de flash loans...")
-    ethereum_metrics, polygon_metrics = analyze_flash_loan_fee()
+    # Flash loans carregados uma única vez e compartilhados pelas análises abaixo
+    dataset = FlashLoanDataset(FEE_COLUMNS + FREQUENCY_COLUMNS + TOKEN_COLUMNS)
+
+    start = time.perf_counter()
+    summary = run_pipeline(analysis_nodes(dataset, use_cache=not args.no_cache), max_workers=args.workers)
+    log_summary(summary, time.perf_counter() - start)
+
+    failed = [name for name, result in summary.items() if result['status'] != 'done']
+    if failed:
+        logging.error(f"Análise concluída com etapas não executadas: {failed}")
+    else:
+        logging.info("Análise concluída com sucesso.")
+    return not failed
+
+
+# Atualização incremental dos agregados do cache, dos rollups e do dicionário de endereços a partir apenas das
+# transações inseridas desde a execução anterior (para rodar periodicamente, no lugar do lote completo)
+def run_refresh(args):
+    from src.config import DATA_SOURCE
+    if DATA_SOURCE == 'snapshot':
+        # As marcas d'água, os rollups e o dicionário de endereços são mantidos sobre a coleção do MongoDB
+        logging.error("A atualização incremental exige TCC_DATA_SOURCE=mongo; com o snapshot, use o subcomando all.")
+        return False
+
+    from src.analyses.incremental import refresh_all
+    logging.info("Atualizando os agregados incrementalmente.")
+    refresh_all()
+    return True
+
 
-    #Exibir os resultados
-    print("Métricas Ethereum:", ethereum_metrics)
-    print("Métricas Polygon:", polygon_metrics)
+# Grava o resultado de um subcomando: JSON para arquivos .json, CSV para os demais
+def write_output(result, path):
+    if isinstance(result, dict):
+        with open(path, 'w') as file:
+            json.dump(result, file, indent=2, default=str)
+    elif path.endswith('.json'):
+        result.to_json(path, orient='records', date_format='iso', default_handler=str)
+    else:
+        result.to_csv(path, index=False)
+    logging.info(f"Resultado salvo em {path}")
 
-    logging.info("Analisando a frequência de flash loans...")
-    extract_day_hour()
 
-    logging.info("Analisando volume de flash loans...")
-    volume_data = analyze_flash_loan_volume_all()
-    save_to_cache('flash_loan_volume_all', volume_data)
+def print_result(result):
+    if isinstance(result, dict):
+        print(json.dumps(result, indent=2, default=str))
+    else:
+        print(result.to_string(index=False))
 
-    #logging.info("Análise concluída com sucesso.")
-    #print(volume_data)
 
+# Subcomando -> (função, aceita --since/--until)
+COMMANDS = {
+    'fee': (run_fee, False),
+    'frequency': (run_frequency, True),
+    'day-hour': (run_day_hour, True),
+    'tokens': (run_tokens, False),
+    'volume': (run_volume, True),
+    'wallets': (run_wallets, False),
+    'ngrams': (run_ngrams, False),
+    'transitions': (run_transitions, False),
+}
 
-    flash_loan_wallets_analysis_polygon, flash_loan_wallets_analysis_ethereum = analyze_flash_loan_wallets()
 
-    save_to_cache('flash_loan_wallets_analysis_polygon',
-                  json.dumps(flash_loan_wallets_analysis_polygon.to_dict(orient='records')))
-    save_to_cache('flash_loan_wallets_analysis_ethereum',
-                  json.dumps(flash_loan_wallets_analysis_ethereum.to_dict(orient='records')))
+def build_parser():
+    parser = argparse.ArgumentParser(description="Análises de flash loans.")
+    subparsers = parser.add_subparsers(dest='command')
 
-    logging.info("Dados salvos no cache Redis.")
+    for command, (_, date_filtered) in COMMANDS.items():
+        subparser = subparsers.add_parser(command)
+        subparser.add_argument('--network', choices=NETWORKS, help="Apenas os resultados desta rede")
+        if date_filtered:
+            subparser.add_argument('--since', help="Data inicial (YYYY-MM-DD), lida dos rollups ou do snapshot")
+            subparser.add_argument('--until', help="Data final, inclusiva (YYYY-MM-DD)")
+        subparser.add_argument('--no-cache', action='store_true', help="Recalcula ignorando o cache do Redis")
+        subparser.add_argument('--output', help="Arquivo de saída (.json ou .csv); omitido: imprime o resultado")
 
+    all_parser = subparsers.add_parser('all', help="Executa todas as análises e atualiza o cache (padrão)")
+    all_parser.add_argument('--no-cache', action='store_true', help="Recalcula ignorando o cache do Redis")
+    all_parser.add_argument('--workers', type=int, default=int(os.getenv('TCC_PIPELINE_WORKERS', '4')),
+                            help="Análises executadas ao mesmo tempo")
 
-#    logging.info("Analisando taxas de flash loans...")
-#    analyze_flash_loan_fee()
+    subparsers.add_parser('refresh', help="Atualiza o cache, os rollups e o dicionário de endereços apenas com as "
+                                          "transações novas")
+    return parser
 
-    logging.info("Analisando distribuição de tokens...")
-    analyze_flash_loan_tokens()
 
-#    logging.info("Analisando sequência de transações...")
-#    analyze_transaction_sequence()
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
 
-    logging.info("Análise concluída com sucesso.")
+    if args.command in (None, 'all'):
+        if args.command is None:
+            args = parser.parse_args(['all'])
+        return run_all(args)
+    if args.command == 'refresh':
+        return run_refresh(args)
 
-#    analyze_and_cache_random_transactions()
+    run, _ = COMMANDS[args.command]
+    result = run(args)
+    if args.output:
+        write_output(result, args.output)
+    else:
+        print_result(result)
+    return True
 
 
+def finish_tracing():
+    # Com TCC_TRACING=1, salva o tempo, a memória e os volumes de cada etapa das análises executadas
+    if os.getenv('TCC_TRACING', '0') != '1':
+        return
+    from src.utils.tracing import write_run_summary, write_prometheus
+    write_run_summary()
+    if os.getenv('TCC_PROMETHEUS_FILE'):
+        write_prometheus(os.getenv('TCC_PROMETHEUS_FILE'))
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    succeeded = main()
+    finish_tracing()
+    sys.exit(0 if succeeded else 1)
@@ -0,0 +1,25 @@
+import importlib.util
+import sys
+from pathlib import Path
+import fakeredis
+import pytest
+
+# O código importa os módulos pelo pacote `src` (este diretório, no projeto). Nos testes o pacote é registrado
+# a partir da raiz do repositório, qualquer que seja o nome do diretório.
+ROOT = Path(__file__).resolve().parent.parent
+if 'src' not in sys.modules:
+    spec = importlib.util.spec_from_file_location('src', ROOT / '__init__.py', submodule_search_locations=[str(ROOT)])
+    sys.modules['src'] = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(sys.modules['src'])
+
+
+# Redis em memória no lugar do cliente compartilhado, em todos os módulos que o importaram pelo nome
+@pytest.fixture
+def fake_redis(monkeypatch):
+    import src.utils.helpers as helpers
+    client = fakeredis.FakeStrictRedis()
+    monkeypatch.setattr(helpers, 'redis_client', client)
+    for name, module in list(sys.modules.items()):
+        if name.startswith('src.') and getattr(module, 'redis_client', None) is not None:
+            monkeypatch.setattr(module, 'redis_client', client)
+    return client
@@ -0,0 +1,33 @@
+import pytest
+from src.benchmarks.synthetic import encode_flash_loan_simple, encode_flash_loan
+from src.utils.decoder_input import decode_flash_loan_batch
+
+RECEIVER = '0x' + '1' * 40
+ASSET = '0x' + '2' * 40
+
+# Amounts nas bordas das metades uint64 e acima de 128 bits (lidos pelo int())
+AMOUNTS = [0, 1, 2 ** 64 - 1, 2 ** 64, 2 ** 100 + 7, 2 ** 128 - 1, 2 ** 128, 2 ** 256 - 1]
+
+
+def test_amounts_of_every_width():
+    inputs = [encode_flash_loan_simple(RECEIVER, ASSET, amount) for amount in AMOUNTS]
+    inputs.append(encode_flash_loan(RECEIVER, [ASSET, ASSET], [2 ** 70, 5]))
+
+    calls = decode_flash_loan_batch(inputs, explode=True)
+    assert list(calls['amount']) == AMOUNTS + [2 ** 70, 5]
+    assert all(type(amount) is int for amount in calls['amount'])
+
+    transactions = decode_flash_loan_batch(inputs)
+    assert transactions['amounts'].iloc[-1] == [2 ** 70, 5]
+    assert transactions['assets'].iloc[-1] == [ASSET, ASSET]
+
+
+@pytest.mark.parametrize('explode, columns', [
+    (False, ['method', 'receiver_address', 'assets', 'amounts']),
+    (True, ['method', 'receiver_address', 'asset', 'amount']),
+])
+def test_empty_input(explode, columns):
+    decoded = decode_flash_loan_batch([], explode=explode)
+
+    assert decoded.empty
+    assert list(decoded.columns) == columns
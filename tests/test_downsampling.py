@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.utils.downsampling import downsample_frequency
+
+
+def frequency_data(days=100):
+    dates = pd.date_range('2023-01-01', periods=days, freq='D').date
+    return pd.DataFrame({
+        'timestamp': np.concatenate([dates, dates]),
+        'network': ['polygon'] * days + ['ethereum'] * days,
+        'count': np.arange(2 * days, dtype=np.int64)
+    })
+
+
+@pytest.mark.parametrize('method', ['lttb', 'minmax'])
+def test_downsample_frequency_per_network(method):
+    downsampled = downsample_frequency(frequency_data(), max_points=10, method=method)
+
+    assert set(downsampled['network']) == {'polygon', 'ethereum'}
+    assert downsampled.groupby('network').size().max() <= 10
+
+
+def test_downsample_frequency_without_rows():
+    empty = frequency_data().iloc[0:0]
+
+    downsampled = downsample_frequency(empty)
+    assert downsampled.empty
+    assert list(downsampled.columns) == ['timestamp', 'network', 'count']
+
+
+def test_downsample_frequency_missing_network():
+    downsampled = downsample_frequency(frequency_data(), network='arbitrum')
+
+    assert downsampled.empty
+    assert list(downsampled.columns) == ['timestamp', 'network', 'count']
@@ -0,0 +1,27 @@
+from decimal import Decimal
+from src.analyses.flash_loan_fee import sum_fees, calculate_metrics
+from src.data.schema import frame_from_columns
+
+GWEI = 10 ** 9
+
+
+def fees(gas_used, gas_price):
+    frame = frame_from_columns({'network': ['polygon'] * len(gas_used), 'gas_used': gas_used, 'gas_price': gas_price})
+    return sum_fees(frame['gas_used'], frame['gas_price'])
+
+
+def test_null_gas_is_skipped():
+    assert fees(['21000', '50000'], [str(GWEI), None]) == Decimal(21000 * GWEI).scaleb(-18)
+
+
+# gas_price acima de uint64 fica como texto; gas_used continua UInt64 e com nulos
+def test_text_and_uint64_columns_with_nulls():
+    total = fees(['21000', None, '30000'], [str(2 ** 64), str(GWEI), str(GWEI)])
+    assert total == (Decimal(21000 * 2 ** 64) + Decimal(30000 * GWEI)).scaleb(-18)
+
+
+def test_calculate_metrics_with_null_gas():
+    frame = frame_from_columns({'network': ['polygon', 'polygon'], 'gas_used': ['21000', '21000'],
+                                'gas_price': [str(GWEI), None]})
+    metrics = calculate_metrics(frame, Decimal('0.5'))
+    assert metrics['total_fee_paid'] == Decimal(21000 * GWEI).scaleb(-18)
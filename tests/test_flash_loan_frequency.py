@@ -0,0 +1,98 @@
+import math
+from datetime import datetime, timezone
+import pandas as pd
+import pytest
+from src.analyses import flash_loan_frequency
+
+# Flash loans nas bordas de dia e de semana em UTC: sábado 23:59:59, domingo 00:00:00, segunda 00:29 e 23:45,
+# além de transações que os dois caminhos devem descartar (outra função, erro)
+DOCUMENTS = [
+    {'timestamp': 1672531199, 'network': 'polygon', 'function_name': 'flashLoan', 'is_error': 0},
+    {'timestamp': 1672531200, 'network': 'polygon', 'function_name': 'flashLoanSimple', 'is_error': 0},
+    {'timestamp': 1672531200, 'network': 'ethereum', 'function_name': 'flashLoanSimple', 'is_error': 0},
+    {'timestamp': 1672619340, 'network': 'ethereum', 'function_name': 'flashLoan', 'is_error': 0},
+    {'timestamp': 1672703100, 'network': 'polygon', 'function_name': 'flashLoanSimple', 'is_error': 0},
+    {'timestamp': 1672703100, 'network': 'polygon', 'function_name': 'flashLoanSimple', 'is_error': 0},
+    {'timestamp': 1672703100, 'network': 'polygon', 'function_name': 'transfer', 'is_error': 0},
+    {'timestamp': 1672531200, 'network': 'ethereum', 'function_name': 'flashLoan', 'is_error': 1},
+]
+
+
+# Avaliador mínimo das expressões usadas pelos pipelines, com a semântica do servidor: datas em UTC,
+# $dayOfWeek de 1 (domingo) a 7 (sábado)
+def evaluate(expression, document):
+    if isinstance(expression, str) and expression.startswith('$'):
+        return document[expression[1:]]
+    if not isinstance(expression, dict):
+        return expression
+    if not any(key.startswith('$') for key in expression):
+        return {key: evaluate(value, document) for key, value in expression.items()}
+
+    (operator, argument), = expression.items()
+    if operator == '$toLong':
+        return int(evaluate(argument, document))
+    if operator == '$multiply':
+        return math.prod(evaluate(value, document) for value in argument)
+    if operator == '$toDate':
+        return datetime.fromtimestamp(evaluate(argument, document) / 1000, tz=timezone.utc).replace(tzinfo=None)
+    if operator == '$dateTrunc':
+        assert argument['unit'] == 'day'
+        return evaluate(argument['date'], document).replace(hour=0, minute=0, second=0, microsecond=0)
+    if operator == '$dayOfWeek':
+        return evaluate(argument, document).isoweekday() % 7 + 1
+    if operator == '$hour':
+        return evaluate(argument, document).hour
+    raise NotImplementedError(operator)
+
+
+def fake_aggregate_transactions(stages, function_name=None, min_value=None):
+    documents = [dict(document) for document in DOCUMENTS
+                 if document['function_name'] in function_name and document['is_error'] == 0]
+    for pipeline_stage in stages:
+        (name, specification), = pipeline_stage.items()
+        if name == '$set':
+            for document in documents:
+                document.update({field: evaluate(value, document) for field, value in specification.items()})
+        elif name == '$group':
+            assert specification['count'] == {'$sum': 1}
+            counts = {}
+            for document in documents:
+                key = evaluate(specification['_id'], document)
+                counts[tuple(key.items())] = counts.get(tuple(key.items()), 0) + 1
+            documents = [{'_id': dict(key), 'count': count} for key, count in counts.items()]
+        else:
+            raise NotImplementedError(name)
+    return documents
+
+
+# Entrada do caminho em pandas: as mesmas transações, já sem erros, como devolvidas pelo load_all_transactions
+def loaded_flash_loans():
+    documents = pd.DataFrame(DOCUMENTS)
+    documents = documents[documents['is_error'] == 0]
+    return documents[flash_loan_frequency.FREQUENCY_COLUMNS].reset_index(drop=True)
+
+
+@pytest.fixture
+def mongo_rows(monkeypatch):
+    monkeypatch.setattr(flash_loan_frequency, 'aggregate_transactions', fake_aggregate_transactions)
+
+
+@pytest.mark.parametrize('separate_by_network', [True, False])
+def test_frequency_mongo_matches_pandas(mongo_rows, separate_by_network):
+    from_mongo = flash_loan_frequency.frequency_from_mongo(separate_by_network)
+    from_pandas = flash_loan_frequency.frequency_from_transactions(loaded_flash_loans(), separate_by_network)
+
+    pd.testing.assert_frame_equal(from_mongo, from_pandas)
+    assert from_mongo['count'].sum() == 6
+
+
+def test_day_hour_mongo_matches_pandas(mongo_rows):
+    from_mongo = flash_loan_frequency.day_hour_from_mongo()
+    from_pandas = flash_loan_frequency.day_hour_from_transactions(loaded_flash_loans())
+
+    pd.testing.assert_frame_equal(from_mongo, from_pandas)
+    counts = from_mongo.set_index(['network', 'day_of_week', 'hour'])['count']
+    assert counts[('polygon', 'Saturday', 23)] == 1
+    assert counts[('polygon', 'Sunday', 0)] == 1
+    assert counts[('polygon', 'Monday', 23)] == 2
+    assert counts[('ethereum', 'Monday', 0)] == 1
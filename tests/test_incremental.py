@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta, timezone
+import mongomock
+import pytest
+from bson import ObjectId
+from src.analyses import incremental
+from src.benchmarks.synthetic import encode_flash_loan_simple
+from src.data.data_loader import build_query
+from src.data.schema import frame_from_columns
+from src.utils.helpers import get_from_cache
+
+USDC = '0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48'
+RECEIVER = '0x' + '1' * 40
+NOW = datetime.now(timezone.utc)
+
+# Resultados publicados pelas duas atualizações incrementais
+PUBLISHED_KEYS = ['flash_loan_frequency', 'flash_loan_frequency_day_hour_polygon',
+                  'flash_loan_frequency_day_hour_ethereum', 'flash_loan_tokens', 'flash_loan_fee_polygon',
+                  'flash_loan_fee_ethereum', 'flash_loan_volume']
+
+
+# _id gerado `age` antes de agora; `sequence` distingue os documentos do mesmo segundo
+def object_id(age, sequence):
+    seconds = int((NOW - age).timestamp())
+    return ObjectId(seconds.to_bytes(4, 'big') + sequence.to_bytes(8, 'big'))
+
+
+def transactions(age, first_sequence, count):
+    documents = []
+    for offset in range(count):
+        sequence = first_sequence + offset
+        network = ['polygon', 'ethereum'][sequence % 2]
+        function_name = ['flashLoanSimple', 'flashLoanSimple', 'transfer'][sequence % 3]
+        documents.append({
+            '_id': object_id(age, sequence),
+            'function_name': function_name,
+            'network': network,
+            'is_error': int(sequence % 7 == 0),
+            'timestamp': 1704067200 + 3700 * sequence,
+            'gas_price': 30 * 10 ** 9,
+            'gas_used': 100000 + sequence,
+            'input': encode_flash_loan_simple(RECEIVER, USDC, (sequence + 1) * 10 ** 6)
+            if function_name == 'flashLoanSimple' else '0xa9059cbb',
+        })
+    return documents
+
+
+@pytest.fixture
+def collection(monkeypatch, fake_redis):
+    db = mongomock.MongoClient().db
+
+    # O pymongoarrow não funciona sobre o mongomock: os flash loans vêm de um find com a mesma consulta
+    def load_all_transactions(function_name=None, min_value=None, columns=None, filters=None):
+        rows = list(db['transactions'].find(build_query(function_name, min_value, filters)))
+        return frame_from_columns({column: [row.get(column) for row in rows] for column in columns})
+
+    monkeypatch.setattr(incremental, 'get_db', lambda: db)
+    monkeypatch.setattr(incremental, 'load_all_transactions', load_all_transactions)
+    return db['transactions']
+
+
+def published():
+    return {key: get_from_cache(key) for key in PUBLISHED_KEYS}
+
+
+def assert_same_results(results, expected):
+    assert results.keys() == expected.keys()
+    for key, value in expected.items():
+        if hasattr(value, 'equals'):
+            assert value.equals(results[key]), key
+        else:
+            assert results[key] == value, key
+
+
+def refresh():
+    incremental.refresh_flash_loan_aggregates()
+    incremental.refresh_flash_loan_volume()
+
+
+def test_consecutive_refreshes_match_full_recompute(collection, fake_redis):
+    # Transações antigas e, dentro da janela de segurança, recentes
+    collection.insert_many(transactions(timedelta(hours=3), 0, 40))
+    collection.insert_many(transactions(timedelta(minutes=1), 100, 10))
+    refresh()
+
+    # Novas antigas e uma inserção atrasada com _id abaixo dos recentes já vistos
+    collection.insert_many(transactions(timedelta(hours=2), 200, 30))
+    collection.insert_many(transactions(timedelta(minutes=3), 300, 5))
+    refresh()
+    incremental_results = published()
+
+    fake_redis.flushall()
+    refresh()
+    full_results = published()
+
+    assert_same_results(incremental_results, full_results)
+    successful_flash_loans = collection.count_documents(build_query(function_name=['flashLoanSimple']))
+    assert full_results['flash_loan_frequency']['count'].sum() == successful_flash_loans
@@ -0,0 +1,132 @@
+from decimal import Decimal
+import bson
+import pytest
+from src.analyses import live_updater
+from src.analyses.flash_loan_fee import metrics_from_totals, network_prices_usd
+from src.benchmarks.synthetic import encode_flash_loan_simple, encode_flash_loan
+
+USDC = '0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48'
+DAI = '0x6b175474e89094c44da98b954eedeac495271d0f'
+RECEIVER = '0x' + '1' * 40
+
+# 2024-01-01 (segunda-feira) 10:15 UTC e 2024-01-02 23:59 UTC
+MONDAY = 1704104100
+TUESDAY = 1704239940
+
+
+def transaction(network, timestamp, function_name='flashLoanSimple', is_error=0, gas_used=200000,
+                gas_price=30 * 10 ** 9, input_data=None):
+    if input_data is None and function_name == 'flashLoanSimple':
+        input_data = encode_flash_loan_simple(RECEIVER, USDC, 5 * 10 ** 6)
+    return {'function_name': function_name, 'network': network, 'is_error': is_error, 'timestamp': timestamp,
+            'gas_price': gas_price, 'gas_used': gas_used, 'input': input_data}
+
+
+def sample_transactions():
+    return [
+        transaction('polygon', MONDAY),
+        transaction('polygon', MONDAY + 60, gas_used=2 ** 40, gas_price=2 ** 40),
+        transaction('polygon', TUESDAY, function_name='flashLoan',
+                    input_data=encode_flash_loan(RECEIVER, [USDC, DAI], [10 ** 6, 10 ** 18])),
+        transaction('ethereum', TUESDAY),
+        transaction('ethereum', TUESDAY, is_error=1),
+        transaction('ethereum', MONDAY, function_name='transfer'),
+    ]
+
+
+def test_apply_batch_and_readers(fake_redis):
+    live_updater.apply_batch(sample_transactions()[:3], {'_data': 'token-1'})
+    live_updater.apply_batch(sample_transactions()[3:], {'_data': 'token-2'})
+
+    assert live_updater.load_resume_token() == {'_data': 'token-2'}
+    assert live_updater.live_version() == '2'
+
+    frequency = live_updater.read_live_frequency()
+    assert frequency.astype({'timestamp': str}).to_dict(orient='records') == [
+        {'timestamp': '2024-01-01', 'network': 'polygon', 'count': 2},
+        {'timestamp': '2024-01-02', 'network': 'ethereum', 'count': 1},
+        {'timestamp': '2024-01-02', 'network': 'polygon', 'count': 1},
+    ]
+
+    day_hour = live_updater.read_live_day_hour('polygon')
+    assert day_hour[['day_of_week', 'hour', 'count']].values.tolist() == [['Monday', 10, 2], ['Tuesday', 23, 1]]
+
+    tokens = live_updater.read_live_tokens()
+    assert tokens[['network', 'token', 'count']].values.tolist() == [
+        ['ethereum', USDC, 1], ['polygon', DAI, 1], ['polygon', USDC, 3]]
+    assert tokens.loc[(tokens['network'] == 'polygon') & (tokens['token'] == USDC), 'volume'].item() == 11.0
+
+    volume = {(row['function_name'], row['network'], row['is_error']): row['count']
+              for row in live_updater.read_live_volume()}
+    assert volume[('flashLoanSimple', 'polygon', 0)] == 2
+    assert volume[('flashLoanSimple', 'ethereum', 1)] == 1
+    assert volume[('transfer', 'ethereum', 0)] == 1
+    assert volume[('transfer', 'polygon', 1)] == 0
+
+    # Soma exata, inclusive de taxas acima de 2**64 wei
+    total_wei = 2 * 200000 * 30 * 10 ** 9 + 2 ** 80
+    assert live_updater.read_live_fee('polygon') == metrics_from_totals(Decimal(total_wei).scaleb(-18), 3,
+                                                                       network_prices_usd['polygon'])
+    assert live_updater.read_live_fee('gnosis') == {}
+
+
+def test_read_live_fee_unknown_network(fake_redis):
+    live_updater.apply_batch([transaction('gnosis', MONDAY)], {'_data': 'token'})
+    with pytest.raises(ValueError, match='gnosis'):
+        live_updater.read_live_fee('gnosis')
+
+
+def test_live_version_requires_seed(fake_redis):
+    live_updater.apply_batch(sample_transactions())
+    assert live_updater.live_version() is None
+
+
+# Coleção mínima com o necessário para a carga inicial: um change stream com resume token e a leitura completa
+class SeedCollection:
+    def __init__(self, documents, resume_token):
+        self.documents = documents
+        self.resume_token = resume_token
+
+    def watch(self, pipeline):
+        collection = self
+
+        class Stream:
+            resume_token = collection.resume_token
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                return False
+
+        return Stream()
+
+    def aggregate(self, pipeline, **kwargs):
+        return iter(self.documents)
+
+
+def test_seed_replaces_previous_aggregates(fake_redis):
+    live_updater.apply_batch([transaction('polygon', MONDAY)] * 5)
+
+    token = {'_data': 'before-seed'}
+    live_updater.seed_live_aggregates(SeedCollection(sample_transactions(), token), batch_size=2)
+
+    assert live_updater.load_resume_token() == token
+    assert bson.decode(fake_redis.get(live_updater.RESUME_TOKEN_KEY)) == token
+    assert live_updater.read_live_frequency()['count'].sum() == 4
+    assert live_updater.live_version() is not None
+
+
+def test_flash_loans_without_gas_are_left_out_of_the_fee(fake_redis):
+    # gas_price acima de 2**53: exato mesmo com um valor ausente no mesmo lote
+    gas_price = 2 ** 60 + 1
+    live_updater.apply_batch([
+        transaction('polygon', MONDAY, gas_used=3, gas_price=gas_price),
+        transaction('polygon', MONDAY, gas_used=None),
+        transaction('polygon', MONDAY, gas_price=None),
+    ], {'_data': 'token'})
+
+    assert live_updater.load_resume_token() == {'_data': 'token'}
+    assert live_updater.read_live_frequency()['count'].sum() == 3
+    assert live_updater.read_live_fee('polygon') == metrics_from_totals(Decimal(3 * gas_price).scaleb(-18), 3,
+                                                                       network_prices_usd['polygon'])
@@ -0,0 +1,26 @@
+from decimal import Decimal
+import pandas as pd
+from src.data.schema import frame_from_columns
+
+LONG_VALUE = '1' + '0' * 60
+
+
+def test_value_within_precision_is_decimal():
+    frame = frame_from_columns({'value': ['0', '5', '9' * 38]})
+
+    assert isinstance(frame['value'].dtype, pd.ArrowDtype)
+    assert list(frame['value']) == [Decimal(0), Decimal(5), Decimal('9' * 38)]
+
+
+def test_value_longer_than_precision_stays_text():
+    frame = frame_from_columns({'value': [LONG_VALUE, '5', None]})
+
+    assert frame['value'].iloc[0] == LONG_VALUE
+    assert frame['value'].iloc[1] == '5'
+    assert sum(Decimal(value) for value in frame['value'].dropna()) == Decimal(LONG_VALUE) + 5
+
+
+def test_gas_above_uint64_stays_text():
+    frame = frame_from_columns({'gas_price': [str(2 ** 64), '1']})
+
+    assert list(frame['gas_price']) == [str(2 ** 64), '1']
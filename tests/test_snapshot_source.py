@@ -0,0 +1,79 @@
+from datetime import datetime
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pytest
+from src import main
+from src.analyses import flash_loan_frequency, flash_loan_volume
+from src.data import data_loader
+from src.data.snapshot import SNAPSHOT_SCHEMA, PARTITIONING, month_of
+
+# Transações de dois dias nas duas redes, com uma transferência e um flash loan com erro
+ROWS = [
+    ('flashLoanSimple', 'polygon', 0, 1704067200),
+    ('flashLoanSimple', 'polygon', 0, 1704070800),
+    ('flashLoan', 'ethereum', 0, 1704067200),
+    ('flashLoanSimple', 'ethereum', 0, 1704153600),
+    ('flashLoanSimple', 'polygon', 1, 1704153600),
+    ('transfer', 'polygon', 0, 1704153600),
+]
+
+
+def fail(*args, **kwargs):
+    raise AssertionError("O MongoDB não deve ser consultado com o snapshot como fonte")
+
+
+@pytest.fixture
+def snapshot(tmp_path, monkeypatch, fake_redis):
+    rows = [{'_id': f'{index:024x}', 'function_name': function_name, 'network': network, 'is_error': is_error,
+             'timestamp': timestamp, 'month': month_of(timestamp)}
+            for index, (function_name, network, is_error, timestamp) in enumerate(ROWS)]
+    ds.write_dataset(pa.Table.from_pylist(rows, schema=SNAPSHOT_SCHEMA), tmp_path / 'snapshot',
+                     format='parquet', partitioning=PARTITIONING)
+    monkeypatch.chdir(tmp_path)
+
+    for module in [data_loader, flash_loan_frequency, flash_loan_volume]:
+        monkeypatch.setattr(module, 'DATA_SOURCE', 'snapshot')
+    monkeypatch.setattr(data_loader, 'get_db', fail)
+    monkeypatch.setattr(flash_loan_frequency, 'aggregate_transactions', fail)
+    monkeypatch.setattr(flash_loan_frequency, 'aggregate_rollups', fail)
+    monkeypatch.setattr(flash_loan_volume, 'get_collection', fail)
+    monkeypatch.setattr(flash_loan_volume, 'aggregate_rollups', fail)
+
+
+def test_frequency_reads_the_snapshot(snapshot):
+    frequency = flash_loan_frequency.analyze_flash_loan_frequency(use_cache=False)
+    counts = frequency.set_index(['timestamp', 'network'])['count']
+    assert counts.sum() == 4
+    assert counts[(datetime(2024, 1, 1).date(), 'polygon')] == 2
+
+    # Período lido com o filtro do scan, em resolução horária
+    hourly = flash_loan_frequency.analyze_flash_loan_frequency(separate_by_network=False, start=datetime(2024, 1, 1),
+                                                               end=datetime(2024, 1, 2), resolution='hour')
+    assert hourly['timestamp'].tolist() == [datetime(2024, 1, 1, 0), datetime(2024, 1, 1, 1)]
+    assert hourly['count'].tolist() == [2, 1]
+
+
+def test_day_hour_reads_the_snapshot(snapshot):
+    polygon, ethereum = flash_loan_frequency.extract_day_hour(use_cache=False)
+    assert polygon['count'].sum() == 2
+    assert ethereum['count'].sum() == 2
+
+    polygon, ethereum = flash_loan_frequency.extract_day_hour(start=datetime(2024, 1, 2))
+    assert polygon.empty
+    assert ethereum['count'].sum() == 1
+
+
+def test_volume_reads_the_snapshot(snapshot):
+    volume = flash_loan_volume.analyze_flash_loan_volume(use_cache=False)
+    counts = volume.set_index(['function_name', 'network', 'is_error'])['count']
+    assert counts.sum() == len(ROWS)
+    assert counts[('flashLoanSimple', 'polygon', 1)] == 1
+    assert counts[('flashLoan', 'polygon', 0)] == 0
+
+    volume = flash_loan_volume.analyze_flash_loan_volume(start=datetime(2024, 1, 2))
+    assert volume['count'].sum() == 3
+
+
+def test_refresh_refuses_the_snapshot(snapshot, monkeypatch):
+    monkeypatch.setattr('src.config.DATA_SOURCE', 'snapshot')
+    assert main.main(['refresh']) is False
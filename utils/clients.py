@@ -0,0 +1,112 @@
+import os
+import threading
+import redis
+import redis.asyncio as aioredis
+from pymongo import MongoClient, AsyncMongoClient
+from src.config import MONGO_URI, DATABASE_NAME, COLLECTION_NAME, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, \
+    MONGO_SERVER_SELECTION_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS, MONGO_READ_PREFERENCE, REDIS_URL, \
+    REDIS_MAX_CONNECTIONS, REDIS_SOCKET_TIMEOUT
+
+# Clientes do MongoDB e pools do Redis compartilhados pelo processo. São criados no primeiro uso e reaproveitados
+# por todas as análises e callbacks, em vez de uma conexão nova (com handshake e autenticação) a cada chamada.
+# Um processo filho criado por fork descarta os clientes herdados e cria os seus: as conexões do pai não podem
+# ser usadas no filho (workers do servidor, jobs do dashboard, pools de processos).
+
+lock = threading.Lock()
+clients = {}
+
+
+def mongo_options():
+    return {
+        'maxPoolSize': MONGO_MAX_POOL_SIZE,
+        'minPoolSize': MONGO_MIN_POOL_SIZE,
+        'serverSelectionTimeoutMS': MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        'socketTimeoutMS': MONGO_SOCKET_TIMEOUT_MS,
+        'readPreference': MONGO_READ_PREFERENCE,
+    }
+
+
+def shared(name, create):
+    client = clients.get(name)
+    if client is None:
+        with lock:
+            client = clients.get(name)
+            if client is None:
+                client = clients[name] = create()
+    return client
+
+
+def get_mongo_client():
+    # connect=False: a conexão só é aberta na primeira operação, já no processo que vai usá-la
+    return shared('mongo', lambda: MongoClient(MONGO_URI, connect=False, **mongo_options()))
+
+
+def get_db():
+    return get_mongo_client()[DATABASE_NAME]
+
+
+def get_collection(name=COLLECTION_NAME):
+    return get_db()[name]
+
+
+# `db` escolhe outro banco do servidor do REDIS_URL (como o do benchmark), com um pool próprio
+def get_redis_pool(db=None):
+    return shared('redis_pool' if db is None else f'redis_pool:{db}', lambda: create_redis_pool(db))
+
+
+def create_redis_pool(db=None):
+    pool = redis.ConnectionPool.from_url(REDIS_URL, max_connections=REDIS_MAX_CONNECTIONS,
+                                         socket_timeout=REDIS_SOCKET_TIMEOUT,
+                                         socket_connect_timeout=REDIS_SOCKET_TIMEOUT)
+    # O banco da URL tem precedência sobre os argumentos do from_url: a troca é feita nas opções das conexões
+    if db is not None:
+        pool.connection_kwargs['db'] = db
+    return pool
+
+
+def get_redis(db=None):
+    return redis.Redis(connection_pool=get_redis_pool(db))
+
+
+# Clientes assíncronos do dashboard (data/async_access.py): ficam presos ao event loop em que foram usados pela
+# primeira vez, então cada processo do servidor ASGI tem os seus. Servidores que criam um loop por pedido (como o
+# backend flask do Dash) não podem usá-los.
+def get_async_mongo_client():
+    return shared('async_mongo', lambda: AsyncMongoClient(MONGO_URI, connect=False, **mongo_options()))
+
+
+def get_async_redis():
+    return shared('async_redis', lambda: aioredis.Redis(connection_pool=aioredis.ConnectionPool.from_url(
+        REDIS_URL, max_connections=REDIS_MAX_CONNECTIONS, socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=REDIS_SOCKET_TIMEOUT)))
+
+
+def close_clients():
+    with lock:
+        mongo_client = clients.pop('mongo', None)
+        redis_pools = [clients.pop(name) for name in list(clients) if name.startswith('redis_pool')]
+    if mongo_client is not None:
+        mongo_client.close()
+    for redis_pool in redis_pools:
+        redis_pool.disconnect()
+
+
+async def close_async_clients():
+    with lock:
+        mongo_client = clients.pop('async_mongo', None)
+        redis_client = clients.pop('async_redis', None)
+    if mongo_client is not None:
+        await mongo_client.close()
+    if redis_client is not None:
+        await redis_client.aclose()
+
+
+# No filho, os clientes herdados são apenas esquecidos: fechá-los encerraria os sockets ainda usados pelo pai
+def reset_after_fork():
+    global lock
+    lock = threading.Lock()
+    clients.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_after_fork)
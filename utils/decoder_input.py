@@ -1,19 +1,45 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from eth_abi import decode_abi
 from hexbytes import HexBytes
+import numpy as np
+import pandas as pd
 
+METHOD_MAP = {
+    "0x5cffe9de": "flashLoanSimple",
+    "0xab9c4b5d": "flashLoan"
+}
 
-def decode_flash_loan_transaction(input_data):
-    method_map = {
-        "0x5cffe9de": "flashLoanSimple",
-        "0xab9c4b5d": "flashLoan"
-    }
+# Tamanho mínimo (em caracteres hexadecimais, com o method ID) das cabeças estáticas de cada método
+MIN_INPUT_LENGTH = {
+    "flashLoanSimple": 10 + 64 * 5,
+    "flashLoan": 10 + 64 * 7
+}
+
+# Lotes decodificados por processo quando um pool é usado
+BATCH_CHUNK_SIZE = 100000
+
+# Valor de cada caractere hexadecimal (ASCII); 255 marca caracteres inválidos
+HEX_VALUES = np.full(256, 255, dtype=np.uint8)
+HEX_VALUES[np.frombuffer(b'0123456789', dtype=np.uint8)] = np.arange(10)
+HEX_VALUES[np.frombuffer(b'abcdef', dtype=np.uint8)] = np.arange(10, 16)
+
+# Offsets e tamanhos de arrays são lidos dos 10 últimos dígitos da palavra (40 bits)
+OFFSET_DIGITS = 10
+OFFSET_WEIGHTS = np.uint64(16) ** np.arange(OFFSET_DIGITS - 1, -1, -1, dtype=np.uint64)
+
+# Amounts são lidos em duas metades uint64 dos 32 dígitos finais da palavra (128 bits)
+HALF_DIGITS = 16
+HALF_WEIGHTS = np.uint64(16) ** np.arange(HALF_DIGITS - 1, -1, -1, dtype=np.uint64)
 
+
+def decode_flash_loan_transaction(input_data):
     # Verificar o Method ID
     method_id = input_data[:10]
-    if method_id not in method_map:
+    if method_id not in METHOD_MAP:
         raise ValueError(f"Method ID não suportado: {method_id}")
 
-    method = method_map[method_id]
+    method = METHOD_MAP[method_id]
     input_data = input_data[10:]
     input_bytes = HexBytes(input_data)
 
@@ -58,3 +84,156 @@ def decode_flash_loan_transaction(input_data):
             "asset": asset,
             "amount": amount
         }
+
+
+# Lê `width` caracteres a partir de cada posição do buffer, como array de strings
+def read_chars(buffer, positions, width):
+    chars = np.ascontiguousarray(buffer[positions[:, None] + np.arange(width)])
+    return chars.view(f'S{width}').ravel().astype(f'U{width}')
+
+
+# Dígitos das palavras de 32 bytes (64 caracteres) a partir de cada posição, 255 nos caracteres inválidos.
+# As linhas são copiadas de uma janela deslizante sobre o buffer, sem montar um índice por caractere.
+def read_digits(buffer, positions):
+    return HEX_VALUES[np.lib.stride_tricks.sliding_window_view(buffer, 64)[positions]]
+
+
+# Lê palavras de 32 bytes usadas como offset/tamanho; -1 quando o valor não cabe em 40 bits
+# ou a palavra não é hexadecimal
+def read_offsets(buffer, positions):
+    digits = read_digits(buffer, positions)
+    valid = (digits != 255).all(axis=1) & (digits[:, :64 - OFFSET_DIGITS] == 0).all(axis=1)
+    values = (digits[:, 64 - OFFSET_DIGITS:].astype(np.uint64) * OFFSET_WEIGHTS).sum(axis=1)
+    return np.where(valid, values.astype(np.int64), -1)
+
+
+# Lê palavras de 32 bytes como inteiros Python (array de objetos). Valores de até 64 bits saem direto da metade
+# baixa e os de até 128 bits combinam as duas metades; apenas palavras acima de 128 bits ou não hexadecimais
+# passam pelo int(), linha a linha
+def read_amounts(buffer, positions):
+    digits = read_digits(buffer, positions)
+    high = digits[:, 64 - 2 * HALF_DIGITS:64 - HALF_DIGITS].astype(np.uint64) @ HALF_WEIGHTS
+    low = digits[:, 64 - HALF_DIGITS:].astype(np.uint64) @ HALF_WEIGHTS
+
+    amounts = low.astype(object)
+    wide = high != 0
+    amounts[wide] = (high[wide].astype(object) << 64) | amounts[wide]
+
+    overflow = (digits == 255).any(axis=1) | (digits[:, :64 - 2 * HALF_DIGITS] != 0).any(axis=1)
+    if overflow.any():
+        amounts[overflow] = [int(word, 16) for word in read_chars(buffer, positions[overflow], 64)]
+    return amounts
+
+
+# Decodifica uma coluna de inputs. Retorna as chamadas, uma linha por (transação, asset, amount)
+# com `tx` sendo a posição da transação na entrada, e o method/receiver de cada transação.
+def decode_flash_loan_columns(inputs, errors='raise'):
+    inputs = pd.Series(inputs, dtype=object).fillna('').astype(str).str.lower()
+    n = len(inputs)
+
+    method = inputs.str.slice(0, 10).map(METHOD_MAP).to_numpy(dtype=object)
+    lengths = inputs.str.len().to_numpy(dtype=np.int64)
+    starts = np.zeros(n, dtype=np.int64)
+    starts[1:] = np.cumsum(lengths)[:-1]
+    ends = starts + lengths
+    heads = starts + 10
+
+    # Todos os inputs concatenados em um único buffer, com folga para leituras de linhas inválidas
+    buffer = np.frombuffer((''.join(inputs) + '0' * 128).encode('ascii', errors='replace'), dtype=np.uint8)
+
+    is_simple = method == 'flashLoanSimple'
+    is_multi = method == 'flashLoan'
+    min_lengths = np.where(is_multi, MIN_INPUT_LENGTH['flashLoan'], MIN_INPUT_LENGTH['flashLoanSimple'])
+    valid = (is_simple | is_multi) & (lengths >= min_lengths)
+
+    # flashLoanSimple: cabeça estática, asset e amount em posições fixas
+    counts = valid.astype(np.int64)
+    asset_bases = heads + 64
+    amount_bases = heads + 128
+
+    # flashLoan: segue os offsets dos arrays dinâmicos `assets` e `amounts`
+    multi = np.flatnonzero(valid & is_multi)
+    if len(multi):
+        ok = np.ones(len(multi), dtype=bool)
+        length_positions = []
+        for word in (1, 2):
+            # Offsets em bytes a partir do início dos parâmetros (2 caracteres por byte)
+            offsets = read_offsets(buffer, heads[multi] + 64 * word)
+            positions = heads[multi] + 2 * offsets
+            ok &= (offsets >= 0) & (positions + 64 <= ends[multi])
+            length_positions.append(positions)
+
+        assets_positions, amounts_positions = (np.where(ok, positions, 0) for positions in length_positions)
+        n_assets = read_offsets(buffer, assets_positions)
+        n_amounts = read_offsets(buffer, amounts_positions)
+        ok &= (n_assets >= 0) & (n_assets == n_amounts)
+        ok &= (assets_positions + 64 * (1 + n_assets) <= ends[multi])
+        ok &= (amounts_positions + 64 * (1 + n_amounts) <= ends[multi])
+
+        valid[multi] = ok
+        counts[multi] = np.where(ok, n_assets, 0)
+        asset_bases[multi] = assets_positions + 64
+        amount_bases[multi] = amounts_positions + 64
+
+    if errors == 'raise' and not valid.all():
+        invalid = np.flatnonzero(~valid)[0]
+        if method[invalid] is None or pd.isna(method[invalid]):
+            raise ValueError(f"Method ID não suportado: {inputs.iloc[invalid][:10]}")
+        raise ValueError(f"Input insuficiente para {method[invalid]}")
+
+    # Uma posição por elemento dos arrays: elemento j da transação i fica em base_i + 64 * j
+    tx = np.repeat(np.arange(n), counts)
+    element = np.arange(len(tx)) - np.repeat(np.cumsum(counts) - counts, counts)
+    asset_positions = asset_bases[tx] + 64 * element
+    amount_positions = amount_bases[tx] + 64 * element
+
+    # Endereços ocupam os 20 bytes finais da palavra
+    receivers = np.char.add('0x', read_chars(buffer, np.where(valid, heads, 0) + 24, 40))
+    assets = np.char.add('0x', read_chars(buffer, asset_positions + 24, 40))
+    amounts = read_amounts(buffer, amount_positions)
+
+    calls = pd.DataFrame({
+        'tx': tx,
+        'method': method[tx],
+        'receiver_address': receivers[tx].astype(object),
+        'asset': assets.astype(object),
+        'amount': amounts
+    }, index=inputs.index[tx])
+    transactions = pd.DataFrame({
+        'method': np.where(valid, method, None),
+        'receiver_address': np.where(valid, receivers.astype(object), None)
+    }, index=inputs.index)
+    return calls, transactions
+
+
+def decode_flash_loan_chunk(inputs, errors='raise', explode=False):
+    calls, transactions = decode_flash_loan_columns(inputs, errors)
+    if explode:
+        return calls.drop(columns='tx')
+
+    # Sem transações não há o que agrupar (o np.split de um array vazio devolveria um pedaço)
+    if transactions.empty:
+        return transactions.assign(assets=pd.Series(dtype=object), amounts=pd.Series(dtype=object))
+
+    # Agrupa os elementos de volta em listas, uma linha por transação (vazias para inputs inválidos)
+    counts = np.bincount(calls['tx'].to_numpy(), minlength=len(transactions))
+    boundaries = np.cumsum(counts)[:-1]
+    transactions['assets'] = [list(chunk) for chunk in np.split(calls['asset'].to_numpy(), boundaries)]
+    transactions['amounts'] = [list(chunk) for chunk in np.split(calls['amount'].to_numpy(), boundaries)]
+    return transactions
+
+
+# Decodificação em lote de uma coluna de inputs de flashLoan/flashLoanSimple. Retorna uma linha por
+# transação (listas de assets e amounts) ou, com explode=True, uma linha por (transação, asset, amount).
+# Com errors='coerce', inputs inválidos resultam em method None e listas vazias.
+def decode_flash_loan_batch(inputs, errors='raise', explode=False, processes=None, chunk_size=BATCH_CHUNK_SIZE):
+    if not isinstance(inputs, pd.Series):
+        inputs = pd.Series(inputs, dtype=object)
+
+    if processes and len(inputs) > chunk_size:
+        chunks = [inputs.iloc[start:start + chunk_size] for start in range(0, len(inputs), chunk_size)]
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            decoded = list(executor.map(partial(decode_flash_loan_chunk, errors=errors, explode=explode), chunks))
+        return pd.concat(decoded)
+
+    return decode_flash_loan_chunk(inputs, errors, explode)
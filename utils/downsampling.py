@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+# Número máximo de pontos enviados ao navegador por série
+MAX_POINTS = 2000
+
+DOWNSAMPLING_METHODS = ('lttb', 'minmax')
+
+
+# Largest-Triangle-Three-Buckets: mantém o primeiro e o último ponto e, em cada bucket intermediário,
+# o ponto que forma o maior triângulo com o ponto escolhido no bucket anterior e a média do bucket seguinte.
+# Retorna os índices dos pontos mantidos.
+def lttb_indices(x, y, n_out):
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Limites dos n_out - 2 buckets intermediários (o primeiro e o último ponto ficam de fora)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    selected = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_start, next_end = edges[bucket + 1], edges[bucket + 2]
+            next_x, next_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+
+        areas = np.abs((x[selected] - next_x) * (y[start:end] - y[selected]) -
+                       (x[selected] - x[start:end]) * (next_y - y[selected]))
+        selected = start + int(np.argmax(areas))
+        indices[bucket + 1] = selected
+
+    return indices
+
+
+# Buckets de mesma largura em x; em cada um são mantidos o mínimo e o máximo de y (picos preservados).
+# Retorna os índices dos pontos mantidos, em ordem de x.
+def minmax_indices(x, y, n_out):
+    n = len(x)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n_buckets = n_out // 2
+    span = x[-1] - x[0]
+    if span <= 0:
+        return np.array([int(np.argmin(y)), int(np.argmax(y))])
+    buckets = np.minimum(((x - x[0]) / span * n_buckets).astype(np.int64), n_buckets - 1)
+
+    # Ordena por (bucket, y): o primeiro e o último de cada bucket são o mínimo e o máximo
+    order = np.lexsort((y, buckets))
+    sorted_buckets = buckets[order]
+    first = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+    last = np.r_[first[1:] - 1, n - 1]
+    return np.unique(np.concatenate([order[first], order[last]]))
+
+
+# Recorta uma série temporal (DataFrame com `x_column` e `y_column`) ao intervalo visível e a reduz a no máximo
+# `max_points` pontos. Um ponto além de cada borda é mantido para que a linha atravesse o intervalo inteiro.
+def downsample_series(data, x_column='timestamp', y_column='count', x_range=None, max_points=MAX_POINTS,
+                      method='lttb'):
+    if method not in DOWNSAMPLING_METHODS:
+        raise ValueError(f"Método de downsampling não suportado: {method}")
+
+    data = data.assign(**{x_column: pd.to_datetime(data[x_column])}).sort_values(x_column)
+    x = data[x_column].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+
+    if x_range is not None:
+        start, end = (pd.Timestamp(bound).to_datetime64().astype('datetime64[ns]').astype(np.int64)
+                      for bound in x_range)
+        first = max(np.searchsorted(x, start, side='left') - 1, 0)
+        last = min(np.searchsorted(x, end, side='right') + 1, len(x))
+        data, x = data.iloc[first:last], x[first:last]
+
+    select = lttb_indices if method == 'lttb' else minmax_indices
+    indices = select(x, data[y_column].to_numpy(dtype=np.float64), max_points)
+    return data.iloc[indices].reset_index(drop=True)
+
+
+# Séries de frequência de flash loans reduzidas ao intervalo visível, uma por rede (ou a série única, quando os
+# dados não são separados por rede)
+def downsample_frequency(frequency_data, network=None, x_range=None, max_points=MAX_POINTS, method='lttb'):
+    if 'network' not in frequency_data.columns:
+        return downsample_series(frequency_data, x_range=x_range, max_points=max_points, method=method)
+
+    networks = [network] if network is not None else frequency_data['network'].unique()
+    series = [downsample_series(frequency_data[frequency_data['network'] == name], x_range=x_range,
+                                max_points=max_points, method=method)
+              for name in networks if (frequency_data['network'] == name).any()]
+
+    # Sem linhas (ou sem a rede pedida): nada a concatenar, o resultado é vazio com as mesmas colunas
+    if not series:
+        return frequency_data.iloc[0:0]
+    return pd.concat(series, ignore_index=True)
@@ -1,12 +1,37 @@
+import hashlib
 import json
 import os
+import struct
+import zlib
+from decimal import Decimal
 from bson import ObjectId
-import redis
+import pandas as pd
+import pyarrow as pa
 import pickle
 import logging
+from src.utils.clients import get_redis
+from src.utils.tracing import stage, count
 
-# Configuração do Redis
-redis_client = redis.StrictRedis(host='localhost', port=6379, db=0)
+# Cliente Redis sobre o pool de conexões compartilhado do processo (TCC_REDIS_URL)
+redis_client = get_redis()
+
+# Cabeçalho dos valores do cache: assinatura, versão do esquema, codec e compressão
+CACHE_MAGIC = b'TCC'
+CACHE_SCHEMA_VERSION = 1
+CACHE_HEADER = struct.Struct('>3sBBB')
+
+CODEC_PICKLE = 0
+CODEC_ARROW = 1
+CODEC_JSON = 2
+CODEC_TEXT = 3
+CODEC_BYTES = 4
+
+# Prefixo das chaves com a versão (hash do conteúdo) de cada valor do cache
+CACHE_VERSION_PREFIX = 'cache_version:'
+
+# Compressão dos DataFrames no formato Arrow IPC e limite a partir do qual JSON/texto é comprimido
+ARROW_COMPRESSION = 'lz4'
+COMPRESSION_THRESHOLD = 1024
 
 
 def format_currency(value):
@@ -34,14 +59,125 @@ def save_to_text(data, filename):
     print(f"Dados salvos em {path}")
 
 
-def get_from_cache(cache_key):
-    cached_data = redis_client.get(cache_key)
-    if cached_data:
-        logging.info("Dados carregados do cache Redis.")
+# JSON do cache: preserva Decimals (valores exatos das taxas) além dos ObjectIds
+class CacheJSONEncoder(CustomJSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return {'__decimal__': str(obj)}
+        return super().default(obj)
+
+
+def cache_json_hook(obj):
+    if len(obj) == 1 and '__decimal__' in obj:
+        return Decimal(obj['__decimal__'])
+    return obj
+
+
+def encode_dataframe(data):
+    table = pa.Table.from_pandas(data)
+    sink = pa.BufferOutputStream()
+    options = pa.ipc.IpcWriteOptions(compression=ARROW_COMPRESSION)
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def decode_dataframe(payload):
+    # Leitura direta do buffer recebido do Redis, sem cópias intermediárias dos dados
+    with pa.ipc.open_stream(pa.py_buffer(payload)) as reader:
+        return reader.read_all().to_pandas()
+
+
+def encode_cache_value(data):
+    codec = CODEC_PICKLE
+    payload = None
+
+    if isinstance(data, pd.DataFrame):
+        try:
+            payload = encode_dataframe(data)
+            codec = CODEC_ARROW
+        except (pa.ArrowException, TypeError, ValueError) as e:
+            logging.warning(f"DataFrame não suportado pelo Arrow, usando pickle: {e}")
+    elif isinstance(data, str):
+        payload = data.encode('utf-8')
+        codec = CODEC_TEXT
+    elif isinstance(data, bytes):
+        payload = data
+        codec = CODEC_BYTES
+    else:
+        try:
+            payload = json.dumps(data, cls=CacheJSONEncoder, separators=(',', ':')).encode('utf-8')
+            codec = CODEC_JSON
+        except (TypeError, ValueError):
+            logging.warning(f"Tipo {type(data).__name__} não suportado pelo JSON, usando pickle.")
+
+    if payload is None:
+        payload = pickle.dumps(data)
+        codec = CODEC_PICKLE
+
+    # O Arrow IPC já é comprimido por buffer; os demais formatos são comprimidos com zlib se forem grandes
+    compressed = codec != CODEC_ARROW and len(payload) >= COMPRESSION_THRESHOLD
+    if compressed:
+        payload = zlib.compress(payload, 1)
+
+    return CACHE_HEADER.pack(CACHE_MAGIC, CACHE_SCHEMA_VERSION, codec, int(compressed)) + payload
+
+
+def decode_cache_value(cached_data):
+    # Valores gravados antes do cabeçalho tipado eram sempre pickle
+    if cached_data[:len(CACHE_MAGIC)] != CACHE_MAGIC or len(cached_data) < CACHE_HEADER.size:
         return pickle.loads(cached_data)
-    return None
+
+    magic, version, codec, compressed = CACHE_HEADER.unpack_from(cached_data)
+    if version != CACHE_SCHEMA_VERSION:
+        raise ValueError(f"Versão de esquema do cache não suportada: {version}")
+
+    payload = memoryview(cached_data)[CACHE_HEADER.size:]
+    if compressed:
+        payload = zlib.decompress(payload)
+
+    if codec == CODEC_ARROW:
+        return decode_dataframe(payload)
+    if codec == CODEC_JSON:
+        return json.loads(bytes(payload), object_hook=cache_json_hook)
+    if codec == CODEC_TEXT:
+        return str(payload, 'utf-8')
+    if codec == CODEC_BYTES:
+        return bytes(payload)
+    if codec == CODEC_PICKLE:
+        return pickle.loads(payload)
+    raise ValueError(f"Codec de cache desconhecido: {codec}")
+
+
+def get_from_cache(cache_key):
+    with stage('cache_read'):
+        cached_data = redis_client.get(cache_key)
+        if cached_data:
+            count('cache_hits')
+            logging.info("Dados carregados do cache Redis.")
+            return decode_cache_value(cached_data)
+        count('cache_misses')
+        return None
+
+
+# Versão de um valor do cache: hash do conteúdo serializado
+def cache_version(payload):
+    return hashlib.blake2b(payload, digest_size=8).hexdigest()
 
 
 def save_to_cache(cache_key, data):
-    redis_client.set(cache_key, pickle.dumps(data))
+    with stage('cache_write'):
+        payload = encode_cache_value(data)
+
+        # O valor e sua versão são gravados juntos, para que o dashboard detecte dados inalterados
+        pipeline = redis_client.pipeline()
+        pipeline.set(cache_key, payload)
+        pipeline.set(f'{CACHE_VERSION_PREFIX}{cache_key}', cache_version(payload))
+        pipeline.execute()
+        count('bytes_written', len(payload))
     logging.info("Dados salvos no cache Redis.")
+
+
+def get_cache_versions(cache_keys):
+    versions = redis_client.mget([f'{CACHE_VERSION_PREFIX}{cache_key}' for cache_key in cache_keys])
+    return [version.decode() if version else None for version in versions]
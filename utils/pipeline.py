@@ -0,0 +1,106 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Número máximo de análises executadas ao mesmo tempo
+MAX_WORKERS = int(os.getenv('TCC_PIPELINE_WORKERS', '4'))
+
+
+# Uma etapa do pipeline: `run` é chamada sem argumentos depois que todas as etapas de `requires` terminaram
+# com sucesso. `outputs` lista as chaves do cache que a etapa grava, apenas para o resumo.
+class Node:
+    def __init__(self, name, run, requires=(), outputs=()):
+        self.name = name
+        self.run = run
+        self.requires = list(requires)
+        self.outputs = list(outputs)
+
+
+# Confere nomes repetidos, dependências inexistentes e ciclos antes de executar qualquer etapa
+def validate_nodes(nodes):
+    names = [node.name for node in nodes]
+    duplicated = {name for name in names if names.count(name) > 1}
+    if duplicated:
+        raise ValueError(f"Etapas repetidas no pipeline: {sorted(duplicated)}")
+
+    by_name = {node.name: node for node in nodes}
+    for node in nodes:
+        missing = [name for name in node.requires if name not in by_name]
+        if missing:
+            raise ValueError(f"A etapa {node.name} depende de etapas inexistentes: {missing}")
+
+    visited, visiting = set(), set()
+
+    def visit(name):
+        if name in visiting:
+            raise ValueError(f"Ciclo de dependências no pipeline envolvendo a etapa {name}")
+        if name in visited:
+            return
+        visiting.add(name)
+        for required in by_name[name].requires:
+            visit(required)
+        visiting.remove(name)
+        visited.add(name)
+
+    for name in names:
+        visit(name)
+
+
+def run_node(node):
+    start = time.perf_counter()
+    logging.info(f"Etapa {node.name} iniciada.")
+    node.run()
+    return time.perf_counter() - start
+
+
+# Executa as etapas em um pool de threads: cada uma começa assim que suas dependências terminam. As análises
+# passam a maior parte do tempo esperando o MongoDB e o Redis, que liberam o GIL. Uma falha não interrompe as
+# demais; apenas as etapas que dependem dela são puladas. Devolve o resumo por etapa, na ordem de `nodes`.
+def run_pipeline(nodes, max_workers=MAX_WORKERS):
+    validate_nodes(nodes)
+    pending = {node.name: node for node in nodes}
+    summary = {node.name: {'status': 'pending', 'seconds': None, 'error': None, 'outputs': node.outputs}
+               for node in nodes}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis') as executor:
+        while pending or running:
+            for name, node in list(pending.items()):
+                statuses = [summary[required]['status'] for required in node.requires]
+                if any(status in ('failed', 'skipped') for status in statuses):
+                    summary[name]['status'] = 'skipped'
+                    summary[name]['error'] = "Dependência não concluída"
+                    logging.warning(f"Etapa {name} pulada: uma dependência não foi concluída.")
+                    del pending[name]
+                elif all(status == 'done' for status in statuses):
+                    summary[name]['status'] = 'running'
+                    running[executor.submit(run_node, node)] = name
+                    del pending[name]
+
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    summary[name]['seconds'] = future.result()
+                    summary[name]['status'] = 'done'
+                    logging.info(f"Etapa {name} concluída em {summary[name]['seconds']:.2f} s.")
+                except Exception as e:
+                    summary[name]['status'] = 'failed'
+                    summary[name]['error'] = repr(e)
+                    logging.exception(f"Erro na etapa {name}: {e}")
+
+    return summary
+
+
+def log_summary(summary, total_seconds=None):
+    logging.info("Resumo do pipeline:")
+    for name, result in summary.items():
+        seconds = f"{result['seconds']:.2f} s" if result['seconds'] is not None else '-'
+        error = f"  {result['error']}" if result['error'] else ''
+        logging.info(f"  {name:<24} {result['status']:<8} {seconds:>10}{error}")
+    if total_seconds is not None:
+        logging.info(f"Tempo total: {total_seconds:.2f} s")
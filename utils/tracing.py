@@ -0,0 +1,197 @@
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import bson
+from pymongo import monitoring
+
+# Instrumentação por etapa das análises. Desligada por padrão; TCC_TRACING=1 ativa a coleta.
+TRACING_ENABLED = os.getenv('TCC_TRACING', '0') == '1'
+TRACE_DIR = os.getenv('TCC_TRACE_DIR', 'traces')
+
+# Etapas usadas pelas análises (outras podem aparecer, como cache_read)
+STAGES = ['query', 'frame_build', 'transform', 'aggregate', 'cache_write']
+
+# Métricas acumuladas por (análise, etapa), com a descrição exportada para o Prometheus
+METRICS = {
+    'calls': 'Execuções da etapa',
+    'wall_seconds': 'Tempo de relógio na etapa',
+    'cpu_seconds': 'Tempo de CPU do processo na etapa',
+    'peak_rss_delta_bytes': 'Aumento do pico de memória residente durante a etapa',
+    'documents_fetched': 'Documentos ou linhas lidos na etapa',
+    'bytes_received': 'Bytes recebidos do MongoDB na etapa',
+    'cache_hits': 'Leituras do cache Redis encontradas',
+    'cache_misses': 'Leituras do cache Redis sem valor',
+    'bytes_written': 'Bytes gravados no Redis'
+}
+
+# ru_maxrss é informado em KiB no Linux e em bytes no macOS
+RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+# Chave do Redis com os totais publicados pelos processos do dashboard
+PUBLISHED_TOTALS_KEY = 'tracing_totals'
+
+current_analysis = contextvars.ContextVar('current_analysis', default='unknown')
+current_stage = contextvars.ContextVar('current_stage', default='other')
+
+# Totais do processo: (análise, etapa) -> métrica -> valor
+run_totals = defaultdict(lambda: defaultdict(float))
+totals_lock = threading.Lock()
+run_started_at = datetime.now(timezone.utc)
+
+
+def peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT
+
+
+# Soma um contador à etapa em andamento (ou à etapa 'other' da análise atual)
+def count(metric, value=1):
+    if TRACING_ENABLED:
+        with totals_lock:
+            run_totals[(current_analysis.get(), current_stage.get())][metric] += value
+
+
+@contextmanager
+def trace_analysis(name):
+    token = current_analysis.set(name)
+    try:
+        yield
+    finally:
+        current_analysis.reset(token)
+
+
+# Decorador das funções de análise: as etapas executadas dentro delas são atribuídas a `name`
+def traced(name):
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with trace_analysis(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with trace_analysis(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def stage(name):
+    if not TRACING_ENABLED:
+        yield
+        return
+
+    token = current_stage.set(name)
+    wall_start, cpu_start, rss_start = time.perf_counter(), time.process_time(), peak_rss()
+    try:
+        yield
+    finally:
+        # Tempo de CPU e memória são do processo: com análises em paralelo, incluem as outras threads
+        with totals_lock:
+            totals = run_totals[(current_analysis.get(), name)]
+            totals['calls'] += 1
+            totals['wall_seconds'] += time.perf_counter() - wall_start
+            totals['cpu_seconds'] += time.process_time() - cpu_start
+            totals['peak_rss_delta_bytes'] += peak_rss() - rss_start
+        current_stage.reset(token)
+
+
+# Bytes das respostas de consultas do MongoDB, atribuídos à etapa em andamento na mesma thread
+class MongoBytesListener(monitoring.CommandListener):
+    COMMANDS = {'find', 'getMore', 'aggregate'}
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        if event.command_name in self.COMMANDS:
+            raw = getattr(event.reply, 'raw', None)
+            count('bytes_received', len(raw) if raw is not None else len(bson.encode(event.reply)))
+
+    def failed(self, event):
+        pass
+
+
+if TRACING_ENABLED:
+    monitoring.register(MongoBytesListener())
+
+
+def run_summary(totals=None):
+    totals = run_totals if totals is None else totals
+    analyses = defaultdict(dict)
+    for (analysis, stage_name), metrics in sorted(totals.items()):
+        analyses[analysis][stage_name] = dict(metrics)
+    return {
+        'started_at': run_started_at.isoformat(),
+        'finished_at': datetime.now(timezone.utc).isoformat(),
+        'analyses': dict(analyses)
+    }
+
+
+def write_run_summary(path=None):
+    if path is None:
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        path = os.path.join(TRACE_DIR, f"run-{run_started_at.strftime('%Y%m%dT%H%M%S')}.json")
+    with open(path, 'w') as file:
+        json.dump(run_summary(), file, indent=2)
+    logging.info(f"Resumo da instrumentação salvo em {path}")
+    return path
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Totais no formato de texto do Prometheus, uma série por (análise, etapa) para cada métrica
+def prometheus_text(totals=None):
+    totals = run_totals if totals is None else totals
+    lines = []
+    for metric, description in METRICS.items():
+        name = f'tcc_stage_{metric}_total'
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} counter')
+        for (analysis, stage_name), metrics in sorted(totals.items()):
+            if metric in metrics:
+                lines.append(f'{name}{{analysis="{escape_label(analysis)}",stage="{escape_label(stage_name)}"}} '
+                             f'{metrics[metric]:.17g}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(path):
+    with open(path, 'w') as file:
+        file.write(prometheus_text())
+
+
+# Processos de vida curta (jobs do dashboard) somam seus totais aos publicados no Redis e zeram os locais
+def publish_totals(redis_client):
+    if not TRACING_ENABLED or not run_totals:
+        return
+    with totals_lock:
+        totals = {key: dict(metrics) for key, metrics in run_totals.items()}
+        run_totals.clear()
+
+    pipeline = redis_client.pipeline()
+    for (analysis, stage_name), metrics in totals.items():
+        for metric, value in metrics.items():
+            pipeline.hincrbyfloat(PUBLISHED_TOTALS_KEY, f'{analysis}|{stage_name}|{metric}', value)
+    pipeline.execute()
+
+
+def load_published_totals(redis_client):
+    totals = defaultdict(lambda: defaultdict(float))
+    for field, value in redis_client.hgetall(PUBLISHED_TOTALS_KEY).items():
+        analysis, stage_name, metric = field.decode().rsplit('|', 2)
+        totals[(analysis, stage_name)][metric] = float(value)
+    return totals
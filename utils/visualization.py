@@ -194,42 +194,27 @@ def plot_flash_loan_volume_all(volume_data, separate_by_network=True):
     return fig
 
 
-def plot_wallet_interactions(transactions_data, network):
-    # Convert the transactions data to a DataFrame if it's not already
-    if not isinstance(transactions_data, pd.DataFrame):
-        transactions_data = pd.DataFrame(transactions_data)
-
-    # Ensure 'function_name' is a categorical type with 'flashLoan' and 'flashLoanSimple' first
-    transactions_data['function_name'] = pd.Categorical(
-        transactions_data['function_name'],
-        categories=['flashLoan', 'flashLoanSimple'] + [x for x in transactions_data['function_name'].unique() if
-                                                       x not in ['flashLoan', 'flashLoanSimple']],
-        ordered=True
-    )
-
-    # Remove rows with null values in 'wallet' or 'function_name'
-    transactions_data = transactions_data.dropna(subset=['wallet', 'function_name'])
-
-    # Sort transactions so that 'flashLoan' and 'flashLoanSimple' are at the beginning
-    transactions_data = transactions_data.sort_values(by=['wallet', 'function_name'])
-
-    # Add a column to indicate the order of transactions
-    transactions_data['order'] = transactions_data.groupby('wallet').cumcount() + 1
-
-    # Filter to keep only the first 6 transactions for each wallet
-    transactions_data = transactions_data[transactions_data['order'] <= 6]
-
-    # Count the types of interactions
-    interaction_counts = transactions_data.groupby(['wallet', 'function_name']).size().reset_index(name='count')
-
-    # Create the stacked bar chart
-    fig = px.bar(interaction_counts, x='wallet', y='count', color='function_name',
-                 title=f'Tipos de Interação nas 6 Transações Subsequentes - {network.capitalize()}')
-
-    # Update layout to standardize bar sizes and set y-axis range
-    fig.update_layout(barmode='stack', uniformtext_minsize=8, uniformtext_mode='hide',
-                      yaxis=dict(range=[0, 6], dtick=1))
-    fig.update_traces(marker=dict(line=dict(width=0.5)), textposition='inside')
+# Funções chamadas nas transações seguintes aos flash loans de todas as carteiras da rede: em cada passo
+# (1 = a primeira transação após o flash loan), o percentual dos flash loans seguidos por cada função. As `top`
+# funções mais frequentes aparecem separadas e as demais agrupadas.
+def plot_wallet_interactions(steps_data, network, top=8):
+    if not isinstance(steps_data, pd.DataFrame):
+        steps_data = pd.DataFrame(steps_data)
+
+    flash_loans = steps_data.loc[steps_data['step'] == 0, 'count'].sum()
+    following = steps_data[steps_data['step'] > 0]
+
+    top_functions = following.groupby('function_name')['count'].sum().nlargest(top).index
+    following = following.assign(
+        function_name=following['function_name'].where(following['function_name'].isin(top_functions), 'Outras'))
+    interaction_counts = following.groupby(['step', 'function_name'], as_index=False)['count'].sum()
+    interaction_counts['percent'] = 100 * interaction_counts['count'] / flash_loans if flash_loans else 0.0
+
+    fig = px.bar(interaction_counts, x='step', y='percent', color='function_name', hover_data=['count'],
+                 title=f'Funções Chamadas nas Transações Seguintes aos Flash Loans - {network.capitalize()}')
+    fig.update_layout(barmode='stack', legend_title_text='Função',
+                      xaxis=dict(title='Transação após o flash loan', dtick=1),
+                      yaxis=dict(title='% dos flash loans', range=[0, 100]))
 
     return fig
 